@@ -0,0 +1,7 @@
+"""Modules shared by every day of the course.
+
+The day folders import them through small alias modules of the same name
+(e.g. `kaggle_adk_course_day_01/model_clients.py`), so there is one copy of
+each module and one set of process-wide registries, whichever folder the
+agents are started from.
+"""
@@ -0,0 +1,316 @@
+"""Shared, pooled Gemini clients for every agent of the course.
+
+A plain `Gemini(...)` builds its own google-genai `Client`, and every client
+opens its own HTTP connections. A team of four agents therefore pays four TLS
+handshakes before the first answer. `shared_gemini()` returns a model whose
+client comes from a process-wide registry, keyed by (model, retry policy,
+pool size), so every agent asking for the same combination reuses one
+keep-alive connection pool.
+
+Every shared model also goes through one process-wide `RateLimiter` that
+tracks requests-per-minute and tokens-per-minute per model. Calls wait in a
+queue *before* they would hit a 429, and if one still comes back every
+caller of that model backs off together with jittered, capped delays.
+
+Each day folder has a `model_clients.py` that aliases this module, so the
+agents import it under that name.
+
+Usage:
+    from model_clients import adaptive_retry_options, shared_gemini
+
+    retry_config = adaptive_retry_options()
+    agent = Agent(model=shared_gemini("gemini-2.5-flash-lite", retry_config), ...)
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+
+import httpx
+from google.adk.models.google_llm import Gemini
+from google.genai import Client, errors, types
+
+# Pool limits used for every shared client unless overridden.
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 60  # seconds an idle connection stays open
+
+# Per-model quotas used until `configure_rate_limit()` says otherwise.
+DEFAULT_RPM = 15
+DEFAULT_TPM = 250_000
+MAX_BACKOFF = 30  # seconds, ceiling for any single retry delay
+THROTTLE_RETRIES = 4  # how often a call is re-queued after a 429
+
+_clients: dict[tuple, Client] = {}
+_clients_lock = threading.Lock()
+
+
+def _registry_key(model: str, retry_options, max_connections: int) -> tuple:
+    # HttpRetryOptions is a pydantic model, so its JSON dump is a stable key.
+    retry_key = retry_options.model_dump_json(exclude_none=True) if retry_options else ""
+    return (model, retry_key, max_connections)
+
+
+def get_client(
+    model: str,
+    retry_options: types.HttpRetryOptions = None,
+    headers: dict = None,
+    max_connections: int = MAX_CONNECTIONS,
+) -> Client:
+    """Returns the shared client for this (model, retry policy), creating it on first use."""
+    key = _registry_key(model, retry_options, max_connections)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=min(MAX_KEEPALIVE_CONNECTIONS, max_connections),
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            )
+            # Passing our own transports makes google-genai use httpx (not a
+            # per-client aiohttp session) with the pool limits above.
+            client = Client(
+                http_options=types.HttpOptions(
+                    headers=headers,
+                    retry_options=retry_options,
+                    client_args={"transport": httpx.HTTPTransport(limits=limits)},
+                    async_client_args={"transport": httpx.AsyncHTTPTransport(limits=limits)},
+                )
+            )
+            _clients[key] = client
+        return client
+
+
+def adaptive_retry_options(
+    attempts: int = 5, initial_delay: float = 1, max_delay: float = MAX_BACKOFF
+) -> types.HttpRetryOptions:
+    """Jittered exponential backoff (1s, 2s, 4s, ...) that never waits longer than `max_delay`.
+
+    429s are left out on purpose: `SharedGemini` handles them through the
+    rate limiter so every caller of the throttled model slows down together.
+    """
+    return types.HttpRetryOptions(
+        attempts=attempts,
+        initial_delay=initial_delay,
+        exp_base=2,
+        max_delay=max_delay,
+        jitter=1,
+        http_status_codes=[500, 503, 504],
+    )
+
+
+class TokenBucket:
+    """A bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.available = per_minute
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Takes `amount` units and returns how long the caller must wait for them."""
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+        # The balance may go negative: later callers queue up behind this reservation.
+        self.available -= amount
+        return max(0.0, -self.available / self.rate)
+
+    def refund(self, amount: float):
+        self.available = min(self.capacity, self.available + amount)
+
+
+@dataclass
+class ModelQuota:
+    requests: TokenBucket
+    tokens: TokenBucket
+    blocked_until: float = 0.0
+    throttled: int = 0  # consecutive 429s, drives the backoff exponent
+    calls: int = 0
+    queued_calls: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class RateLimiter:
+    """Process-wide requests/tokens-per-minute limiter for every shared model."""
+
+    def __init__(self, max_backoff: float = MAX_BACKOFF):
+        self.max_backoff = max_backoff
+        self._quotas: dict[str, ModelQuota] = {}
+        self._limits: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, model: str, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM):
+        with self._lock:
+            self._limits[model] = (rpm, tpm)
+            self._quotas.pop(model, None)
+
+    def _quota(self, model: str) -> ModelQuota:
+        quota = self._quotas.get(model)
+        if quota is None:
+            rpm, tpm = self._limits.get(model, (DEFAULT_RPM, DEFAULT_TPM))
+            quota = self._quotas[model] = ModelQuota(TokenBucket(rpm), TokenBucket(tpm))
+        return quota
+
+    async def acquire(self, model: str, tokens: int) -> float:
+        """Waits until `model` has room for one request of about `tokens` tokens."""
+        with self._lock:
+            quota = self._quota(model)
+            now = time.monotonic()
+            wait = max(
+                quota.requests.reserve(1, now),
+                quota.tokens.reserve(tokens, now),
+                quota.blocked_until - now,
+            )
+            quota.calls += 1
+            quota.total_wait += wait
+            quota.max_wait = max(quota.max_wait, wait)
+            if wait > 0:
+                quota.queued_calls += 1
+        if wait > 0:
+            logging.info(f"[RateLimiter] {model}: queued for {wait:.2f}s")
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # A caller that gave up while queued never makes its request.
+                self.release(model, tokens)
+                raise
+        return wait
+
+    def release(self, model: str, tokens: int):
+        """Gives back an `acquire()` reservation whose request was never sent."""
+        with self._lock:
+            quota = self._quota(model)
+            quota.requests.refund(1)
+            quota.tokens.refund(tokens)
+
+    def settle(self, model: str, estimated: int, actual: int, succeeded: bool = True):
+        """Corrects the token bucket once the real usage of a call is known.
+
+        Only a call that `succeeded` ends the model's 429 backoff streak.
+        """
+        with self._lock:
+            quota = self._quota(model)
+            quota.tokens.refund(estimated - actual)
+            if succeeded:
+                quota.throttled = 0
+
+    def throttle(self, model: str, tokens: int = 0) -> float:
+        """Records a 429 and blocks the model for a jittered, capped backoff."""
+        with self._lock:
+            quota = self._quota(model)
+            # The rejected call did not use its tokens; it reserves them again when re-queued.
+            quota.tokens.refund(tokens)
+            delay = min(self.max_backoff, 2 ** quota.throttled) * random.uniform(0.5, 1.0)
+            quota.throttled += 1
+            quota.blocked_until = max(quota.blocked_until, time.monotonic() + delay)
+        logging.warning(f"[RateLimiter] {model}: 429 received, backing off {delay:.2f}s")
+        return delay
+
+    def metrics(self) -> dict:
+        """Queue wait time per model: calls, calls that waited, total and max wait (seconds)."""
+        with self._lock:
+            return {
+                model: {
+                    "calls": quota.calls,
+                    "queued_calls": quota.queued_calls,
+                    "total_wait_s": round(quota.total_wait, 3),
+                    "avg_wait_s": round(quota.total_wait / quota.calls, 3) if quota.calls else 0.0,
+                    "max_wait_s": round(quota.max_wait, 3),
+                }
+                for model, quota in self._quotas.items()
+            }
+
+
+rate_limiter = RateLimiter()
+
+
+def configure_rate_limit(model: str, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM):
+    """Sets the requests/tokens-per-minute quota the limiter enforces for `model`."""
+    rate_limiter.configure(model, rpm=rpm, tpm=tpm)
+
+
+def estimate_tokens(llm_request) -> int:
+    """Rough prompt+output token count (4 characters per token) used to reserve quota."""
+    chars = 0
+    for content in llm_request.contents or []:
+        for part in content.parts or []:
+            chars += len(part.text or "")
+    config = llm_request.config
+    if config and isinstance(config.system_instruction, str):
+        chars += len(config.system_instruction)
+    max_output = (config.max_output_tokens if config else None) or 1024
+    return chars // 4 + max_output
+
+
+class SharedGemini(Gemini):
+    """A `Gemini` model that borrows its API client from the shared registry.
+
+    Every call is admitted by `rate_limiter` first; a 429 puts the model into
+    backoff and the call is re-queued (up to `throttle_retries` times).
+    """
+
+    max_connections: int = MAX_CONNECTIONS
+    throttle_retries: int = THROTTLE_RETRIES
+
+    @cached_property
+    def api_client(self) -> Client:
+        return get_client(
+            self.model,
+            self.retry_options,
+            headers=self._tracking_headers,
+            max_connections=self.max_connections,
+        )
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        estimated = estimate_tokens(llm_request)
+        for attempt in range(self.throttle_retries + 1):
+            await rate_limiter.acquire(self.model, estimated)
+            used = estimated
+            yielded = False
+            succeeded = False
+            throttled = False
+            try:
+                async for response in super().generate_content_async(llm_request, stream):
+                    yielded = True
+                    if response.usage_metadata and response.usage_metadata.total_token_count:
+                        used = response.usage_metadata.total_token_count
+                    yield response
+                succeeded = True
+                return
+            except errors.ClientError as e:
+                # Only retry when nothing was streamed yet, otherwise the caller would see duplicates.
+                if e.code != 429 or yielded or attempt == self.throttle_retries:
+                    raise
+                throttled = True
+                rate_limiter.throttle(self.model, estimated)
+            finally:
+                # throttle() already refunded a re-queued call. Any other outcome (success,
+                # error, cancellation) settles here; a call that produced nothing used no tokens.
+                if not throttled:
+                    rate_limiter.settle(self.model, estimated, used if yielded else 0, succeeded)
+
+
+def shared_gemini(
+    model: str = "gemini-2.5-flash-lite",
+    retry_options: types.HttpRetryOptions = None,
+    max_connections: int = MAX_CONNECTIONS,
+) -> SharedGemini:
+    """Drop-in replacement for `Gemini(model=..., retry_options=...)` that reuses pooled clients
+    and goes through the shared rate limiter."""
+    return SharedGemini(model=model, retry_options=retry_options, max_connections=max_connections)
+
+
+async def close_shared_clients():
+    """Closes every pooled client (call once on shutdown)."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        await client.aio.aclose()
+        client.close()
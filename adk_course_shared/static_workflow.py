@@ -0,0 +1,161 @@
+"""Deterministic replacement for coordinator agents whose instruction is a fixed step list.
+
+A coordinator told "you MUST call X, then Y, then present" pays one LLM
+planning call per step only to follow an order we already know.
+`StaticWorkflowAgent` runs that order directly:
+
+    root_agent = StaticWorkflowAgent(
+        name="ResearchWorkflow",
+        steps=[research_agent, summarizer_agent],
+        fallback=research_coordinator,  # the original LLM coordinator
+    )
+
+A step is either
+  - an agent: it runs as a sub-agent and must fill its `output_key`, or
+  - a function `step(values: dict) -> dict`: it gets the workflow values
+    (session state + the user's `request` text + earlier step results) and
+    returns new values. `tool_step()` turns an existing function tool into one.
+
+If a step fails (an agent does not write its `output_key`, a function
+returns `{"status": "error", ...}` or raises `StepFailed`), the workflow
+hands the whole request to `fallback`, i.e. to normal LLM routing. Any
+other exception, e.g. a model's 429, is raised as usual.
+
+Agent steps run against a scratch copy of the session, and their events are
+held back until every step has succeeded. A failed workflow therefore leaves
+neither events nor state behind: the fallback starts from the session as it
+was, without repeating tool calls or answers on top of a partial run. The
+price is that the steps' events reach the caller only once the workflow is
+done.
+
+Day 1 and day 2 import this module through their `static_workflow.py` alias.
+"""
+
+import logging
+from typing import Any, AsyncGenerator, Callable, Optional, Union
+
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.sessions.state import State
+from google.adk.utils.context_utils import Aclosing
+from google.genai import types
+
+Step = Union[BaseAgent, Callable[[dict], dict]]
+
+
+class StepFailed(Exception):
+    """Raised inside the workflow when a step did not produce a usable result."""
+
+
+def tool_step(func: Callable[..., dict], output_key: Optional[str] = None, **arg_keys: str) -> Callable[[dict], dict]:
+    """Wraps a function tool as a workflow step.
+
+    `arg_keys` maps the tool's parameters to workflow value names, e.g.
+    `tool_step(get_exchange_rate, base_currency="base", target_currency="target")`.
+    The tool's result is stored under `output_key` (default: the function name).
+    """
+    key = output_key or func.__name__
+
+    def step(values: dict) -> dict:
+        missing = [name for name in arg_keys.values() if name not in values]
+        if missing:
+            raise StepFailed(f"{func.__name__} needs {', '.join(missing)}")
+        result = func(**{arg: values[name] for arg, name in arg_keys.items()})
+        if isinstance(result, dict) and result.get("status") == "error":
+            raise StepFailed(result.get("error_message", f"{func.__name__} failed"))
+        return {key: result}
+
+    step.__name__ = func.__name__
+    return step
+
+
+def _apply(session, event: Event):
+    """What appending `event` does to a session, as in `BaseSessionService.append_event`."""
+    if event.partial:
+        return
+    for key, value in (event.actions.state_delta if event.actions else {}).items():
+        if not key.startswith(State.TEMP_PREFIX):
+            session.state[key] = value
+    session.events.append(event)
+
+
+class StaticWorkflowAgent(BaseAgent):
+    """Runs a fixed sequence of steps with no coordinator LLM calls.
+
+    Attributes:
+        steps: Agents and/or functions, run in order.
+        response: Optional template for the final answer, filled from the
+            workflow values (e.g. "Summary: {final_summary}"). Without it the
+            last agent step's own reply is the answer.
+        fallback: Agent that handles the request when a step fails, normally
+            the LLM coordinator this workflow replaces.
+    """
+
+    steps: list[Any] = []
+    response: Optional[str] = None
+    fallback: Optional[BaseAgent] = None
+
+    def model_post_init(self, __context: Any) -> None:
+        # Agent steps and the fallback are sub-agents, so ADK knows about them (parents, lookup by name).
+        agents = [step for step in self.steps if isinstance(step, BaseAgent)]
+        if self.fallback is not None:
+            agents.append(self.fallback)
+        known = {id(a) for a in self.sub_agents}
+        self.sub_agents = self.sub_agents + [a for a in agents if id(a) not in known]
+        super().model_post_init(__context)
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        request = ""
+        if ctx.user_content and ctx.user_content.parts:
+            request = "".join(part.text or "" for part in ctx.user_content.parts)
+        values = {**ctx.session.state, "request": request}
+        # The steps see each other's events and state in this copy; the real session only gets them on success.
+        session = ctx.session.model_copy(update={"state": dict(ctx.session.state), "events": list(ctx.session.events)})
+        scratch = ctx.model_copy(update={"session": session})
+        pending: list[Event] = []
+
+        try:
+            for step in self.steps:
+                name = getattr(step, "name", getattr(step, "__name__", step))
+                if isinstance(step, BaseAgent):
+                    # Only a value written by this run counts; the key may still hold an earlier turn's.
+                    output_key = getattr(step, "output_key", None)
+                    written = None
+                    async with Aclosing(step.run_async(scratch)) as agen:
+                        async for event in agen:
+                            if output_key and event.actions and output_key in event.actions.state_delta:
+                                written = event.actions.state_delta[output_key]
+                            _apply(scratch.session, event)
+                            pending.append(event)
+                    if output_key and not written:
+                        raise StepFailed(f"{step.name} did not fill '{output_key}'")
+                    values.update(scratch.session.state)
+                else:
+                    values.update(step(values))
+            name = "response"
+            try:
+                answer = self.response.format(**values) if self.response else None
+            except KeyError as e:
+                raise StepFailed(f"response template needs {e}") from e
+        except StepFailed as e:
+            if self.fallback is None:
+                raise
+            logging.info(
+                f"[{self.name}] step {name} failed ({e}); dropping {len(pending)} events, "
+                f"falling back to {self.fallback.name}"
+            )
+            async with Aclosing(self.fallback.run_async(ctx)) as agen:
+                async for event in agen:
+                    yield event
+            return
+
+        for event in pending:
+            yield event
+        if answer:
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                content=types.Content(role="model", parts=[types.Part(text=answer)]),
+            )
@@ -0,0 +1,47 @@
+"""Agent-as-a-tool helpers for the coordinator agents in this folder."""
+
+from typing import Any
+
+from google.adk.tools import AgentTool, ToolContext
+
+
+class ReferenceAgentTool(AgentTool):
+    """An `AgentTool` that hands back a *reference* to the agent's output instead of the output itself.
+
+    A plain `AgentTool` returns the sub-agent's full answer to the calling
+    agent, so it becomes part of the caller's prompt and is tokenized again on
+    every following model call. `AgentTool` already copies the sub-agent's
+    state changes (including its `output_key`) into the caller's session, so
+    for agents with an `output_key` this tool returns only the key name.
+    Any later agent that reads `{output_key}` in its instruction gets the full
+    value straight from the state.
+
+    Attributes:
+        preview_chars: How many leading characters of the output to include
+            in the reply (0 = none), e.g. to let the coordinator decide
+            whether the result is usable.
+    """
+
+    def __init__(self, agent, skip_summarization: bool = False, preview_chars: int = 0):
+        super().__init__(agent=agent, skip_summarization=skip_summarization)
+        self.preview_chars = preview_chars
+
+    async def run_async(self, *, args: dict[str, Any], tool_context: ToolContext) -> Any:
+        result = await super().run_async(args=args, tool_context=tool_context)
+        output_key = getattr(self.agent, "output_key", None)
+        if not output_key:
+            # Nothing to refer to, fall back to passing the value.
+            return result
+
+        reply = {
+            "status": "success",
+            "state_key": output_key,
+            "message": (
+                f"{self.agent.name} finished. Its full output is stored in the session state "
+                f"under '{output_key}' and is passed automatically to agents that need it."
+            ),
+        }
+        if self.preview_chars:
+            text = result if isinstance(result, str) else str(result)
+            reply["preview"] = text[: self.preview_chars]
+        return reply
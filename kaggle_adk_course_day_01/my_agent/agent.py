@@ -1,25 +1,20 @@
 import asyncio
 from google.genai import types
 from google.adk.agents.llm_agent import Agent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
 from google.adk.runners import InMemoryRunner
 from google.adk.tools import google_search
 
 # Retry setup
-retry_config = types.HttpRetryOptions(
-    attempts=5,
-    exp_base=7,
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504]
-)
+retry_config = adaptive_retry_options(
+    attempts=5,  # Maximum retry attempts
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 # Define the root agent
 root_agent = Agent(
     name="helpful_assistant",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     description="A simple agent that can answer general questions.",
     instruction="You are a helpful assistant. Use Google Search for current info or if unsure.",
     tools=[google_search],
@@ -1,5 +1,7 @@
 from google.adk.agents import Agent, SequentialAgent, ParallelAgent, LoopAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
+from agent_tools import ReferenceAgentTool
+from static_workflow import StaticWorkflowAgent
 from google.adk.runners import InMemoryRunner
 from google.adk.tools import AgentTool, FunctionTool, google_search
 from google.genai import types
@@ -7,19 +9,14 @@ from google.genai import types
 print("✅ ADK components imported successfully.")
 
 # Retry setup
-retry_config = types.HttpRetryOptions(
-    attempts=5,
-    exp_base=7,
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504]
-)
+retry_config = adaptive_retry_options(
+    attempts=5,  # Maximum retry attempts
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 # Research Agent: Its job is to use the google_search tool and present findings.
 research_agent = Agent(
     name="ResearchAgent",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""You are a specialized research agent. Your only job is to use the
     google_search tool to find 2-3 pieces of relevant information on the given topic and present the findings with citations.""",
     tools=[google_search],
@@ -31,10 +28,7 @@ print("✅ research_agent created.")
 # Summarizer Agent: Its job is to summarize the text it receives.
 summarizer_agent = Agent(
     name="SummarizerAgent",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     # The instruction is modified to request a bulleted list for a clear output format.
     instruction="""Read the provided research findings: {research_findings}
 Create a concise summary as a bulleted list with 3-5 key points.""",
@@ -44,20 +38,31 @@ Create a concise summary as a bulleted list with 3-5 key points.""",
 print("✅ summarizer_agent created.")
 
 
-# Root Coordinator: Orchestrates the workflow by calling the sub-agents as tools.
-root_agent = Agent(
+# Research Coordinator: Orchestrates the workflow by calling the sub-agents as tools.
+research_coordinator = Agent(
     name="ResearchCoordinator",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     # This instruction tells the root agent HOW to use its tools (which are the other agents).
     instruction="""You are a research coordinator. Your goal is to answer the user's query by orchestrating a workflow.
 1. First, you MUST call the `ResearchAgent` tool to find relevant information on the topic provided by the user.
-2. Next, after receiving the research findings, you MUST call the `SummarizerAgent` tool to create a concise summary.
+2. Next, once the research findings are stored, you MUST call the `SummarizerAgent` tool to create a concise summary.
+   The summarizer reads the findings itself, so just ask it to summarize the research findings on the topic.
 3. Finally, present the final summary clearly to the user as your response.""",
-    # We wrap the sub-agents in `AgentTool` to make them callable tools for the root agent.
-    tools=[AgentTool(research_agent), AgentTool(summarizer_agent)],
+    # We wrap the sub-agents in tools to make them callable by the coordinator.
+    # `ReferenceAgentTool` returns only the state key of the research findings instead of the full text,
+    # so the findings go straight to the summarizer's `{research_findings}` without passing through this prompt.
+    tools=[ReferenceAgentTool(research_agent), AgentTool(summarizer_agent)],
+)
+
+print("✅ research_coordinator created.")
+
+
+# Root Agent: The coordinator's instruction is a fixed step list, so the same order runs here without
+# spending an LLM planning call per step. If a step fails, the request goes to the LLM coordinator above.
+root_agent = StaticWorkflowAgent(
+    name="ResearchWorkflow",
+    steps=[research_agent, summarizer_agent],
+    fallback=research_coordinator,
 )
 
 print("✅ root_agent created.")
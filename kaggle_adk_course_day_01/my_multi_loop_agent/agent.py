@@ -1,27 +1,23 @@
 from google.adk.agents import Agent, SequentialAgent, ParallelAgent, LoopAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
+from workflow_agents import ConvergentLoopAgent, critique_approved, draft_converged
 from google.adk.runners import InMemoryRunner
-from google.adk.tools import AgentTool, FunctionTool, google_search
+from google.adk.tools import AgentTool, FunctionTool, ToolContext, google_search
 from google.genai import types
 
 print("✅ ADK components imported successfully.")
 
 # Retry setup
-retry_config = types.HttpRetryOptions(
-    attempts=5,
-    exp_base=7,
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504]
-)
+retry_config = adaptive_retry_options(
+    attempts=5,  # Maximum retry attempts
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 
 # This agent runs ONCE at the beginning to create the first draft.
 initial_writer_agent = Agent(
     name="InitialWriterAgent",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""Based on the user's prompt, write the first draft of a short story (around 100-150 words).
     Output only the story text, with no introduction or explanation.""",
     output_key="current_story",  # Stores the first draft in the state.
@@ -32,10 +28,7 @@ print("✅ initial_writer_agent created.")
 # This agent's only job is to provide feedback or the approval signal. It has no tools.
 critic_agent = Agent(
     name="CriticAgent",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""You are a constructive story critic. Review the story provided below.
     Story: {current_story}
     
@@ -48,8 +41,10 @@ critic_agent = Agent(
 print("✅ critic_agent created.")
 
 # This is the function that the RefinerAgent will call to exit the loop.
-def exit_loop():
+# The loop below usually exits before the refiner runs (see `exit_checks`); this stays as a fallback.
+def exit_loop(tool_context: ToolContext):
     """Call this function ONLY when the critique is 'APPROVED', indicating the story is finished and no more changes are needed."""
+    tool_context.actions.escalate = True  # Tells the LoopAgent to stop
     return {"status": "approved", "message": "Story approved. Exiting refinement loop."}
 
 
@@ -58,10 +53,7 @@ print("✅ exit_loop function created.")
 # This agent refines the story based on critique OR calls the exit_loop function.
 refiner_agent = Agent(
     name="RefinerAgent",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""You are a story refiner. You have a story draft and critique.
     
     Story Draft: {current_story}
@@ -78,11 +70,17 @@ refiner_agent = Agent(
 
 print("✅ refiner_agent created.")
 
-# The LoopAgent contains the agents that will run repeatedly: Critic -> Refiner.
-story_refinement_loop = LoopAgent(
+# The ConvergentLoopAgent contains the agents that will run repeatedly: Critic -> Refiner.
+# Its exit checks run after every step without calling the model, so an "APPROVED" critique
+# ends the loop right away instead of spending a RefinerAgent call just to invoke `exit_loop`.
+story_refinement_loop = ConvergentLoopAgent(
     name="StoryRefinementLoop",
     sub_agents=[critic_agent, refiner_agent],
     max_iterations=2,  # Prevents infinite loops
+    exit_checks=[
+        critique_approved("critique"),  # The critic said exactly "APPROVED"
+        draft_converged("current_story", threshold=0.95),  # The last refinement barely changed the story
+    ],
 )
 
 # The root agent is a SequentialAgent that defines the overall workflow: Initial Write -> Refinement Loop.
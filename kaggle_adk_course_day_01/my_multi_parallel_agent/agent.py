@@ -1,5 +1,6 @@
 from google.adk.agents import Agent, SequentialAgent, ParallelAgent, LoopAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
+from workflow_agents import QuorumParallelAgent
 from google.adk.runners import InMemoryRunner
 from google.adk.tools import AgentTool, FunctionTool, google_search
 from google.genai import types
@@ -7,21 +8,16 @@ from google.genai import types
 print("✅ ADK components imported successfully.")
 
 # Retry setup
-retry_config = types.HttpRetryOptions(
-    attempts=5,
-    exp_base=7,
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504]
-)
+retry_config = adaptive_retry_options(
+    attempts=5,  # Maximum retry attempts
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 
 # Tech Researcher: Focuses on AI and ML trends.
 tech_researcher = Agent(
     name="TechResearcher",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""Research the latest AI/ML trends. Include 3 key developments,
 the main companies involved, and the potential impact. Keep the report very concise (100 words).""",
     tools=[google_search],
@@ -34,10 +30,7 @@ print("✅ tech_researcher created.")
 # Health Researcher: Focuses on medical breakthroughs.
 health_researcher = Agent(
     name="HealthResearcher",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""Research recent medical breakthroughs. Include 3 significant advances,
 their practical applications, and estimated timelines. Keep the report concise (100 words).""",
     tools=[google_search],
@@ -49,10 +42,7 @@ print("✅ health_researcher created.")
 # Finance Researcher: Focuses on fintech trends.
 finance_researcher = Agent(
     name="FinanceResearcher",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""Research current fintech trends. Include 3 key trends,
 their market implications, and the future outlook. Keep the report concise (100 words).""",
     tools=[google_search],
@@ -64,10 +54,7 @@ print("✅ finance_researcher created.")
 # The AggregatorAgent runs *after* the parallel step to synthesize the results.
 aggregator_agent = Agent(
     name="AggregatorAgent",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     # It uses placeholders to inject the outputs from the parallel agents, which are now in the session state.
     instruction="""Combine these three research findings into a single executive summary:
 
@@ -80,16 +67,22 @@ aggregator_agent = Agent(
     **Finance Innovations:**
     {finance_research}
     
+    If a report says it did not finish in time, skip that area and mention it briefly.
     Your summary should highlight common themes, surprising connections, and the most important key takeaways from all three reports. The final summary should be around 200 words.Respond in greek language.""",
     output_key="executive_summary",  # This will be the final output of the entire system.
 )
 
 print("✅ aggregator_agent created.")
 
-# The ParallelAgent runs all its sub-agents simultaneously.
-parallel_research_team = ParallelAgent(
+# The QuorumParallelAgent runs all its sub-agents simultaneously, like a ParallelAgent,
+# but never waits longer than `branch_timeout` for a branch: once 2 of 3 reports are ready the
+# last one gets `quorum_grace` more seconds, then its key is filled with a placeholder.
+parallel_research_team = QuorumParallelAgent(
     name="ParallelResearchTeam",
     sub_agents=[tech_researcher, health_researcher, finance_researcher],
+    branch_timeout=45,  # Seconds, hard deadline for every branch
+    quorum=2,  # Aggregate once 2 of the 3 reports are ready...
+    quorum_grace=10,  # ...plus up to 10s for the slowest one
 )
 
 # This SequentialAgent defines the high-level workflow: run the parallel team first, then run the aggregator.
@@ -1,5 +1,6 @@
 from google.adk.agents import Agent, SequentialAgent, ParallelAgent, LoopAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
+from workflow_agents import PipelinedSequentialAgent
 from google.adk.runners import InMemoryRunner
 from google.adk.tools import AgentTool, FunctionTool, google_search
 from google.genai import types
@@ -7,26 +8,23 @@ from google.genai import types
 print("✅ ADK components imported successfully.")
 
 # Retry setup
-retry_config = types.HttpRetryOptions(
-    attempts=5,
-    exp_base=7,
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504]
-)
+retry_config = adaptive_retry_options(
+    attempts=5,  # Maximum retry attempts
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 
 # Outline Agent: Creates the initial blog post outline.
 outline_agent = Agent(
     name="OutlineAgent",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
+    # Every part starts with a markdown heading so the pipeline can hand it on as soon as it is written.
     instruction="""Create a blog outline for the given topic with:
     1. A catchy headline
     2. An introduction hook
     3. 3-5 main sections with 2-3 bullet points for each
-    4. A concluding thought""",
+    4. A concluding thought
+    Start every part with its own markdown heading (`#` for the headline, `##` for everything else).""",
     output_key="blog_outline",  # The result of this agent will be stored in the session state with this key.
 )
 
@@ -36,13 +34,11 @@ print("✅ outline_agent created.")
 # Writer Agent: Writes the full blog post based on the outline from the previous agent.
 writer_agent = Agent(
     name="WriterAgent",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
-    # The `{blog_outline}` placeholder automatically injects the state value from the previous agent's output.
-    instruction="""Following this outline strictly: {blog_outline}
-    Write a brief, 200 to 300-word blog post with an engaging and informative tone.""",
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
+    # In the pipelined workflow `{blog_outline}` is one part of the outline at a time.
+    instruction="""You are writing one part of a blog post. Following this part of the outline strictly: {blog_outline}
+    Write only this part (about 60 words, the whole post stays within 200 to 300 words) with an engaging and informative tone.
+    Keep its markdown heading.""",
     output_key="blog_draft",  # The result of this agent will be stored with this key.
 )
 
@@ -51,24 +47,24 @@ print("✅ writer_agent created.")
 # Editor Agent: Edits and polishes the draft from the writer agent.
 editor_agent = Agent(
     name="EditorAgent",
-    model=Gemini(
-        model="gemini-2.5-flash-lite",
-        retry_options=retry_config
-    ),
-    # This agent receives the `{blog_draft}` from the writer agent's output.
-    instruction="""Edit this draft: {blog_draft}
-    Your task is to polish the text by fixing any grammatical errors, improving the flow and sentence structure, and enhancing overall clarity.""",
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
+    # This agent receives the `{blog_draft}` from the writer agent's output, one part at a time.
+    instruction="""Edit this part of the draft: {blog_draft}
+    Your task is to polish the text by fixing any grammatical errors, improving the flow and sentence structure, and enhancing overall clarity.
+    Output only the polished part, keeping its markdown heading.""",
     output_key="final_blog",  # This is the final output of the entire pipeline.
 )
 
 print("✅ editor_agent created.")
 
 
-root_agent = SequentialAgent(
+# The PipelinedSequentialAgent keeps the Outline -> Writer -> Editor order, but hands each finished
+# section downstream right away: the editor polishes section 1 while the writer writes section 2.
+root_agent = PipelinedSequentialAgent(
     name="BlogPipeline",
     sub_agents=[outline_agent, writer_agent, editor_agent],
 )
 
-print("✅ Sequential Agent created.")
+print("✅ Pipelined Sequential Agent created.")
 
 
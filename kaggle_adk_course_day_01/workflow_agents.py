@@ -0,0 +1,466 @@
+"""Latency-aware variants of the ADK workflow agents used in this folder.
+
+These are drop-in replacements for `ParallelAgent` & co. that keep the same
+sub-agent / `output_key` wiring but bound how long a workflow can take.
+"""
+
+import asyncio
+import difflib
+import logging
+import re
+import time
+from typing import AsyncGenerator, Callable, Optional
+
+from google.adk.agents import LlmAgent, LoopAgent, ParallelAgent, SequentialAgent
+from google.adk.agents.base_agent import BaseAgent, BaseAgentState
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.loop_agent import LoopAgentState
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event, EventActions
+from google.adk.utils.context_utils import Aclosing
+
+DEFAULT_PLACEHOLDER = "(No result: {agent} did not finish in time.)"
+
+# A new section starts at a markdown heading.
+DEFAULT_SECTION_PATTERN = r"^#{1,6} "
+HEADING_ONLY = re.compile(r"#{1,6} [^\n]*")
+
+
+def _branch_ctx(
+    agent: BaseAgent, sub_agent: BaseAgent, ctx: InvocationContext, name: Optional[str] = None
+) -> InvocationContext:
+    """Isolated branch for every sub-agent, exactly like `ParallelAgent` does (`name` overrides the sub-agent's)."""
+    ctx = ctx.model_copy()
+    suffix = f"{agent.name}.{name or sub_agent.name}"
+    ctx.branch = f"{ctx.branch}.{suffix}" if ctx.branch else suffix
+    return ctx
+
+
+class QuorumParallelAgent(ParallelAgent):
+    """A `ParallelAgent` whose branches have a deadline and whose result needs only a quorum.
+
+    - Every branch gets at most `branch_timeout` seconds.
+    - Once `quorum` branches have finished, the remaining ones get at most
+      `quorum_grace` more seconds (default: none, aggregate right away).
+    - A branch that is cut off (or fails) is cancelled and its `output_key` is
+      filled with `placeholder`, so `{placeholders}` in later instructions
+      still resolve.
+
+    Tail latency of the team is therefore bounded by the deadline instead of
+    the slowest branch. Under a `ResumabilityConfig` it records its agent state
+    and end of agent like `ParallelAgent`; cut-off branches count as done.
+    """
+
+    branch_timeout: float = 60.0
+    quorum: Optional[int] = None  # None means "all branches"
+    quorum_grace: float = 0.0
+    placeholder: str = DEFAULT_PLACEHOLDER
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        if not self.sub_agents:
+            return
+        # Same agent state as ParallelAgent, so a resumed parent workflow can tell where this one stands.
+        if ctx.is_resumable and self._load_agent_state(ctx, BaseAgentState) is None:
+            ctx.set_agent_state(self.name, agent_state=BaseAgentState())
+            yield self._create_agent_state_event(ctx)
+
+        branches = [
+            sub_agent for sub_agent in self.sub_agents if not ctx.end_of_agents.get(sub_agent.name)
+        ]
+        if not branches:
+            async with Aclosing(self._end_of_agent(ctx)) as agen:
+                async for event in agen:
+                    yield event
+            return
+
+        quorum = min(self.quorum or len(branches), len(branches))
+        queue = asyncio.Queue()
+        done = object()
+
+        # Same hand-off as ParallelAgent: a branch waits until its event was processed upstream.
+        async def run_branch(sub_agent: BaseAgent):
+            try:
+                async with Aclosing(sub_agent.run_async(_branch_ctx(self, sub_agent, ctx))) as agen:
+                    async for event in agen:
+                        processed = asyncio.Event()
+                        await queue.put((sub_agent, event, processed))
+                        await processed.wait()
+                await queue.put((sub_agent, done, None))
+            except Exception as e:
+                logging.warning(f"[{self.name}] {sub_agent.name} failed: {e}")
+                await queue.put((sub_agent, e, None))
+
+        started = time.monotonic()
+        deadline = started + self.branch_timeout
+        tasks = {sub_agent.name: asyncio.create_task(run_branch(sub_agent)) for sub_agent in branches}
+        finished, missing = set(), []
+        try:
+            while len(finished) + len(missing) < len(branches):
+                try:
+                    sub_agent, event, processed = await asyncio.wait_for(
+                        queue.get(), timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except asyncio.TimeoutError:
+                    break
+                if event is done:
+                    finished.add(sub_agent.name)
+                    if len(finished) == quorum:
+                        deadline = min(deadline, time.monotonic() + self.quorum_grace)
+                elif isinstance(event, Exception):
+                    missing.append(sub_agent)
+                else:
+                    yield event
+                    processed.set()
+                    if ctx.should_pause_invocation(event):
+                        return
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        missing += [
+            sub_agent
+            for sub_agent in branches
+            if sub_agent.name not in finished and all(sub_agent is not m for m in missing)
+        ]
+        if missing:
+            logging.info(
+                f"[{self.name}] {len(finished)}/{len(branches)} branches ready after "
+                f"{time.monotonic() - started:.1f}s; filling {[a.name for a in missing]}"
+            )
+            # Fill the output keys of the missing branches so the aggregator's placeholders resolve.
+            state_delta = {
+                sub_agent.output_key: self.placeholder.format(agent=sub_agent.name)
+                for sub_agent in missing
+                if getattr(sub_agent, "output_key", None)
+            }
+            if state_delta:
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    actions=EventActions(state_delta=state_delta),
+                )
+
+        # Cut-off branches count as done: their placeholders are the result.
+        async with Aclosing(self._end_of_agent(ctx)) as agen:
+            async for event in agen:
+                yield event
+
+    async def _end_of_agent(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        if ctx.is_resumable:
+            ctx.set_agent_state(self.name, end_of_agent=True)
+            yield self._create_agent_state_event(ctx)
+
+
+def _event_text(event: Event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text for part in event.content.parts if part.text and not part.thought)
+
+
+class _SectionSplitter:
+    """Cuts a growing text into sections; a section is complete once the next one starts.
+
+    Sections start at lines matching `pattern` (markdown headings by default).
+    Text before the first section is a preamble and is dropped; a text without
+    any section line is one single section. A heading with nothing under it,
+    or a one-line first section (the post's title), is kept with the next
+    section.
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = re.compile(pattern, re.MULTILINE)
+        self.text = ""
+        self.emitted = None  # start of the section in progress, None before the first one
+        self.carry = ""  # heading-only section waiting for the next one
+        self.count = 0  # sections handed out
+
+    def feed(self, text: str, final: bool = False) -> list[str]:
+        self.text = text
+        if self.emitted is None and (first := self.pattern.search(text)):
+            self.emitted = first.start()
+        if self.emitted is not None:
+            starts = [m.start() for m in self.pattern.finditer(text, self.emitted) if m.start() > self.emitted]
+        else:
+            starts = []
+            if final:
+                self.emitted = 0  # no sections at all: the whole text is one
+        if final:
+            starts.append(len(text))
+        sections = []
+        for start in starts:
+            section = text[self.emitted:start].strip()
+            self.emitted = start
+            if not section:
+                continue
+            if self.carry:
+                section, self.carry = f"{self.carry}\n\n{section}", ""
+            title = self.count == 0 and "\n" not in section
+            if (title or HEADING_ONLY.fullmatch(section)) and start < len(text):
+                self.carry = section
+                continue
+            sections.append(section)
+            self.count += 1
+        return sections
+
+
+class PipelinedSequentialAgent(SequentialAgent):
+    """A `SequentialAgent` whose stages overlap section by section.
+
+    The first stage is streamed; as soon as one section of its output is
+    complete (the next `section_pattern` line, a markdown heading by default,
+    has started) the next stage starts working on that section, while the
+    first stage keeps writing. Every later stage runs once per incoming
+    section, with its upstream `{output_key}` placeholder bound to that
+    section, and hands its result on to the next stage.
+
+    Each stage's `output_key` is filled incrementally with the sections done so
+    far; the first stage's final event then stores its whole output as usual,
+    so the state ends up the same as with a plain `SequentialAgent`.
+    Time to the first final section is roughly one generation instead of the
+    sum of all stages.
+
+    Every section of a later stage is worked on in its own branch and with
+    `include_contents="none"`: its prompt is the instruction with the bound
+    section and at most the latest message before it, never the conversation
+    or the other sections' turns, so its size does not grow with the number of
+    sections.
+
+    Instructions of the later stages should ask for *one section* at a time.
+
+    Under a `ResumabilityConfig` the stages run one after another, exactly as
+    in `SequentialAgent`, so a resumed invocation continues at the stage it
+    stopped in.
+    """
+
+    section_pattern: str = DEFAULT_SECTION_PATTERN
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        stages = self.sub_agents
+        if not stages:
+            return
+        if ctx.is_resumable:
+            # Overlapping stages have no single current sub-agent to resume from: run them in turn,
+            # with SequentialAgent's agent state and end-of-agent events.
+            logging.info(f"[{self.name}] resumable invocation, running the stages sequentially")
+            async with Aclosing(super()._run_async_impl(ctx)) as agen:
+                async for event in agen:
+                    yield event
+            return
+
+        outbox = asyncio.Queue()
+        # sections[i] carries finished sections from stage i to stage i + 1 (None = no more).
+        sections = [asyncio.Queue() for _ in stages[:-1]]
+        done = object()
+
+        async def emit(event: Event):
+            # Same hand-off as ParallelAgent: wait until the runner processed the event.
+            processed = asyncio.Event()
+            await outbox.put((event, processed))
+            await processed.wait()
+
+        async def emit_progress(stage: BaseAgent, parts: list[str]):
+            if getattr(stage, "output_key", None):
+                await emit(
+                    Event(
+                        invocation_id=ctx.invocation_id,
+                        author=self.name,
+                        branch=ctx.branch,
+                        actions=EventActions(state_delta={stage.output_key: "\n\n".join(parts)}),
+                    )
+                )
+
+        async def run_first_stage():
+            stage = stages[0]
+            splitter = _SectionSplitter(self.section_pattern)
+            run_config = (ctx.run_config or RunConfig()).model_copy(
+                update={"streaming_mode": StreamingMode.SSE}
+            )
+            streamed, parts = "", []
+            async with Aclosing(stage.run_async(ctx.model_copy(update={"run_config": run_config}))) as agen:
+                async for event in agen:
+                    await emit(event)
+                    text = _event_text(event)
+                    if event.author != stage.name or not text:
+                        continue
+                    # Partial events carry deltas, the final event carries the whole text.
+                    if event.partial:
+                        streamed += text
+                        new_sections = splitter.feed(streamed)
+                    else:
+                        new_sections = splitter.feed(text, final=True)
+                    for section in new_sections:
+                        parts.append(section)
+                        # Progress only while streaming: the final event sets the output_key to the full text.
+                        if event.partial:
+                            await emit_progress(stage, parts)
+                        if sections:
+                            await sections[0].put(section)
+
+        async def run_later_stage(i: int):
+            stage, upstream_key = stages[i], getattr(stages[i - 1], "output_key", None)
+            parts = []
+            while (section := await sections[i - 1].get()) is not None:
+                update = {"instruction": _bind_placeholder(stage.instruction, upstream_key, section), "output_key": None}
+                if isinstance(stage, LlmAgent):
+                    update["include_contents"] = "none"
+                worker = stage.clone(update=update)
+                # Own branch per section: the workers never see each other's or the other stages' turns.
+                worker_ctx = _branch_ctx(self, worker, ctx, name=f"{stage.name}_{len(parts)}")
+                result = ""
+                async with Aclosing(worker.run_async(worker_ctx)) as agen:
+                    async for event in agen:
+                        await emit(event)
+                        if event.author == worker.name and event.is_final_response() and _event_text(event):
+                            result = _event_text(event)
+                parts.append(result)
+                await emit_progress(stage, parts)
+                if i < len(sections):
+                    await sections[i].put(result)
+
+        async def run_stage(i: int):
+            try:
+                await (run_first_stage() if i == 0 else run_later_stage(i))
+            finally:
+                if i < len(sections):
+                    sections[i].put_nowait(None)
+                outbox.put_nowait((done, None))
+
+        tasks = [asyncio.create_task(run_stage(i)) for i in range(len(stages))]
+        try:
+            finished = 0
+            while finished < len(stages):
+                event, processed = await outbox.get()
+                if event is done:
+                    finished += 1
+                    continue
+                yield event
+                processed.set()
+            # Surface the first stage error, if any.
+            for task in tasks:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _bind_placeholder(instruction, key: Optional[str], value: str):
+    """Turns an instruction template into a provider with `{key}` bound to `value`.
+
+    A provider (callable) instruction skips ADK's own `{placeholder}` injection,
+    so the remaining placeholders are filled from the session state here.
+    """
+    if not isinstance(instruction, str) or not key:
+        return instruction
+
+    def provider(readonly_ctx) -> str:
+        state = readonly_ctx.state
+
+        def fill(match: re.Match) -> str:
+            name = match.group(1)
+            if name == key:
+                return value
+            return str(state.get(name, "")) if match.group(2) or name in state else match.group(0)
+
+        return re.sub(r"{([\w:]+)(\?)?}", fill, instruction)
+
+    return provider
+
+
+# An exit check looks at the session state now and at the same point of the
+# previous iteration (None during the first one) and returns True to leave the loop.
+ExitCheck = Callable[[dict, Optional[dict]], bool]
+
+
+def critique_approved(key: str = "critique", phrase: str = "APPROVED") -> ExitCheck:
+    """Exits once `state[key]` is exactly `phrase` (ignoring case, quotes and trailing dots)."""
+
+    def check(state: dict, previous: Optional[dict]) -> bool:
+        value = str(state.get(key, "")).strip().strip("\"'*.!").strip()
+        return value.upper() == phrase.upper()
+
+    return check
+
+
+def draft_converged(key: str = "current_story", threshold: float = 0.95) -> ExitCheck:
+    """Exits once `state[key]` changed by less than `1 - threshold` since the previous iteration."""
+
+    def check(state: dict, previous: Optional[dict]) -> bool:
+        if previous is None or key not in state or key not in previous:
+            return False
+        ratio = difflib.SequenceMatcher(None, str(previous[key]), str(state[key])).ratio()
+        return ratio >= threshold
+
+    return check
+
+
+class ConvergentLoopAgent(LoopAgent):
+    """A `LoopAgent` that also stops on cheap, deterministic `exit_checks`.
+
+    The checks run after every sub-agent, so e.g. an "APPROVED" critique ends
+    the loop right away instead of paying another LLM round-trip just for the
+    refiner to call `exit_loop`. Escalation and `max_iterations` still work as
+    in `LoopAgent`.
+    """
+
+    exit_checks: list[ExitCheck] = []
+
+    def _should_exit(self, ctx: InvocationContext, previous: Optional[dict]) -> bool:
+        state = ctx.session.state
+        for check in self.exit_checks:
+            if check(state, previous):
+                logging.info(f"[{self.name}] {getattr(check, '__qualname__', check)} met, exiting loop")
+                return True
+        return False
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        if not self.sub_agents:
+            return
+
+        agent_state = self._load_agent_state(ctx, LoopAgentState)
+        is_resuming_at_current_agent = agent_state is not None
+        times_looped, start_index = self._get_start_state(agent_state)
+
+        # State after each sub-agent in the previous iteration, by sub-agent index.
+        snapshots: dict[int, dict] = {}
+        should_exit = pause_invocation = False
+        while (not self.max_iterations or times_looped < self.max_iterations) and not (
+            should_exit or pause_invocation
+        ):
+            for i in range(start_index, len(self.sub_agents)):
+                sub_agent = self.sub_agents[i]
+                if ctx.is_resumable and not is_resuming_at_current_agent:
+                    ctx.set_agent_state(
+                        self.name,
+                        agent_state=LoopAgentState(
+                            current_sub_agent=sub_agent.name, times_looped=times_looped
+                        ),
+                    )
+                    yield self._create_agent_state_event(ctx)
+                is_resuming_at_current_agent = False
+
+                async with Aclosing(sub_agent.run_async(ctx)) as agen:
+                    async for event in agen:
+                        yield event
+                        if event.actions.escalate:
+                            should_exit = True
+                        if ctx.should_pause_invocation(event):
+                            pause_invocation = True
+
+                if should_exit or pause_invocation or self._should_exit(ctx, snapshots.get(i)):
+                    should_exit = True
+                    break
+                snapshots[i] = dict(ctx.session.state)
+
+            start_index = 0
+            times_looped += 1
+            ctx.reset_sub_agent_states(self.name)
+
+        if pause_invocation:
+            return
+
+        if ctx.is_resumable:
+            ctx.set_agent_state(self.name, end_of_agent=True)
+            yield self._create_agent_state_event(ctx)
@@ -0,0 +1,239 @@
+"""Declarative auto-approval rules for tools that pause for human confirmation.
+
+Instead of hard-coding "above the threshold, always ask a human", a tool asks
+an `ApprovalPolicy` first. The policy walks its rules in order and the first
+rule that matches decides:
+
+    shipping_policy = ApprovalPolicy([
+        Rule("small_orders", "place_shipping_order", when={"num_containers": {"max": 5}}),
+        Rule(
+            "standing_rotterdam",
+            "place_shipping_order",
+            when={"num_containers": {"max": 20}, "destination": {"in": ["Rotterdam"]}},
+            min_prior_approvals=1,  # the user had an order approved before
+            daily_quota=50,  # at most 50 containers per user and day under this rule
+            quota_field="num_containers",
+        ),
+        Rule("blocked_destinations", "place_shipping_order", when={"destination": {"in": ["Atlantis"]}}, decision=REJECT),
+    ])
+
+    decision = shipping_policy.check(tool_context, "place_shipping_order", {"num_containers": 12, "destination": "Rotterdam"})
+    if decision.outcome == ASK:
+        tool_context.request_confirmation(...)
+
+Conditions compare a field of the tool's arguments (plus `user_id`) with
+`eq`, `in`, `not_in`, `min` or `max`. They are compiled into plain Python
+predicates once, when the rule is created. If no rule matches, the decision
+is `ask`. Every decision, including the human ones reported through
+`record_human()`, goes to an audit table in SQLite. Daily quotas are counted
+from that table. `min_prior_approvals` counts only human approvals, so an
+approval the policy granted itself never unlocks a more permissive rule.
+A quota rule whose `quota_field` is not a number answers `ask`.
+
+The audit database is opened on first use, at `audit_db_path`. By default
+that is approval_audit.db next to this module, or the path in the
+APPROVAL_AUDIT_DB environment variable.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Callable, Optional
+
+DEFAULT_AUDIT_DB_PATH = os.environ.get(
+    "APPROVAL_AUDIT_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "approval_audit.db")
+)
+
+APPROVE, REJECT, ASK = "approve", "reject", "ask"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS approval_audit (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    day TEXT NOT NULL,
+    tool_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT,
+    rule TEXT,
+    decision TEXT NOT NULL,
+    source TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    args TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_audit_human_history ON approval_audit (tool_name, user_id, source, decision);
+CREATE INDEX IF NOT EXISTS idx_audit_quota ON approval_audit (rule, user_id, day);
+"""
+
+_OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda value, expected: value == expected,
+    "in": lambda value, expected: value in expected,
+    "not_in": lambda value, expected: value not in expected,
+    "min": lambda value, expected: value >= expected,
+    "max": lambda value, expected: value <= expected,
+}
+
+
+def _compile_condition(field_name: str, spec: dict) -> Callable[[dict], bool]:
+    checks = []
+    for operator, expected in spec.items():
+        if operator not in _OPERATORS:
+            raise ValueError(f"Unknown operator '{operator}' for field '{field_name}'")
+        if operator in ("in", "not_in"):
+            expected = frozenset(expected)
+        checks.append((_OPERATORS[operator], expected))
+
+    def condition(values: dict) -> bool:
+        if field_name not in values:
+            return False
+        value = values[field_name]
+        try:
+            return all(check(value, expected) for check, expected in checks)
+        except TypeError:  # e.g. a string compared with a number
+            return False
+
+    return condition
+
+
+@dataclass
+class Rule:
+    """One approval rule; `when` maps argument names to conditions, e.g. {"num_containers": {"max": 20}}."""
+
+    name: str
+    tool_name: str
+    when: dict[str, dict] = field(default_factory=dict)
+    decision: str = APPROVE
+    min_prior_approvals: int = 0
+    daily_quota: Optional[float] = None
+    quota_field: Optional[str] = None  # what the quota counts; None counts calls
+
+    def __post_init__(self):
+        if self.decision not in (APPROVE, REJECT, ASK):
+            raise ValueError(f"Rule {self.name}: unknown decision '{self.decision}'")
+        self._conditions = [_compile_condition(name, spec) for name, spec in self.when.items()]
+
+    def matches(self, values: dict) -> bool:
+        return all(condition(values) for condition in self._conditions)
+
+    def quantity(self, args: dict) -> Optional[float]:
+        """How much of the daily quota a call uses; None if `quota_field` is not a non-negative number."""
+        if not self.quota_field:
+            return 1.0
+        try:
+            quantity = float(args.get(self.quota_field, 0))
+        except (TypeError, ValueError):
+            return None
+        return quantity if math.isfinite(quantity) and quantity >= 0 else None
+
+
+@dataclass
+class Decision:
+    outcome: str  # approve, reject or ask
+    rule: Optional[str] = None
+    reason: str = ""
+
+
+class ApprovalPolicy:
+    """Ordered approval rules with an audit log; the first matching rule decides."""
+
+    def __init__(self, rules: list[Rule], audit_db_path: str = DEFAULT_AUDIT_DB_PATH):
+        self._rules: dict[str, list[Rule]] = {}
+        for rule in rules:
+            self._rules.setdefault(rule.tool_name, []).append(rule)
+        self.audit_db_path = audit_db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use (callers hold `_lock`), so defining a policy creates no files.
+        if self._conn is None:
+            conn = sqlite3.connect(self.audit_db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def prior_approvals(self, tool_name: str, user_id: str) -> int:
+        """Human approvals of `tool_name` for this user; the policy's own approvals do not count."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM approval_audit WHERE tool_name = ? AND user_id = ? AND source = ? AND decision = ?",
+                (tool_name, user_id, "human", APPROVE),
+            ).fetchone()[0]
+
+    def used_quota(self, rule: Rule, user_id: str) -> float:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COALESCE(SUM(quantity), 0) FROM approval_audit WHERE rule = ? AND user_id = ? AND day = ?",
+                (rule.name, user_id, date.today().isoformat()),
+            ).fetchone()[0]
+
+    def evaluate(self, tool_name: str, args: dict, user_id: str) -> Decision:
+        """Returns the first matching rule's decision (without recording it)."""
+        values = {**args, "user_id": user_id}
+        prior = None
+        for rule in self._rules.get(tool_name, []):
+            if not rule.matches(values):
+                continue
+            # History and quota need the audit table, so they are checked only for matching rules.
+            if rule.min_prior_approvals:
+                prior = self.prior_approvals(tool_name, user_id) if prior is None else prior
+                if prior < rule.min_prior_approvals:
+                    continue
+            if rule.daily_quota is not None:
+                quantity = rule.quantity(args)
+                if quantity is None:
+                    return Decision(ASK, rule.name, f"'{rule.quota_field}' is not a valid quantity")
+                if self.used_quota(rule, user_id) + quantity > rule.daily_quota:
+                    continue
+            return Decision(rule.decision, rule.name, f"matched rule '{rule.name}'")
+        return Decision(ASK, None, "no rule matched")
+
+    def record(self, tool_name: str, args: dict, user_id: str, decision: Decision, source: str = "policy", session_id: Optional[str] = None):
+        """Appends a decision to the audit log (`source` is "policy" or "human")."""
+        rules = {rule.name: rule for rule in self._rules.get(tool_name, [])}
+        rule = rules.get(decision.rule)
+        quantity = (rule.quantity(args) or 0.0) if rule else 0.0
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO approval_audit (created_at, day, tool_name, user_id, session_id, rule, decision, source, quantity, args)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (now, date.fromtimestamp(now).isoformat(), tool_name, user_id, session_id, decision.rule,
+                 decision.outcome, source, quantity, json.dumps(args)),
+            )
+
+    def check(self, tool_context, tool_name: str, args: dict) -> Decision:
+        """Evaluates the rules for this tool call and records the decision."""
+        session = tool_context.session
+        decision = self.evaluate(tool_name, args, session.user_id)
+        self.record(tool_name, args, session.user_id, decision, session_id=session.id)
+        return decision
+
+    def record_human(self, tool_context, tool_name: str, args: dict, confirmed: bool):
+        """Records a human approval/rejection, so it counts as history for later rules."""
+        session = tool_context.session
+        decision = Decision(APPROVE if confirmed else REJECT, None, "human decision")
+        self.record(tool_name, args, session.user_id, decision, source="human", session_id=session.id)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def audit_log(self, limit: int = 100, tool_name: Optional[str] = None) -> list[dict]:
+        """Most recent audit entries first."""
+        query, params = "SELECT * FROM approval_audit", []
+        if tool_name:
+            query += " WHERE tool_name = ?"
+            params.append(tool_name)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+        return [{**dict(row), "args": json.loads(row["args"])} for row in rows]
@@ -0,0 +1,67 @@
+# Compares the two ways my_calculation_agent can compute a conversion:
+#   * local:  the `calculate` FunctionTool (sandboxed Decimal evaluator, safe_calc.py)
+#   * remote: the original CalculationAgent (LLM writes Python, BuiltInCodeExecutor runs it)
+#
+# Run from this folder:  python benchmark_calculation.py [remote_runs]
+# The remote path needs GOOGLE_API_KEY (in the environment or a .env file) and is skipped without it.
+import asyncio
+import os
+import statistics
+import sys
+import time
+import timeit
+
+from dotenv import load_dotenv
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from model_clients import close_shared_clients
+from my_calculation_agent.agent import calculate, calculation_agent
+
+load_dotenv()
+
+EXPRESSION = "1250 * (1 - 0.02) * 0.93"
+REQUEST = "Calculate 1250 minus a 2% fee, then multiply the rest by an exchange rate of 0.93."
+LOCAL_RUNS = 10_000
+
+
+def benchmark_local() -> float:
+    """Returns the mean time of one local `calculate` call in seconds."""
+    return timeit.timeit(lambda: calculate(EXPRESSION), number=LOCAL_RUNS) / LOCAL_RUNS
+
+
+async def benchmark_remote(runs: int) -> list[float]:
+    """Returns the time of each CalculationAgent round trip in seconds."""
+    runner = InMemoryRunner(agent=calculation_agent, app_name="calculation_benchmark")
+    timings = []
+    for _ in range(runs):
+        session = await runner.session_service.create_session(app_name=runner.app_name, user_id="benchmark")
+        message = types.Content(role="user", parts=[types.Part(text=REQUEST)])
+        start = time.perf_counter()
+        async for _event in runner.run_async(user_id="benchmark", session_id=session.id, new_message=message):
+            pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def main():
+    remote_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    local = benchmark_local()
+    print(f"\n🧮 Local calculate():   {local * 1e6:10.1f} µs per call  ({LOCAL_RUNS} runs, result {calculate(EXPRESSION)['result']})")
+
+    if not os.getenv("GOOGLE_API_KEY"):
+        print("⏭️  CalculationAgent skipped: GOOGLE_API_KEY is not set.")
+        return
+
+    try:
+        remote = await benchmark_remote(remote_runs)
+    finally:
+        await close_shared_clients()
+    median = statistics.median(remote)
+    print(f"🤖 CalculationAgent:    {median * 1e6:10.1f} µs per call  (median of {remote_runs} runs, {median:.2f}s)")
+    print(f"⚡ Speed-up:            {median / local:,.0f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
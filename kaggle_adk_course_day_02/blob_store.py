@@ -0,0 +1,170 @@
+"""Content-addressed storage for binary tool results (images, audio, files).
+
+MCP tools return binary content as base64 text, e.g. `getTinyImage` returns
+`{"type": "image", "data": "iVBORw0KGgo...", "mimeType": "image/png"}`.
+Left as is, that text is copied into the function response event, sent back
+to the model and written to the session database on every call.
+`BlobStore.externalize()` decodes such items once, stores the bytes in a
+local directory under their SHA-256 (so the same image is stored only once)
+and leaves a small handle in their place:
+
+    {"type": "image", "mimeType": "image/png", "uri": "blob://sha256/4f1c...", "size": 95}
+
+Consumers that need the bytes open the handle lazily; `open()` memory-maps
+the file instead of reading it:
+
+    from blob_store import default_blob_store
+
+    with default_blob_store.open(handle["uri"]) as view:  # memoryview, no copy
+        ...
+    part = default_blob_store.as_part(handle)  # types.Part for the model or an artifact
+
+The agents that call the tools resolve the handles with
+`after_tool_callback=default_blob_store.save_artifacts`. A handle in a tool
+result is saved as a session artifact, which the web UI shows and the
+`load_artifacts` tool hands to the model. Only the artifact's file name is
+added to the handle, so the event stays small.
+
+ADK artifacts are inline `types.Part` bytes, so saving one is the only place
+a blob is read into memory: one copy out of the memory map, made once per
+session and blob (a blob the session already has as an artifact is not read
+again) and only for blobs up to `max_artifact_size`. Larger blobs keep their
+plain handle; `save_artifact()` stores one explicitly when it is needed.
+"""
+
+import base64
+import hashlib
+import logging
+import mimetypes
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+BLOB_SCHEME = "blob://sha256/"
+DEFAULT_BLOB_DIR = Path(tempfile.gettempdir()) / "adk_blobs"
+DEFAULT_MAX_ARTIFACT_SIZE = 5 * 1024 * 1024  # bytes; larger blobs are not saved as artifacts automatically
+
+
+class BlobStore:
+    """A directory of immutable blobs named by the SHA-256 of their content."""
+
+    def __init__(self, root: Union[str, Path] = DEFAULT_BLOB_DIR, max_artifact_size: int = DEFAULT_MAX_ARTIFACT_SIZE):
+        self.root = Path(root)
+        self.max_artifact_size = max_artifact_size
+
+    def path(self, uri: str) -> Path:
+        if not uri.startswith(BLOB_SCHEME):
+            raise ValueError(f"Not a blob URI: {uri}")
+        digest = uri[len(BLOB_SCHEME):]
+        return self.root / digest[:2] / digest
+
+    def put(self, data: bytes) -> str:
+        """Stores `data` (once) and returns its blob URI."""
+        uri = BLOB_SCHEME + hashlib.sha256(data).hexdigest()
+        path = self.path(uri)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial blob.
+            with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
+                tmp.write(data)
+            os.replace(tmp.name, path)
+        return uri
+
+    @contextmanager
+    def open(self, uri: str) -> Iterator[memoryview]:
+        """Memory-maps the blob for the `with` block and yields a read-only view of its bytes.
+
+        The mapping is closed when the block ends; copy what must outlive it.
+        """
+        with open(self.path(uri), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                yield view
+
+    def read(self, uri: str) -> bytes:
+        with self.open(uri) as view:
+            return bytes(view)
+
+    def as_part(self, handle: dict) -> types.Part:
+        """Decodes a handle into an inline `types.Part`, only when a consumer needs the bytes (one copy)."""
+        return types.Part.from_bytes(data=self.read(handle["uri"]), mime_type=handle.get("mimeType"))
+
+    def _store_base64(self, encoded: str) -> tuple[str, int]:
+        data = base64.b64decode(encoded)
+        return self.put(data), len(data)
+
+    def externalize(self, result: Any) -> Any:
+        """Replaces base64 image/audio/blob items in an MCP tool result with blob handles."""
+        if not isinstance(result, dict) or not isinstance(result.get("content"), list):
+            return result
+        content = []
+        for item in result["content"]:
+            if item.get("type") in ("image", "audio") and "data" in item:
+                uri, size = self._store_base64(item["data"])
+                item = {"type": item["type"], "mimeType": item.get("mimeType"), "uri": uri, "size": size}
+            elif item.get("type") == "resource" and "blob" in item.get("resource", {}):
+                resource = dict(item["resource"])
+                resource["blob_uri"], resource["size"] = self._store_base64(resource.pop("blob"))
+                item = {**item, "resource": resource}
+            content.append(item)
+        return {**result, "content": content}
+
+    @staticmethod
+    def artifact_name(handle: dict) -> str:
+        """The artifact file name of a handle; the same blob always gets the same name."""
+        extension = mimetypes.guess_extension(handle.get("mimeType") or "") or ".bin"
+        return f"{handle['type']}_{handle['uri'][len(BLOB_SCHEME):][:12]}{extension}"
+
+    async def save_artifact(self, tool_context: ToolContext, handle: dict, existing: Optional[set] = None) -> str:
+        """Saves the blob of `handle` as a session artifact unless the session already has it.
+
+        `existing` is the session's artifact names, if the caller listed them
+        already. Raises `ValueError` when no artifact service is configured.
+        """
+        filename = self.artifact_name(handle)
+        if existing is None:
+            existing = set(await tool_context.list_artifacts())
+        if filename not in existing:
+            await tool_context.save_artifact(filename, self.as_part(handle))
+            existing.add(filename)
+        return filename
+
+    async def save_artifacts(
+        self, tool: BaseTool, args: dict, tool_context: ToolContext, tool_response: Any
+    ) -> Optional[dict]:
+        """`after_tool_callback` that saves the blobs a tool result refers to as session artifacts.
+
+        Each image/audio handle up to `max_artifact_size` bytes gets the
+        `artifact` file name it is stored under; a blob is read and saved only
+        the first time a session sees it. Without an artifact service the
+        result is left unchanged.
+        """
+        if not isinstance(tool_response, dict) or not isinstance(tool_response.get("content"), list):
+            return None
+        content, saved, existing = [], False, None
+        for item in tool_response["content"]:
+            if isinstance(item, dict) and "uri" in item and "artifact" not in item:
+                if item.get("size", 0) > self.max_artifact_size:
+                    logging.info(f"[BlobStore] Not saving {item['uri']} ({item['size']} bytes) as an artifact")
+                else:
+                    try:
+                        if existing is None:
+                            existing = set(await tool_context.list_artifacts())
+                        item, saved = {**item, "artifact": await self.save_artifact(tool_context, item, existing)}, True
+                    except ValueError as e:  # no artifact service configured
+                        logging.warning(f"[BlobStore] Cannot save {item['uri']} as an artifact: {e}")
+                        return None
+            content.append(item)
+        return {**tool_response, "content": content} if saved else None
+
+
+default_blob_store = BlobStore()
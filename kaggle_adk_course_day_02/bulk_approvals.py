@@ -0,0 +1,122 @@
+"""Resume many paused invocations at once after approvers decided on them.
+
+Each paused `place_shipping_order` call is answered by sending its
+`adk_request_confirmation` FunctionResponse back to the runner with the
+paused `invocation_id`. A resumable app continues that invocation from its
+checkpoint instead of replaying the conversation. `resume_confirmations()`
+does this for a whole batch of decisions, with at most `concurrency`
+invocations running at the same time:
+
+    from bulk_approvals import resume_confirmations
+
+    pending = default_confirmation_store.list_pending(destination="Rotterdam")
+    results = await resume_confirmations(
+        runner,
+        {confirmation.function_call_id: True for confirmation in pending},
+        concurrency=20,
+        resolved_by="alice",
+    )
+
+Every decision is first claimed in the confirmation store (so two approvers
+cannot resume the same call); if resuming fails, the row goes back to pending.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from google.adk.flows.llm_flows.functions import REQUEST_CONFIRMATION_FUNCTION_CALL_NAME
+from google.adk.runners import Runner
+from google.adk.sessions import Session
+from google.genai import types
+
+from confirmation_store import ConfirmationStore, PendingConfirmation, default_confirmation_store
+
+DEFAULT_CONCURRENCY = 10
+
+
+@dataclass
+class ResumeResult:
+    function_call_id: str
+    confirmed: bool
+    status: str  # "resumed", "skipped" (not pending) or "failed"
+    response: Optional[str] = None  # the agent's final text
+    error: Optional[str] = None
+
+
+def find_confirmation_request(session: Session, function_call_id: str) -> Optional[str]:
+    """Returns the id of the `adk_request_confirmation` call that paused `function_call_id`."""
+    # The request is normally among the last events of the paused invocation.
+    for event in reversed(session.events):
+        for function_call in event.get_function_calls():
+            if (
+                function_call.name == REQUEST_CONFIRMATION_FUNCTION_CALL_NAME
+                and function_call.args.get("originalFunctionCall", {}).get("id") == function_call_id
+            ):
+                return function_call.id
+    return None
+
+
+async def _resume(runner: Runner, confirmation: PendingConfirmation, confirmed: bool) -> Optional[str]:
+    session = await runner.session_service.get_session(
+        app_name=confirmation.app_name, user_id=confirmation.user_id, session_id=confirmation.session_id
+    )
+    if session is None:
+        raise LookupError(f"Session {confirmation.session_id} not found")
+    request_id = find_confirmation_request(session, confirmation.function_call_id)
+    if request_id is None:
+        raise LookupError(f"No confirmation request for {confirmation.function_call_id} in the session")
+
+    approval = types.Content(
+        role="user",
+        parts=[
+            types.Part(
+                function_response=types.FunctionResponse(
+                    id=request_id,
+                    name=REQUEST_CONFIRMATION_FUNCTION_CALL_NAME,
+                    response={"confirmed": confirmed},
+                )
+            )
+        ],
+    )
+    final_text = None
+    async for event in runner.run_async(
+        user_id=confirmation.user_id,
+        session_id=confirmation.session_id,
+        new_message=approval,
+        invocation_id=confirmation.invocation_id,  # continue the paused invocation
+    ):
+        if event.is_final_response() and event.content and event.content.parts:
+            final_text = "".join(part.text or "" for part in event.content.parts) or final_text
+    return final_text
+
+
+async def resume_confirmations(
+    runner: Runner,
+    decisions: dict[str, bool],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    resolved_by: Optional[str] = None,
+    store: ConfirmationStore = default_confirmation_store,
+) -> list[ResumeResult]:
+    """Applies `{function_call_id: confirmed}` decisions and resumes the paused invocations.
+
+    Returns one result per decision, in the same order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def apply(function_call_id: str, confirmed: bool) -> ResumeResult:
+        confirmation = store.get(function_call_id)
+        # Claiming the row first keeps a second approver (or a retry) from resuming it twice.
+        if confirmation is None or not store.resolve([function_call_id], confirmed, resolved_by):
+            return ResumeResult(function_call_id, confirmed, "skipped", error="not pending")
+        async with semaphore:
+            try:
+                response = await _resume(runner, confirmation, confirmed)
+            except Exception as e:
+                logging.warning(f"[BulkApprovals] Resuming {function_call_id} failed: {e!r}")
+                store.reopen([function_call_id])
+                return ResumeResult(function_call_id, confirmed, "failed", error=str(e))
+        return ResumeResult(function_call_id, confirmed, "resumed", response=response)
+
+    return await asyncio.gather(*(apply(call_id, confirmed) for call_id, confirmed in decisions.items()))
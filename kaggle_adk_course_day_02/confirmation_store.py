@@ -0,0 +1,215 @@
+"""Durable, indexed store of tool calls that wait for human confirmation.
+
+`tool_context.request_confirmation()` keeps the pending request inside the
+session's events, so answering "which orders are waiting for approval?"
+means loading and scanning every session. Tools that pause for approval
+also record the request here, in one SQLite table indexed by status, age
+and the payload fields approvers filter on, e.g. `num_containers` and
+`destination`:
+
+    from confirmation_store import default_confirmation_store as store
+
+    store.list_pending(min_containers=10, destination="Rotterdam")
+    store.resolve(["<function_call_id>", ...], confirmed=True, resolved_by="alice")
+
+A row points back to its session (`app_name`, `user_id`, `session_id`,
+`invocation_id`, `function_call_id`), which is what is needed to resume the
+paused invocation. Resolving a row records the decision; the paused tool
+call itself is answered by resuming that invocation.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+# Next to this module rather than in the current directory; CONFIRMATIONS_DB overrides it.
+DEFAULT_DB_PATH = os.environ.get(
+    "CONFIRMATIONS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "confirmations.db")
+)
+
+PENDING, APPROVED, REJECTED = "pending", "approved", "rejected"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS confirmations (
+    function_call_id TEXT PRIMARY KEY,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    invocation_id TEXT NOT NULL,
+    tool_name TEXT NOT NULL,
+    hint TEXT,
+    payload TEXT NOT NULL,
+    num_containers INTEGER,
+    destination TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    resolved_at REAL,
+    resolved_by TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_confirmations_status_age ON confirmations (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_confirmations_containers ON confirmations (status, num_containers);
+CREATE INDEX IF NOT EXISTS idx_confirmations_destination ON confirmations (status, destination);
+"""
+
+
+@dataclass
+class PendingConfirmation:
+    function_call_id: str
+    app_name: str
+    user_id: str
+    session_id: str
+    invocation_id: str
+    tool_name: str
+    hint: Optional[str]
+    payload: dict
+    status: str
+    created_at: float
+    resolved_at: Optional[float] = None
+    resolved_by: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "PendingConfirmation":
+        return cls(
+            function_call_id=row["function_call_id"],
+            app_name=row["app_name"],
+            user_id=row["user_id"],
+            session_id=row["session_id"],
+            invocation_id=row["invocation_id"],
+            tool_name=row["tool_name"],
+            hint=row["hint"],
+            payload=json.loads(row["payload"]),
+            status=row["status"],
+            created_at=row["created_at"],
+            resolved_at=row["resolved_at"],
+            resolved_by=row["resolved_by"],
+        )
+
+
+class ConfirmationStore:
+    """SQLite-backed table of pending, approved and rejected confirmations."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use (callers hold `_lock`), so importing the module creates no files.
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def record(self, tool_context, tool_name: str, hint: Optional[str], payload: dict) -> None:
+        """Records the confirmation `tool_context` is requesting (call right after `request_confirmation`)."""
+        session = tool_context.session
+        with self._lock:
+            # A retried tool call must not reset a decision, so existing rows are kept.
+            self._db.execute(
+                "INSERT OR IGNORE INTO confirmations (function_call_id, app_name, user_id, session_id,"
+                " invocation_id, tool_name, hint, payload, num_containers, destination, status, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    tool_context.function_call_id,
+                    session.app_name,
+                    session.user_id,
+                    session.id,
+                    tool_context.invocation_id,
+                    tool_name,
+                    hint,
+                    json.dumps(payload),
+                    payload.get("num_containers"),
+                    payload.get("destination"),
+                    PENDING,
+                    time.time(),
+                ),
+            )
+
+    def get(self, function_call_id: str) -> Optional[PendingConfirmation]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM confirmations WHERE function_call_id = ?", (function_call_id,)
+            ).fetchone()
+        return PendingConfirmation.from_row(row) if row else None
+
+    def list_pending(
+        self,
+        min_containers: Optional[int] = None,
+        max_containers: Optional[int] = None,
+        destination: Optional[str] = None,
+        older_than: Optional[float] = None,
+        app_name: Optional[str] = None,
+        limit: int = 100,
+    ) -> list[PendingConfirmation]:
+        """Pending confirmations, oldest first. `older_than` is an age in seconds."""
+        clauses, params = ["status = ?"], [PENDING]
+        if min_containers is not None:
+            clauses.append("num_containers >= ?")
+            params.append(min_containers)
+        if max_containers is not None:
+            clauses.append("num_containers <= ?")
+            params.append(max_containers)
+        if destination is not None:
+            clauses.append("destination = ?")
+            params.append(destination)
+        if older_than is not None:
+            clauses.append("created_at <= ?")
+            params.append(time.time() - older_than)
+        if app_name is not None:
+            clauses.append("app_name = ?")
+            params.append(app_name)
+        query = f"SELECT * FROM confirmations WHERE {' AND '.join(clauses)} ORDER BY created_at LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(query, (*params, limit)).fetchall()
+        return [PendingConfirmation.from_row(row) for row in rows]
+
+    def count_pending(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM confirmations WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    def resolve(self, function_call_ids: Iterable[str], confirmed: bool, resolved_by: Optional[str] = None) -> int:
+        """Approves or rejects pending confirmations in one transaction; returns how many changed."""
+        ids = list(function_call_ids)
+        status = APPROVED if confirmed else REJECTED
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                changed = sum(
+                    self._db.execute(
+                        "UPDATE confirmations SET status = ?, resolved_at = ?, resolved_by = ?"
+                        " WHERE function_call_id = ? AND status = ?",
+                        (status, now, resolved_by, function_call_id, PENDING),
+                    ).rowcount
+                    for function_call_id in ids
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return changed
+
+    def reopen(self, function_call_ids: Iterable[str]) -> None:
+        """Puts resolved confirmations back to pending, e.g. when resuming their invocation failed."""
+        with self._lock:
+            self._db.executemany(
+                "UPDATE confirmations SET status = ?, resolved_at = NULL, resolved_by = NULL WHERE function_call_id = ?",
+                [(PENDING, function_call_id) for function_call_id in function_call_ids],
+            )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+default_confirmation_store = ConfirmationStore()
@@ -0,0 +1,385 @@
+"""A warm pool of MCP server processes shared by every agent in this folder.
+
+`McpToolset` starts its stdio server (`npx -y @modelcontextprotocol/server-everything`)
+the first time an agent needs its tools, so the first request waits for npx
+resolution and Node start-up, and every toolset keeps exactly one process.
+`PooledMcpToolset` instead borrows its sessions from an `McpServerPool` that
+
+  - spawns `size` server processes concurrently and health-checks them
+    (MCP `initialize` + periodic `ping`),
+  - hands out sessions round-robin, so tool calls from concurrent sessions
+    are spread over the processes, and
+  - replaces processes that crashed or stopped answering pings.
+
+Pools are shared per server command, so two toolsets for the same server use
+the same processes:
+
+    from mcp_pool import PooledMcpToolset
+
+    mcp_image_server = PooledMcpToolset(
+        connection_params=StdioConnectionParams(server_params=..., timeout=30),
+        tool_filter=["getTinyImage"],
+        pool_size=2,
+    )
+
+    await mcp_image_server.warm_up()  # at startup, before the first request
+
+Without a warm-up the pool starts on first use, inside the first request.
+`adk web` imports an agent only when its first request arrives, so
+`serve.py` runs the same web server with a startup hook that imports the MCP
+agents and awaits `warm_up_mcp_pools()` before it accepts requests. Code
+that builds its own `Runner` awaits `toolset.warm_up()` (or
+`warm_up_mcp_pools()`) once before the first `run_async()`.
+
+Each toolset holds a reference to its pool. `toolset.close()` (which
+`Runner.close()` calls) releases it, and the pool's processes stop when the
+last toolset using it is closed. `close_mcp_pools()` stops every pool at
+once on shutdown; toolsets closed after that release nothing. A toolset
+created while a released pool of the same server is still stopping gets a
+new pool that starts its servers only once the old ones have exited.
+
+Tool discovery is cached too: the server's tool listing is fetched once per
+server identity (command + args + the server's name and version), the
+toolset's `tool_filter` is applied to the raw listing before any tool is
+built, and each tool converts its schema to a function declaration once.
+A recycled server that reports a different version invalidates the cache.
+
+With a `blob_store`, image, audio and binary resource results are stored in
+it and replaced by small handles before they reach the event (see
+blob_store.py).
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import sys
+from contextlib import AsyncExitStack
+from datetime import timedelta
+from typing import Any, Optional, TextIO
+
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.mcp_tool.mcp_session_manager import (
+    MCPSessionManager,
+    StdioConnectionParams,
+    retry_on_closed_resource,
+)
+from google.adk.tools.mcp_tool.mcp_tool import McpTool
+from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
+from google.genai.types import FunctionDeclaration
+from mcp import ClientSession
+from mcp.types import Implementation, Tool
+
+from blob_store import BlobStore
+
+DEFAULT_POOL_SIZE = 2
+HEALTH_INTERVAL = 30  # seconds between health checks
+HEALTH_TIMEOUT = 5  # seconds a server has to answer a ping
+
+_pools: dict[str, "McpServerPool"] = {}
+_closing: dict[str, "McpServerPool"] = {}  # released pools whose servers are still stopping
+_listings: dict[str, list[Tool]] = {}  # raw tool listings per server identity
+
+
+class _PooledServer:
+    """One server process; its session lives in (and is closed by) its own task."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.session: Optional[ClientSession] = None
+        self.server_info: Optional[Implementation] = None  # name and version reported by `initialize`
+        self.ready = asyncio.Event()  # set once the session is usable or failed to start
+        self.stop = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class McpServerPool(MCPSessionManager):
+    """An `MCPSessionManager` backed by several pre-spawned, health-checked servers.
+
+    `McpTool` asks its session manager for a session before every call, so
+    returning the next healthy session here is enough to spread tool calls
+    over all processes.
+    """
+
+    def __init__(
+        self,
+        connection_params,
+        size: int = DEFAULT_POOL_SIZE,
+        health_interval: float = HEALTH_INTERVAL,
+        errlog: TextIO = sys.stderr,
+    ):
+        super().__init__(connection_params=connection_params, errlog=errlog)
+        self.key = _pool_key(self._connection_params)
+        self.size = size
+        self.health_interval = health_interval
+        self._servers: list[_PooledServer] = []
+        self._next = itertools.count()
+        self._health_task: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+        self._close_lock = asyncio.Lock()
+        self.closed = False
+        self.previous: Optional[McpServerPool] = None  # a released pool for the same server, stopped before spawning
+        self.recycled = 0
+        self.users = 0  # toolsets holding this pool, see `release_mcp_pool()`
+
+    @property
+    def _timeout(self) -> float:
+        return getattr(self._connection_params, "timeout", HEALTH_TIMEOUT)
+
+    async def start(self, wait_for_all: bool = False):
+        """Spawns the servers (once). Returns when one is ready, or all of them with `wait_for_all`."""
+        async with self._start_lock:
+            if self.closed:
+                raise ConnectionError("The MCP server pool is closed")
+            if self.previous is not None:
+                # Never run two sets of processes for one server: wait until the released pool has stopped.
+                await self.previous.close()
+                self.previous = None
+            if not self._servers:
+                logging.info(f"[McpServerPool] Spawning {self.size} MCP server(s)")
+                self._servers = [self._spawn(index) for index in range(self.size)]
+                self._health_task = asyncio.create_task(self._health_loop())
+        if wait_for_all:
+            await asyncio.gather(*(server.ready.wait() for server in self._servers))
+        elif not self._healthy():
+            await self._wait_for_ready()
+
+    def _spawn(self, index: int) -> _PooledServer:
+        server = _PooledServer(index)
+        server.task = asyncio.create_task(self._serve(server))
+        return server
+
+    async def _serve(self, server: _PooledServer):
+        # anyio requires the stdio client to be closed by the task that opened it,
+        # so each server gets a task that holds its session until it is stopped.
+        try:
+            async with AsyncExitStack() as exit_stack:
+                transports = await exit_stack.enter_async_context(self._create_client())
+                if isinstance(self._connection_params, StdioConnectionParams):
+                    session = ClientSession(*transports[:2], read_timeout_seconds=timedelta(seconds=self._timeout))
+                else:
+                    session = ClientSession(*transports[:2])
+                session = await exit_stack.enter_async_context(session)
+                initialized = await asyncio.wait_for(session.initialize(), self._timeout)
+                server.server_info = initialized.serverInfo
+                server.session = session
+                server.ready.set()
+                logging.info(f"[McpServerPool] Server {server.index} ready")
+                await server.stop.wait()
+        except Exception as e:
+            logging.warning(f"[McpServerPool] Server {server.index} failed: {e!r}")
+        finally:
+            server.session = None
+            server.ready.set()
+
+    def _is_alive(self, server: _PooledServer) -> bool:
+        return server.session is not None and not self._is_session_disconnected(server.session)
+
+    def _healthy(self) -> list[_PooledServer]:
+        return [server for server in self._servers if self._is_alive(server)]
+
+    async def _wait_for_ready(self):
+        waiters = [asyncio.create_task(server.ready.wait()) for server in self._servers]
+        try:
+            await asyncio.wait(waiters, timeout=self._timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    def _recycle(self, server: _PooledServer):
+        """Stops `server` and puts a freshly spawned one in its slot."""
+        logging.warning(f"[McpServerPool] Recycling server {server.index}")
+        server.stop.set()
+        self._servers[self._servers.index(server)] = self._spawn(server.index)
+        self.recycled += 1
+
+    def _recycle_dead(self):
+        for server in list(self._servers):
+            # Servers that are still starting up have not set `ready` yet.
+            if server.ready.is_set() and not self._is_alive(server):
+                self._recycle(server)
+
+    async def _ping(self, server: _PooledServer) -> bool:
+        try:
+            await asyncio.wait_for(server.session.send_ping(), HEALTH_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            self._recycle_dead()
+            for server in self._healthy():
+                if not await self._ping(server):
+                    self._recycle(server)
+
+    async def create_session(self, headers: Optional[dict] = None) -> ClientSession:
+        """Returns the next healthy pooled session (round-robin)."""
+        await self.start()
+        for _ in range(2):
+            healthy = self._healthy()
+            if healthy:
+                return healthy[next(self._next) % len(healthy)].session
+            # Every server crashed (or is still starting): replace the dead ones and wait once.
+            self._recycle_dead()
+            await self._wait_for_ready()
+        raise ConnectionError("No MCP server in the pool is available")
+
+    @property
+    def identity(self) -> str:
+        """Server command + args + the name/version a running server reports."""
+        info = next((server.server_info for server in self._healthy() if server.server_info), None)
+        return f"{self.key}|{info.name}@{info.version}" if info else self.key
+
+    def stats(self) -> dict:
+        return {"size": self.size, "healthy": len(self._healthy()), "recycled": self.recycled}
+
+    async def close(self):
+        """Stops the health checks and every server process; later calls wait for the first one."""
+        async with self._close_lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self._health_task:
+                self._health_task.cancel()
+            for server in self._servers:
+                server.stop.set()
+            await asyncio.gather(*(server.task for server in self._servers), return_exceptions=True)
+            self._servers = []
+
+
+def _pool_key(connection_params) -> str:
+    params = getattr(connection_params, "server_params", connection_params)
+    return json.dumps(params.model_dump(mode="json"), sort_keys=True)
+
+
+def get_mcp_pool(connection_params, size: int = DEFAULT_POOL_SIZE, **kwargs) -> McpServerPool:
+    """Returns the shared pool for this server, creating it on first use.
+
+    Every caller holds a reference until it calls `release_mcp_pool()`.
+    """
+    key = _pool_key(connection_params)
+    pool = _pools.get(key)
+    if pool is None:
+        pool = _pools[key] = McpServerPool(connection_params, size=size, **kwargs)
+        pool.previous = _closing.get(key)
+    pool.users += 1
+    return pool
+
+
+async def _close_pool(pool: McpServerPool):
+    if _pools.get(pool.key) is pool:
+        del _pools[pool.key]
+    _closing[pool.key] = pool
+    try:
+        await pool.close()
+    finally:
+        if _closing.get(pool.key) is pool:
+            del _closing[pool.key]
+
+
+async def release_mcp_pool(pool: McpServerPool):
+    """Drops one reference to `pool` and closes it when nobody uses it anymore.
+
+    Releasing a pool that is already closed (e.g. by `close_mcp_pools()`) does nothing.
+    """
+    if pool.closed or pool.users <= 0:
+        return
+    pool.users -= 1
+    if pool.users == 0:
+        await _close_pool(pool)
+
+
+async def warm_up_mcp_pools():
+    """Spawns and health-checks the servers of every pool created so far; call once at startup."""
+    await asyncio.gather(*(pool.start(wait_for_all=True) for pool in list(_pools.values())))
+
+
+class CachedMcpTool(McpTool):
+    """An `McpTool` that converts its input schema to a function declaration only once.
+
+    ADK asks every tool for its declaration on every model call. With a
+    `blob_store`, binary content in the tool's results is replaced by handles.
+    """
+
+    _declaration: Optional[FunctionDeclaration] = None
+
+    def __init__(self, *, blob_store: Optional[BlobStore] = None, **kwargs):
+        super().__init__(**kwargs)
+        self._blob_store = blob_store
+
+    def _get_declaration(self) -> FunctionDeclaration:
+        if self._declaration is None:
+            self._declaration = super()._get_declaration()
+        return self._declaration
+
+    async def _run_async_impl(self, *, args, tool_context, credential) -> dict[str, Any]:
+        result = await super()._run_async_impl(args=args, tool_context=tool_context, credential=credential)
+        return self._blob_store.externalize(result) if self._blob_store else result
+
+
+class PooledMcpToolset(McpToolset):
+    """An `McpToolset` whose tools run on a shared, warm `McpServerPool`."""
+
+    def __init__(
+        self,
+        *,
+        connection_params,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        health_interval: float = HEALTH_INTERVAL,
+        blob_store: Optional[BlobStore] = None,
+        **kwargs,
+    ):
+        super().__init__(connection_params=connection_params, **kwargs)
+        self._blob_store = blob_store
+        self._mcp_session_manager = get_mcp_pool(
+            self._connection_params, size=pool_size, health_interval=health_interval, errlog=self._errlog
+        )
+        self._cached_tools: tuple[str, list[BaseTool]] = ("", [])
+        self._released = False
+
+    @retry_on_closed_resource
+    async def get_tools(self, readonly_context: Optional[ReadonlyContext] = None) -> list[BaseTool]:
+        """Returns this toolset's tools, listing and converting them only when the server changed."""
+        session = await self._mcp_session_manager.create_session()
+        identity = self._mcp_session_manager.identity
+        cached_identity, tools = self._cached_tools
+        if cached_identity != identity:
+            listing = _listings.get(identity)
+            if listing is None:
+                listing = _listings[identity] = (await session.list_tools()).tools
+            # A list filter only needs the names, so unwanted tools are never built.
+            if isinstance(self.tool_filter, list):
+                listing = [tool for tool in listing if tool.name in self.tool_filter]
+            tools = [
+                CachedMcpTool(
+                    mcp_tool=tool,
+                    mcp_session_manager=self._mcp_session_manager,
+                    auth_scheme=self._auth_scheme,
+                    auth_credential=self._auth_credential,
+                    require_confirmation=self._require_confirmation,
+                    header_provider=self._header_provider,
+                    blob_store=self._blob_store,
+                )
+                for tool in listing
+            ]
+            self._cached_tools = (identity, tools)
+        # Predicate filters may depend on the context, so they are applied on every call.
+        return [tool for tool in tools if self._is_tool_selected(tool, readonly_context)]
+
+    async def warm_up(self):
+        """Spawns and health-checks every server in the pool; call once at startup."""
+        await self._mcp_session_manager.start(wait_for_all=True)
+
+    async def close(self) -> None:
+        """Releases this toolset's pool; its servers stop once no other toolset uses it."""
+        if not self._released:
+            self._released = True
+            await release_mcp_pool(self._mcp_session_manager)
+
+
+async def close_mcp_pools():
+    """Closes every pool (call once on shutdown)."""
+    await asyncio.gather(*(_close_pool(pool) for pool in list(_pools.values())))
@@ -2,7 +2,7 @@ import uuid
 from google.genai import types
 
 from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import InMemoryRunner
@@ -15,23 +15,41 @@ from mcp import StdioServerParameters
 
 from google.adk.apps.app import App, ResumabilityConfig
 from google.adk.tools.function_tool import FunctionTool
+from approval_policy import APPROVE, REJECT, ApprovalPolicy, Rule
+from confirmation_store import default_confirmation_store
 
 print("✅ ADK components imported successfully.")
 LARGE_ORDER_THRESHOLD = 5
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
-
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
+
+
+# Approval rules, checked in order before an order pauses for a human. The first matching rule decides;
+# orders that match no rule wait for approval. Every decision is written to an audit log.
+shipping_policy = ApprovalPolicy([
+    # Small orders are always fine.
+    Rule("small_orders", "place_shipping_order", when={"num_containers": {"max": LARGE_ORDER_THRESHOLD}}),
+    # Standing approval: users who had an order approved by a human before may ship up to 20 containers per order
+    # to regular destinations, and at most 60 containers a day this way.
+    Rule(
+        "standing_approval",
+        "place_shipping_order",
+        when={"num_containers": {"max": 20}, "destination": {"in": ["Rotterdam", "Singapore", "Shanghai"]}},
+        min_prior_approvals=1,
+        daily_quota=60,
+        quota_field="num_containers",
+    ),
+])
 
 
 def place_shipping_order(
     num_containers: int, destination: str, tool_context: ToolContext
 ) -> dict:
-    """Places a shipping order. Requires approval if ordering more than 5 containers (LARGE_ORDER_THRESHOLD).
+    """Places a shipping order. Requires approval if ordering more than 5 containers (LARGE_ORDER_THRESHOLD),
+    unless a standing approval rule covers the order.
 
     Args:
         num_containers: Number of containers to ship
@@ -41,26 +59,36 @@ def place_shipping_order(
         Dictionary with order status
     """
 
+    args = {"num_containers": num_containers, "destination": destination}
+
     # -----------------------------------------------------------------------------------------------
     # -----------------------------------------------------------------------------------------------
-    # SCENARIO 1: Small orders (≤5 containers) auto-approve
-    if num_containers <= LARGE_ORDER_THRESHOLD:
-        return {
-            "status": "approved",
-            "order_id": f"ORD-{num_containers}-AUTO",
-            "num_containers": num_containers,
-            "destination": destination,
-            "message": f"Order auto-approved: {num_containers} containers to {destination}",
-        }
+    # SCENARIO 1: The approval policy decides on its own: small orders (≤5 containers) and orders
+    # covered by a standing approval auto-approve. (Skipped when resuming after a human decision.)
+    if not tool_context.tool_confirmation:
+        decision = shipping_policy.check(tool_context, "place_shipping_order", args)
+        if decision.outcome == APPROVE:
+            return {
+                "status": "approved",
+                "order_id": f"ORD-{num_containers}-AUTO",
+                "num_containers": num_containers,
+                "destination": destination,
+                "message": f"Order auto-approved ({decision.rule}): {num_containers} containers to {destination}",
+            }
+        if decision.outcome == REJECT:
+            return {
+                "status": "rejected",
+                "message": f"Order rejected by policy ({decision.rule}): {num_containers} containers to {destination}",
+            }
 
     # -----------------------------------------------------------------------------------------------
     # -----------------------------------------------------------------------------------------------
     # SCENARIO 2: This is the first time this tool is called. Large orders need human approval - PAUSE here.
     if not tool_context.tool_confirmation:
-        tool_context.request_confirmation(
-            hint=f"⚠️ Large order: {num_containers} containers to {destination}. Do you want to approve?",
-            payload={"num_containers": num_containers, "destination": destination},
-        )
+        hint = f"⚠️ Large order: {num_containers} containers to {destination}. Do you want to approve?"
+        tool_context.request_confirmation(hint=hint, payload=args)
+        # Also record it in the indexed store, so approvers can list pending orders without scanning sessions.
+        default_confirmation_store.record(tool_context, "place_shipping_order", hint, args)
         return {  # This is sent to the Agent
             "status": "pending",
             "message": f"Order for {num_containers} containers requires approval",
@@ -69,6 +97,8 @@ def place_shipping_order(
     # -----------------------------------------------------------------------------------------------
     # -----------------------------------------------------------------------------------------------
     # SCENARIO 3: The tool is called AGAIN and is now resuming. Handle approval response - RESUME here.
+    default_confirmation_store.resolve([tool_context.function_call_id], tool_context.tool_confirmation.confirmed)
+    shipping_policy.record_human(tool_context, "place_shipping_order", args, tool_context.tool_confirmation.confirmed)
     if tool_context.tool_confirmation.confirmed:
         return {
             "status": "approved",
@@ -89,7 +119,7 @@ print("✅ Long-running functions created!")
 # Create shipping agent with pausable tool
 root_agent = LlmAgent(
     name="root_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""You are a shipping coordinator assistant.
   
   When users request to ship containers:
@@ -1,7 +1,10 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
 from google.genai import types
 
 from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
+from tool_cache import cached_tool
 from google.adk.runners import InMemoryRunner
 from google.adk.sessions import InMemorySessionService
 from google.adk.tools import google_search, AgentTool, ToolContext
@@ -10,14 +13,33 @@ from google.adk.code_executors import BuiltInCodeExecutor
 print("✅ ADK components imported successfully.")
 
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
+
+# This simulates a company's internal fee structure. It is built once at import time,
+# not on every tool call.
+FEE_DATABASE = {
+    "platinum credit card": 0.02,  # 2%
+    "gold debit card": 0.035,  # 3.5%
+    "bank transfer": 0.01,  # 1%
+}
+
+# Static data simulating a live exchange rate API
+# In production, this would call something like: requests.get("api.exchangerates.com")
+RATE_DATABASE = {
+    "usd": {
+        "eur": 0.93,  # Euro
+        "jpy": 157.50,  # Japanese Yen
+        "inr": 83.58,  # Indian Rupee
+    }
+}
+
 
 # Pay attention to the docstring, type hints, and return value.
+# `cached_tool` serves repeated lookups (same arguments, ignoring case) from memory for 5 minutes.
+@cached_tool(ttl=300)
 def get_fee_for_payment_method(method: str) -> dict:
     """Looks up the transaction fee percentage for a given payment method.
 
@@ -33,14 +55,7 @@ def get_fee_for_payment_method(method: str) -> dict:
         Success: {"status": "success", "fee_percentage": 0.02}
         Error: {"status": "error", "error_message": "Payment method not found"}
     """
-    # This simulates looking up a company's internal fee structure.
-    fee_database = {
-        "platinum credit card": 0.02,  # 2%
-        "gold debit card": 0.035,  # 3.5%
-        "bank transfer": 0.01,  # 1%
-    }
-
-    fee = fee_database.get(method.lower())
+    fee = FEE_DATABASE.get(method.strip().lower())
     if fee is not None:
         return {"status": "success", "fee_percentage": fee}
     else:
@@ -53,6 +68,7 @@ def get_fee_for_payment_method(method: str) -> dict:
 print("✅ Fee lookup function created")
 print(f"💳 Test: {get_fee_for_payment_method('platinum credit card')}")
 
+@cached_tool(ttl=300)
 def get_exchange_rate(base_currency: str, target_currency: str) -> dict:
     """Looks up and returns the exchange rate between two currencies.
 
@@ -67,23 +83,12 @@ def get_exchange_rate(base_currency: str, target_currency: str) -> dict:
         Success: {"status": "success", "rate": 0.93}
         Error: {"status": "error", "error_message": "Unsupported currency pair"}
     """
-
-    # Static data simulating a live exchange rate API
-    # In production, this would call something like: requests.get("api.exchangerates.com")
-    rate_database = {
-        "usd": {
-            "eur": 0.93,  # Euro
-            "jpy": 157.50,  # Japanese Yen
-            "inr": 83.58,  # Indian Rupee
-        }
-    }
-
     # Input validation and processing
-    base = base_currency.lower()
-    target = target_currency.lower()
+    base = base_currency.strip().lower()
+    target = target_currency.strip().lower()
 
     # Return structured result with status
-    rate = rate_database.get(base, {}).get(target)
+    rate = RATE_DATABASE.get(base, {}).get(target)
     if rate is not None:
         return {"status": "success", "rate": rate}
     else:
@@ -96,10 +101,86 @@ def get_exchange_rate(base_currency: str, target_currency: str) -> dict:
 print("✅ Exchange rate function created")
 print(f"💱 Test: {get_exchange_rate('USD', 'EUR')}")
 
+CENT = Decimal("0.01")
+BATCH_COLUMNS = ["amount", "base", "target", "method", "fee", "rate", "converted"]
+
+
+def _row_error(index: int, message: str) -> dict:
+    return {"row": index, "status": "error", "error_message": message}
+
+
+def convert_currency_batch(rows: list[list[str]]) -> dict:
+    """Converts many amounts in one call, e.g. a list of invoices.
+
+    Use this instead of calling get_fee_for_payment_method() and get_exchange_rate()
+    once per conversion whenever the user gives more than one amount.
+
+    Args:
+        rows: One [amount, base_currency, target_currency, payment_method] entry per
+              conversion, e.g. [["1250", "USD", "EUR", "bank transfer"],
+              ["80.50", "USD", "JPY", "gold debit card"]].
+
+    Returns:
+        Dictionary with status and a compact table with one row per converted input row
+        (fee in the base currency, converted amount in the target currency), plus totals.
+        Success: {"status": "success", "columns": ["amount", "base", "target", "method", "fee", "rate", "converted"],
+                  "rows": [["1250", "USD", "EUR", "bank transfer", "12.50", "0.93", "1150.88"]],
+                  "totals": {"EUR": "1150.88"}, "errors": []}
+        Rows that cannot be converted (including amounts that are not positive) are reported in
+        "errors" in the single-conversion tools' error shape plus the row index:
+        {"row": index, "status": "error", "error_message": "..."}.
+    """
+    # Every distinct payment method and currency pair is looked up once, however many rows use it.
+    fees, rates = {}, {}
+    table, totals, errors = [], {}, []
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, (list, tuple)) or len(row) != 4:
+                raise TypeError(f"Expected [amount, base_currency, target_currency, payment_method], got {row!r}")
+            amount_text, base, target, method = (str(value).strip() for value in row)
+            amount = Decimal(amount_text.replace(",", ""))
+            if not amount.is_finite():
+                raise ValueError(f"Amount must be a finite number, got {amount_text!r}")
+            if amount <= 0:
+                raise ValueError(f"Amount must be positive, got {amount_text!r}")
+
+            method_key, pair_key = method.lower(), (base.upper(), target.upper())
+            if method_key not in fees:
+                fees[method_key] = get_fee_for_payment_method(method)
+            if pair_key not in rates:
+                rates[pair_key] = get_exchange_rate(*pair_key)
+            fee, rate = fees[method_key], rates[pair_key]
+            if fee["status"] == "error" or rate["status"] == "error":
+                errors.append(_row_error(index, (fee if fee["status"] == "error" else rate)["error_message"]))
+                continue
+
+            fee_amount = (amount * Decimal(str(fee["fee_percentage"]))).quantize(CENT, ROUND_HALF_UP)
+            converted = ((amount - fee_amount) * Decimal(str(rate["rate"]))).quantize(CENT, ROUND_HALF_UP)
+        except InvalidOperation:
+            # Not a number, or too large to round to cents (e.g. "1e30").
+            errors.append(_row_error(index, f"Invalid amount {amount_text!r}"))
+            continue
+        except (ValueError, TypeError) as e:
+            errors.append(_row_error(index, str(e)))
+            continue
+        totals[pair_key[1]] = totals.get(pair_key[1], Decimal(0)) + converted
+        table.append([amount_text, pair_key[0], pair_key[1], method_key, str(fee_amount), str(rate["rate"]), str(converted)])
+
+    return {
+        "status": "success" if table else "error",
+        "columns": BATCH_COLUMNS,
+        "rows": table,
+        "totals": {currency: str(total) for currency, total in totals.items()},
+        "errors": errors,
+    }
+
+
+print("✅ Batch conversion function created")
+
 # Currency agent with custom function tools
 root_agent = LlmAgent(
     name="root_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""You are a smart currency conversion assistant.
 
     For currency conversion requests:
@@ -112,14 +193,19 @@ root_agent = LlmAgent(
         value in the original currency, the amount remaining after the fee, and the exchange rate used for the final conversion.
 
     If any tool returns status "error", explain the issue to the user clearly.
+
+    For lists of conversions (several amounts, invoices, a table), make ONE call to `convert_currency_batch()`
+    with all rows instead of looking up fees and rates per amount. Present its table and totals,
+    and mention any rows listed under "errors".
     """,
-    tools=[get_fee_for_payment_method, get_exchange_rate],
+    tools=[get_fee_for_payment_method, get_exchange_rate, convert_currency_batch],
 )
 
 print("✅ Currency agent created with custom function tools")
 print("🔧 Available tools:")
 print("  • get_fee_for_payment_method - Looks up company fee structure")
 print("  • get_exchange_rate - Gets current exchange rates")
+print("  • convert_currency_batch - Converts many amounts in one call")
 
 
 
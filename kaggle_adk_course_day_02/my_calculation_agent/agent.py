@@ -1,7 +1,12 @@
+import re
+
 from google.genai import types
 
 from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
+from safe_calc import calculate, evaluate, format_decimal
+from tool_cache import cached_tool
+from static_workflow import StaticWorkflowAgent, StepFailed, tool_step
 from google.adk.runners import InMemoryRunner
 from google.adk.sessions import InMemorySessionService
 from google.adk.tools import google_search, AgentTool, ToolContext
@@ -10,14 +15,33 @@ from google.adk.code_executors import BuiltInCodeExecutor
 print("✅ ADK components imported successfully.")
 
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
+
+# This simulates a company's internal fee structure. It is built once at import time,
+# not on every tool call.
+FEE_DATABASE = {
+    "platinum credit card": 0.02,  # 2%
+    "gold debit card": 0.035,  # 3.5%
+    "bank transfer": 0.01,  # 1%
+}
+
+# Static data simulating a live exchange rate API
+# In production, this would call something like: requests.get("api.exchangerates.com")
+RATE_DATABASE = {
+    "usd": {
+        "eur": 0.93,  # Euro
+        "jpy": 157.50,  # Japanese Yen
+        "inr": 83.58,  # Indian Rupee
+    }
+}
+
 
 # Pay attention to the docstring, type hints, and return value.
+# `cached_tool` serves repeated lookups (same arguments, ignoring case) from memory for 5 minutes.
+@cached_tool(ttl=300)
 def get_fee_for_payment_method(method: str) -> dict:
     """Looks up the transaction fee percentage for a given payment method.
 
@@ -33,14 +57,7 @@ def get_fee_for_payment_method(method: str) -> dict:
         Success: {"status": "success", "fee_percentage": 0.02}
         Error: {"status": "error", "error_message": "Payment method not found"}
     """
-    # This simulates looking up a company's internal fee structure.
-    fee_database = {
-        "platinum credit card": 0.02,  # 2%
-        "gold debit card": 0.035,  # 3.5%
-        "bank transfer": 0.01,  # 1%
-    }
-
-    fee = fee_database.get(method.lower())
+    fee = FEE_DATABASE.get(method.strip().lower())
     if fee is not None:
         return {"status": "success", "fee_percentage": fee}
     else:
@@ -53,6 +70,7 @@ def get_fee_for_payment_method(method: str) -> dict:
 print("✅ Fee lookup function created")
 print(f"💳 Test: {get_fee_for_payment_method('platinum credit card')}")
 
+@cached_tool(ttl=300)
 def get_exchange_rate(base_currency: str, target_currency: str) -> dict:
     """Looks up and returns the exchange rate between two currencies.
 
@@ -67,23 +85,12 @@ def get_exchange_rate(base_currency: str, target_currency: str) -> dict:
         Success: {"status": "success", "rate": 0.93}
         Error: {"status": "error", "error_message": "Unsupported currency pair"}
     """
-
-    # Static data simulating a live exchange rate API
-    # In production, this would call something like: requests.get("api.exchangerates.com")
-    rate_database = {
-        "usd": {
-            "eur": 0.93,  # Euro
-            "jpy": 157.50,  # Japanese Yen
-            "inr": 83.58,  # Indian Rupee
-        }
-    }
-
     # Input validation and processing
-    base = base_currency.lower()
-    target = target_currency.lower()
+    base = base_currency.strip().lower()
+    target = target_currency.strip().lower()
 
     # Return structured result with status
-    rate = rate_database.get(base, {}).get(target)
+    rate = RATE_DATABASE.get(base, {}).get(target)
     if rate is not None:
         return {"status": "success", "rate": rate}
     else:
@@ -95,10 +102,13 @@ def get_exchange_rate(base_currency: str, target_currency: str) -> dict:
 
 print("✅ Exchange rate function created")
 print(f"💱 Test: {get_exchange_rate('USD', 'EUR')}")
+print(f"🧮 Test: {calculate('500 * (1 - 0.02) * 0.93')}")
 
+# The original LLM calculator (writes Python, runs it in the code executor). The currency agent now uses the
+# local `calculate` tool instead; this agent is kept for comparison in benchmark_calculation.py.
 calculation_agent = LlmAgent(
     name="CalculationAgent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""You are a specialized calculator that ONLY responds with Python code. You are forbidden from providing any text, explanations, or conversational responses.
  
      Your task is to take a request for a calculation and translate it into a single block of Python code that calculates the answer.
@@ -116,9 +126,9 @@ calculation_agent = LlmAgent(
 )
 
 # Currency agent with custom function tools
-root_agent = LlmAgent(
-    name="root_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+currency_agent = LlmAgent(
+    name="currency_agent",
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     # Updated instruction
     instruction="""You are a smart currency conversion assistant. You must strictly follow these steps and use the available tools.
 
@@ -127,8 +137,9 @@ root_agent = LlmAgent(
    1. Get Transaction Fee: Use the get_fee_for_payment_method() tool to determine the transaction fee.
    2. Get Exchange Rate: Use the get_exchange_rate() tool to get the currency conversion rate.
    3. Error Check: After each tool call, you must check the "status" field in the response. If the status is "error", you must stop and clearly explain the issue to the user.
-   4. Calculate Final Amount (CRITICAL): You are strictly prohibited from performing any arithmetic calculations yourself. You must use the calculation_agent tool to generate Python code that calculates the final converted amount. This 
-      code will use the fee information from step 1 and the exchange rate from step 2.
+   4. Calculate Final Amount (CRITICAL): You are strictly prohibited from performing any arithmetic calculations yourself. You must use the calculate() tool for
+      every calculation (fee amount, amount after the fee, converted amount), passing an arithmetic expression built from the fee from step 1 and the exchange rate from step 2,
+      e.g. "500 * (1 - 0.02) * 0.93".
    5. Provide Detailed Breakdown: In your summary, you must:
        * State the final converted amount.
        * Explain how the result was calculated, including:
@@ -139,15 +150,87 @@ root_agent = LlmAgent(
     tools=[
         get_fee_for_payment_method,
         get_exchange_rate,
-        AgentTool(agent=calculation_agent),  # Using another agent as a tool!
+        calculate,  # Local, sandboxed arithmetic: no model call and no code executor round trip
     ],
 )
 
 print("✅ Enhanced currency agent created")
-print("🎯 New capability: Delegates calculations to specialist agent")
+print("🎯 New capability: Exact local calculations")
 print("🔧 Tool types used:")
 print("  • Function Tools (fees, rates)")
-print("  • Agent Tool (calculation specialist)")
+print("  • Function Tool (calculate, a sandboxed Decimal evaluator)")
+
+
+# Currency names users typically write, mapped to the ISO 4217 codes the tools expect.
+CURRENCY_CODES = {
+    "usd": "USD", "dollar": "USD", "dollars": "USD", "us dollar": "USD", "us dollars": "USD",
+    "eur": "EUR", "euro": "EUR", "euros": "EUR",
+    "jpy": "JPY", "yen": "JPY", "japanese yen": "JPY",
+    "inr": "INR", "rupee": "INR", "rupees": "INR", "indian rupee": "INR", "indian rupees": "INR",
+}
+
+# e.g. "Convert 1,250 US Dollars to Euros using a Platinum Credit Card."
+CONVERSION_REQUEST = re.compile(
+    r"(?P<amount>\d[\d,]*(?:\.\d+)?)\s*(?P<base>[a-z ]+?)\s+(?:to|into)\s+(?P<target>[a-z ]+?)"
+    r"\s+(?:using|with|via|by)\s+(?:an? |my )?(?P<method>[a-z ]+?)\s*[.!?]?\s*$",
+    re.IGNORECASE,
+)
+
 
+def parse_conversion_request(values: dict) -> dict:
+    """Reads amount, currencies and payment method from the user's request."""
+    match = CONVERSION_REQUEST.search(values["request"].strip())
+    if not match:
+        raise StepFailed("Request is not a plain currency conversion")
+    base = CURRENCY_CODES.get(match["base"].strip().lower())
+    target = CURRENCY_CODES.get(match["target"].strip().lower())
+    if not base or not target:
+        raise StepFailed(f"Unknown currency in '{match['base']}' / '{match['target']}'")
+    return {
+        "amount": float(match["amount"].replace(",", "")),
+        "base": base,
+        "target": target,
+        "method": match["method"].strip().lower(),
+    }
 
 
+def compute_conversion(values: dict) -> dict:
+    """Deducts the fee and converts the rest with the same Decimal arithmetic as the `calculate` tool."""
+    amount = values["amount"]
+    fee_percentage = values["fee"]["fee_percentage"]
+    rate = values["rate"]["rate"]
+    try:
+        fee_amount = evaluate(f"{amount} * {fee_percentage}")
+        remaining = evaluate(f"{amount} - {fee_amount}")
+        return {
+            "fee_percent": format_decimal(evaluate(f"{fee_percentage} * 100")),
+            "fee_amount": f"{fee_amount:,.2f}",
+            "remaining": f"{remaining:,.2f}",
+            "exchange_rate": f"{rate:g}",
+            "converted": f"{evaluate(f'{remaining} * {rate}'):,.2f}",
+        }
+    except (ValueError, ArithmeticError) as e:
+        raise StepFailed(f"Calculation failed: {e}") from e
+
+
+# Root Agent: the currency agent's instruction is a fixed recipe (fee -> rate -> calculate -> explain),
+# so plain conversion requests run it directly, with no LLM calls at all. Anything the parser does not
+# understand, or a tool error, goes to the LLM currency agent above.
+root_agent = StaticWorkflowAgent(
+    name="currency_workflow",
+    steps=[
+        parse_conversion_request,
+        tool_step(get_fee_for_payment_method, output_key="fee", method="method"),
+        tool_step(get_exchange_rate, output_key="rate", base_currency="base", target_currency="target"),
+        compute_conversion,
+    ],
+    response="""{amount:,.2f} {base} is {converted} {target}.
+
+How it was calculated:
+* Fee: {fee_percent}% for {method}, i.e. {fee_amount} {base}.
+* Amount after the fee: {remaining} {base}.
+* Exchange rate applied: 1 {base} = {exchange_rate} {target}.""",
+    fallback=currency_agent,
+)
+
+print("✅ Static currency workflow created (LLM agent as fallback)")
@@ -2,29 +2,31 @@ import uuid
 from google.genai import types
 
 from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
 
 
 from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
+from blob_store import default_blob_store
+from mcp_pool import PooledMcpToolset
 from google.adk.tools.tool_context import ToolContext
 from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
 from mcp import StdioServerParameters
 
 from google.adk.apps.app import App, ResumabilityConfig
 from google.adk.tools.function_tool import FunctionTool
+from google.adk.tools import load_artifacts
+from approval_policy import APPROVE, REJECT, ApprovalPolicy, Rule
 
 print("✅ ADK components imported successfully.")
 IMAGE_THRESHOLD = 1
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 # Image generation tool using MCP
-mcp_image_server = McpToolset(
+mcp_image_server = PooledMcpToolset(
     connection_params=StdioConnectionParams(
         server_params=StdioServerParameters(
             command="npx",  # Run MCP server via npx
@@ -32,16 +34,35 @@ mcp_image_server = McpToolset(
                 "-y",  # Argument for npx to auto-confirm install
                 "@modelcontextprotocol/server-everything",
             ],
-            tool_filter=["getTinyImage"],
         ),
         timeout=30,
-    )
+    ),
+    tool_filter=["getTinyImage"],  # The filter belongs to the toolset, not to the server parameters
+    pool_size=2,  # Warm server processes, shared with every other toolset for the same server
+    blob_store=default_blob_store,  # Images are stored once on disk; events only carry a small handle
 )
 
+# Approval rules, checked in order before a generation pauses for a human (see approval_policy.py).
+image_policy = ApprovalPolicy([
+    # Single images are always fine.
+    Rule("single_image", "call_image_generation", when={"num_images": {"max": IMAGE_THRESHOLD}}),
+    # Users who had a generation approved by a human before may create up to 4 images per call, 20 a day.
+    Rule(
+        "daily_allowance",
+        "call_image_generation",
+        when={"num_images": {"max": 4}},
+        min_prior_approvals=1,
+        daily_quota=20,
+        quota_field="num_images",
+    ),
+])
+
+
 def call_image_generation(
     num_images: int,  tool_context: ToolContext
 ) -> dict:
-    """Generates an image. Requires approval if ordering more than 1 iamges (IMAGE_THRESHOLD).
+    """Generates an image. Requires approval if ordering more than 1 iamges (IMAGE_THRESHOLD),
+    unless the user's daily allowance covers it.
 
     Args:
         num_images: Number of images to generate
@@ -50,16 +71,26 @@ def call_image_generation(
         Dictionary with image status
     """
 
+    args = {"num_images": num_images}
+
     # -----------------------------------------------------------------------------------------------
     # -----------------------------------------------------------------------------------------------
-    # SCENARIO 1: Small orders (≤5 containers) auto-approve
-    if num_images <= IMAGE_THRESHOLD:
-        return {
-            "status": "approved",
-            "generation_id": f"ORD-{num_images}-AUTO",
-            "num_images": num_images,
-            "message": f"Image generation auto-approved: {num_images} images ",
-        }
+    # SCENARIO 1: The approval policy decides on its own: single images and generations within the
+    # user's daily allowance auto-approve. (Skipped when resuming after a human decision.)
+    if not tool_context.tool_confirmation:
+        decision = image_policy.check(tool_context, "call_image_generation", args)
+        if decision.outcome == APPROVE:
+            return {
+                "status": "approved",
+                "generation_id": f"ORD-{num_images}-AUTO",
+                "num_images": num_images,
+                "message": f"Image generation auto-approved ({decision.rule}): {num_images} images ",
+            }
+        if decision.outcome == REJECT:
+            return {
+                "status": "rejected",
+                "message": f"Generation rejected by policy ({decision.rule}): {num_images} images",
+            }
 
     # -----------------------------------------------------------------------------------------------
     # -----------------------------------------------------------------------------------------------
@@ -67,7 +98,7 @@ def call_image_generation(
     if not tool_context.tool_confirmation:
         tool_context.request_confirmation(
             hint=f"⚠️ Large generation: {num_images} images to generate. Do you want to approve?",
-            payload={"num_images": num_images},
+            payload=args,
         )
         return {  # This is sent to the Agent
             "status": "pending",
@@ -77,6 +108,7 @@ def call_image_generation(
     # -----------------------------------------------------------------------------------------------
     # -----------------------------------------------------------------------------------------------
     # SCENARIO 3: The tool is called AGAIN and is now resuming. Handle approval response - RESUME here.
+    image_policy.record_human(tool_context, "call_image_generation", args, tool_context.tool_confirmation.confirmed)
     if tool_context.tool_confirmation.confirmed:
         return {
             "status": "approved",
@@ -96,7 +128,7 @@ def call_image_generation(
 # Create shipping agent with pausable tool
 root_agent = LlmAgent(
     name="root_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""You are a image generator assistant.
   
   When users request to generate images:
@@ -104,7 +136,9 @@ root_agent = LlmAgent(
    2. If the generation status is 'pending', inform the user that approval is required
    3. After receiving the final result, Use the MCP Tool to generate images for user queries
   """,
-    tools=[mcp_image_server,FunctionTool(func=call_image_generation)],
+    tools=[mcp_image_server,FunctionTool(func=call_image_generation), load_artifacts],
+    # Turns the blob handles in the MCP results into artifacts the web UI shows and load_artifacts reads.
+    after_tool_callback=default_blob_store.save_artifacts,
 )
 
 
@@ -2,31 +2,32 @@ import uuid
 from google.genai import types
 
 from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import InMemoryRunner
 
 
 from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
+from blob_store import default_blob_store
+from mcp_pool import PooledMcpToolset
 from google.adk.tools.tool_context import ToolContext
 from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
 from mcp import StdioServerParameters
 
 from google.adk.apps.app import App, ResumabilityConfig
 from google.adk.tools.function_tool import FunctionTool
+from google.adk.tools import load_artifacts
 
 print("✅ ADK components imported successfully.")
 
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
-mcp_image_server = McpToolset(
+mcp_image_server = PooledMcpToolset(
     connection_params=StdioConnectionParams(
         server_params=StdioServerParameters(
             command="npx",  # Run MCP server via npx
@@ -34,10 +35,12 @@ mcp_image_server = McpToolset(
                 "-y",  # Argument for npx to auto-confirm install
                 "@modelcontextprotocol/server-everything",
             ],
-            tool_filter=["getTinyImage"],
         ),
         timeout=30,
-    )
+    ),
+    tool_filter=["getTinyImage"],  # The filter belongs to the toolset, not to the server parameters
+    pool_size=2,  # Warm server processes, shared with every other toolset for the same server
+    blob_store=default_blob_store,  # Images are stored once on disk; events only carry a small handle
 )
 
 print("✅ MCP Tool created")
@@ -45,10 +48,12 @@ print("✅ MCP Tool created")
 
 # Create image agent with MCP integration
 root_agent = LlmAgent(
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     name="root_agent",
     instruction="Use the MCP Tool to generate images for user queries",
-    tools=[mcp_image_server],
+    tools=[mcp_image_server, load_artifacts],
+    # Turns the blob handles in the MCP results into artifacts the web UI shows and load_artifacts reads.
+    after_tool_callback=default_blob_store.save_artifacts,
 )
 
 print("✅ Image agent created with MCP Tool")
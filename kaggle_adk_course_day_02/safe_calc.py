@@ -0,0 +1,122 @@
+"""Local, sandboxed arithmetic for agents.
+
+Asking an LLM to write Python for `amount * (1 - fee) * rate` and running it
+in a code executor costs two remote round trips. `calculate()` evaluates the
+expression right here instead: the text is parsed with `ast` and only
+numbers, arithmetic operators, parentheses and a few functions (`abs`,
+`round`, `min`, `max`) are allowed, so there are no names, attributes or
+calls that could reach the interpreter. Numbers are evaluated as `Decimal`,
+so 0.1 + 0.2 is 0.3 and money amounts do not pick up float noise.
+
+    from safe_calc import calculate
+
+    calculate("500 * (1 - 0.02) * 0.93")
+    # {"status": "success", "expression": "...", "result": "455.7"}
+"""
+
+import ast
+import decimal
+from decimal import Decimal
+from typing import Union
+
+PRECISION = 28  # significant digits for every intermediate result
+MAX_EXPRESSION_LENGTH = 500
+MAX_EXPONENT = 100  # keeps `**` from building huge numbers
+
+_BINARY_OPERATORS = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+    ast.FloorDiv: lambda a, b: a // b,
+    ast.Mod: lambda a, b: a % b,
+    ast.Pow: lambda a, b: _power(a, b),
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: lambda a: +a,
+    ast.USub: lambda a: -a,
+}
+
+_FUNCTIONS = {
+    "abs": abs,
+    "round": lambda value, places=0: round(value, int(places)),
+    "min": min,
+    "max": max,
+}
+
+
+class UnsafeExpression(ValueError):
+    """Raised for expressions that contain anything besides plain arithmetic."""
+
+
+def _power(base: Decimal, exponent: Decimal) -> Decimal:
+    if abs(exponent) > MAX_EXPONENT:
+        raise UnsafeExpression(f"Exponent {exponent} is larger than {MAX_EXPONENT}")
+    return base**exponent
+
+
+def _evaluate(node: ast.AST) -> Decimal:
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        # str() keeps the literal as written: Decimal("0.1"), not Decimal(0.1).
+        return Decimal(str(node.value))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        return _BINARY_OPERATORS[type(node.op)](_evaluate(node.left), _evaluate(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[type(node.op)](_evaluate(node.operand))
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in _FUNCTIONS
+        and not node.keywords
+    ):
+        return Decimal(_FUNCTIONS[node.func.id](*[_evaluate(arg) for arg in node.args]))
+    raise UnsafeExpression(f"Unsupported element in expression: {ast.dump(node)[:60]}")
+
+
+def evaluate(expression: str) -> Decimal:
+    """Evaluates an arithmetic expression with `Decimal` precision.
+
+    Raises:
+        UnsafeExpression: The expression is too long or not plain arithmetic.
+        SyntaxError, ArithmeticError: The expression is malformed or undefined (e.g. 1/0).
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise UnsafeExpression(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    tree = ast.parse(expression.strip(), mode="eval")
+    with decimal.localcontext() as context:
+        context.prec = PRECISION
+        return +_evaluate(tree)
+
+
+def format_decimal(value: Union[Decimal, int, float]) -> str:
+    """Plain notation without trailing zeros, e.g. 455.7 (not 4.557E+2 or 455.700)."""
+    value = Decimal(value).normalize()
+    return f"{value:f}"
+
+
+def calculate(expression: str) -> dict:
+    """Evaluates an arithmetic expression exactly and returns the result.
+
+    Use this for every calculation, e.g. applying a fee and an exchange rate:
+    "500 * (1 - 0.02) * 0.93". Supports numbers, + - * / // % **, parentheses
+    and the functions abs, round, min and max.
+
+    Args:
+        expression: The arithmetic expression to evaluate, e.g. "1250 * 0.02".
+
+    Returns:
+        Dictionary with status and the result as a decimal string.
+        Success: {"status": "success", "expression": "1250 * 0.02", "result": "25"}
+        Error: {"status": "error", "error_message": "Cannot evaluate '1/0': DivisionByZero"}
+    """
+    try:
+        result = evaluate(expression)
+    except ArithmeticError as e:
+        # decimal's errors carry no readable message, their class name does (e.g. DivisionByZero).
+        return {"status": "error", "error_message": f"Cannot evaluate '{expression}': {type(e).__name__}"}
+    except (UnsafeExpression, SyntaxError, TypeError) as e:
+        return {"status": "error", "error_message": f"Cannot evaluate '{expression}': {e}"}
+    return {"status": "success", "expression": expression, "result": format_decimal(result)}
@@ -0,0 +1,43 @@
+"""Runs the ADK web UI for this folder with warm MCP server pools.
+
+`adk web` imports an agent only when its first request arrives, so the MCP
+servers of `my_mcp_agent` and `my_image_generation_with_approval_agent`
+would start (npx resolution, Node start-up) inside that request. This
+serves the same app, but a startup hook imports those agents and waits for
+their pools (see mcp_pool.py) before the first request is accepted:
+
+    python serve.py  # instead of `adk web`, then open http://127.0.0.1:8000
+
+On shutdown the pools' server processes are stopped.
+"""
+
+import importlib
+import os
+from contextlib import asynccontextmanager
+
+import uvicorn
+from google.adk.cli.fast_api import get_fast_api_app
+
+from mcp_pool import close_mcp_pools, warm_up_mcp_pools
+
+AGENTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MCP_AGENTS = ["my_mcp_agent", "my_image_generation_with_approval_agent"]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # The agent loader imports the same modules later, so these are the toolsets it will use.
+    for name in MCP_AGENTS:
+        importlib.import_module(name)
+    await warm_up_mcp_pools()
+    print("✅ MCP server pools are warm")
+    try:
+        yield
+    finally:
+        await close_mcp_pools()
+
+
+app = get_fast_api_app(agents_dir=AGENTS_DIR, web=True, lifespan=lifespan)
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,16 @@
+"""Alias of `adk_course_shared/static_workflow.py` at the repository root.
+
+`adk web` and the scripts only put this folder on `sys.path`; this adds the
+repository root and makes `import static_workflow` return the shared module.
+"""
+
+import os
+import sys
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+
+from adk_course_shared import static_workflow  # noqa: E402
+
+sys.modules[__name__] = static_workflow
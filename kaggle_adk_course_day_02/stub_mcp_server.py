@@ -0,0 +1,37 @@
+"""A minimal local stdio MCP server that stands in for `@modelcontextprotocol/server-everything`.
+
+It offers the same `getTinyImage` tool but starts in well under a second and
+needs no npx, so test_mcp_pool.py runs offline against it:
+
+    StdioServerParameters(command=sys.executable, args=["stub_mcp_server.py"])
+
+`crash` ends the process at once, like a server that died mid-session.
+"""
+
+import base64
+import os
+
+from mcp.server.fastmcp import FastMCP, Image
+
+# A 1x1 transparent PNG.
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+mcp = FastMCP("stub-everything")
+
+
+@mcp.tool()
+def getTinyImage() -> list:
+    """Returns the MCP_TINY_IMAGE."""
+    return ["This is a tiny image:", Image(data=TINY_PNG, format="png"), "The image above is the MCP tiny image."]
+
+
+@mcp.tool()
+def crash() -> str:
+    """Exits the server process without answering."""
+    os._exit(1)
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,67 @@
+"""Tests for approval_policy.py (run with `python -m pytest` from this folder)."""
+
+from types import SimpleNamespace
+
+from approval_policy import APPROVE, ASK, ApprovalPolicy, Rule
+
+
+def _tool_context(user_id="alice", session_id="s1"):
+    return SimpleNamespace(session=SimpleNamespace(user_id=user_id, id=session_id))
+
+
+def _shipping_policy(tmp_path):
+    # The same rules as my_HumanInLoop_agent's shipping_policy.
+    return ApprovalPolicy(
+        [
+            Rule("small_orders", "place_shipping_order", when={"num_containers": {"max": 5}}),
+            Rule(
+                "standing_approval",
+                "place_shipping_order",
+                when={"num_containers": {"max": 20}, "destination": {"in": ["Rotterdam"]}},
+                min_prior_approvals=1,
+                daily_quota=60,
+                quota_field="num_containers",
+            ),
+        ],
+        audit_db_path=str(tmp_path / "audit.db"),
+    )
+
+
+def test_policy_approvals_do_not_unlock_standing_approval(tmp_path):
+    policy, ctx = _shipping_policy(tmp_path), _tool_context()
+    large = {"num_containers": 20, "destination": "Rotterdam"}
+
+    assert policy.check(ctx, "place_shipping_order", large).outcome == ASK
+    small = policy.check(ctx, "place_shipping_order", {"num_containers": 1, "destination": "Rotterdam"})
+    assert (small.outcome, small.rule) == (APPROVE, "small_orders")
+    # The policy's own approval is no approval history.
+    assert policy.check(ctx, "place_shipping_order", large).outcome == ASK
+
+    policy.record_human(ctx, "place_shipping_order", large, confirmed=True)
+    standing = policy.check(ctx, "place_shipping_order", large)
+    assert (standing.outcome, standing.rule) == (APPROVE, "standing_approval")
+    # History is per user.
+    assert policy.check(_tool_context("bob"), "place_shipping_order", large).outcome == ASK
+
+
+def test_invalid_quota_quantity_asks(tmp_path):
+    policy = ApprovalPolicy(
+        [Rule("allowance", "generate_images", daily_quota=20, quota_field="num_images")],
+        audit_db_path=str(tmp_path / "audit.db"),
+    )
+    ctx = _tool_context()
+    assert policy.check(ctx, "generate_images", {"num_images": 4}).outcome == APPROVE
+
+    for value in ("lots", None, [4], float("nan"), float("inf"), -100):
+        decision = policy.check(ctx, "generate_images", {"num_images": value})
+        assert (decision.outcome, decision.rule) == (ASK, "allowance")
+    # None of them used up quota.
+    assert policy.used_quota(policy._rules["generate_images"][0], "alice") == 4
+
+
+def test_audit_db_is_created_on_first_use(tmp_path):
+    policy = _shipping_policy(tmp_path)
+    assert not (tmp_path / "audit.db").exists()
+    policy.check(_tool_context(), "place_shipping_order", {"num_containers": 1})
+    assert (tmp_path / "audit.db").exists()
+    policy.close()
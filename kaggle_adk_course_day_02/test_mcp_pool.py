@@ -0,0 +1,138 @@
+"""Tests for mcp_pool.py against stub_mcp_server.py (run with `python -m pytest` from this folder)."""
+
+import asyncio
+import contextlib
+import os
+import sys
+
+from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
+from mcp import StdioServerParameters
+
+import mcp_pool
+from mcp_pool import PooledMcpToolset, close_mcp_pools, warm_up_mcp_pools
+
+STUB_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_mcp_server.py")
+
+
+def _params():
+    return StdioConnectionParams(
+        server_params=StdioServerParameters(command=sys.executable, args=[STUB_SERVER]), timeout=10
+    )
+
+
+def _toolset(**kwargs):
+    return PooledMcpToolset(connection_params=_params(), tool_filter=["getTinyImage"], **kwargs)
+
+
+def _run(test):
+    async def run():
+        try:
+            await test()
+        finally:
+            await close_mcp_pools()
+
+    asyncio.run(run())
+
+
+async def _wait_for(condition, timeout=10.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.05)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_warm_up_starts_every_server():
+    async def test():
+        first, second = _toolset(pool_size=2), _toolset(pool_size=2)
+        pool = first._mcp_session_manager
+        assert second._mcp_session_manager is pool and pool.users == 2
+        assert pool.stats()["healthy"] == 0  # nothing starts before the warm-up
+
+        await warm_up_mcp_pools()
+        assert pool.stats() == {"size": 2, "healthy": 2, "recycled": 0}
+
+        tools = await first.get_tools()
+        assert [tool.name for tool in tools] == ["getTinyImage"]
+        results = await asyncio.gather(*(tools[0].run_async(args={}, tool_context=None) for _ in range(6)))
+        assert all(not result.get("isError") for result in results)
+
+    _run(test)
+
+
+def test_killed_server_is_recycled():
+    async def test():
+        toolset = _toolset(pool_size=2, health_interval=0.1)
+        pool = toolset._mcp_session_manager
+        await toolset.warm_up()
+        victim = pool._servers[0]
+        with contextlib.suppress(Exception):
+            await asyncio.wait_for(victim.session.call_tool("crash", {}), 2)
+
+        await _wait_for(lambda: pool.recycled >= 1 and pool.stats()["healthy"] == 2)
+        assert victim not in pool._servers
+        tools = await toolset.get_tools()
+        results = await asyncio.gather(*(tools[0].run_async(args={}, tool_context=None) for _ in range(4)))
+        assert all(not result.get("isError") for result in results)
+
+    _run(test)
+
+
+def test_pool_closes_with_its_last_toolset():
+    async def test():
+        first, second = _toolset(pool_size=1), _toolset(pool_size=1)
+        pool = first._mcp_session_manager
+        await warm_up_mcp_pools()
+        server = pool._servers[0]
+
+        await first.close()
+        await first.close()  # a toolset releases its pool only once
+        assert pool.users == 1 and not pool.closed and pool.stats()["healthy"] == 1
+
+        await second.close()
+        assert pool.closed and pool.users == 0 and server.task.done()
+        assert not mcp_pool._pools
+
+        # A new toolset gets a new pool.
+        third = _toolset(pool_size=1)
+        assert third._mcp_session_manager is not pool
+        await third.warm_up()
+        assert third._mcp_session_manager.stats()["healthy"] == 1
+
+    _run(test)
+
+
+def test_release_after_close_mcp_pools_is_a_no_op():
+    async def test():
+        toolset = _toolset(pool_size=1)
+        pool = toolset._mcp_session_manager
+        await toolset.warm_up()
+
+        await close_mcp_pools()
+        assert pool.closed and not mcp_pool._pools
+        await toolset.close()
+        assert pool.users == 1  # nothing to release anymore
+
+    _run(test)
+
+
+def test_new_pool_waits_for_the_released_one():
+    async def test():
+        toolset = _toolset(pool_size=1)
+        old = toolset._mcp_session_manager
+        await toolset.warm_up()
+        old_server = old._servers[0]
+
+        closing = asyncio.create_task(toolset.close())
+        await asyncio.sleep(0)  # the old pool is released but its server is still stopping
+        assert not old_server.task.done()
+        replacement = _toolset(pool_size=1)
+        new = replacement._mcp_session_manager
+        assert new is not old and new.previous is old
+
+        await replacement.warm_up()
+        assert old.closed and old_server.task.done()
+        assert new.previous is None and new.stats()["healthy"] == 1
+        await closing
+
+    _run(test)
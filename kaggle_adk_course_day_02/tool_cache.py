@@ -0,0 +1,112 @@
+"""Memoizing cache for pure function tools.
+
+Lookups like fees and exchange rates return the same answer for the same
+arguments for a while, yet an agent calls them on every conversion turn. In
+production they sit in front of real services, so each call costs a network
+round trip. `cached_tool` keeps results for `ttl` seconds, evicts the least
+recently used entry once `maxsize` is reached, and counts hits and misses:
+
+    from tool_cache import cached_tool
+
+    @cached_tool(ttl=300)
+    def get_exchange_rate(base_currency: str, target_currency: str) -> dict:
+        ...
+
+    get_exchange_rate.cache_info()  # {"hits": 3, "misses": 1, ...}
+
+Arguments are normalized before they form the key (strings are stripped and
+lower-cased by default), so "USD" and "usd " share one entry. Results whose
+status is "error" are not cached. The decorated function keeps its name,
+signature and docstring, so ADK builds the same FunctionTool declaration.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+DEFAULT_TTL = 300  # seconds, roughly how long a looked-up rate stays valid
+DEFAULT_MAXSIZE = 256
+
+
+def normalize_argument(value: Any) -> Any:
+    """Default key normalization: case- and whitespace-insensitive strings."""
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+def cached_tool(
+    ttl: float = DEFAULT_TTL,
+    maxsize: int = DEFAULT_MAXSIZE,
+    normalize: Callable[[Any], Any] = normalize_argument,
+) -> Callable:
+    """Decorator that caches a tool's results with a TTL and LRU eviction.
+
+    Args:
+        ttl: Seconds a result is served from the cache.
+        maxsize: Maximum number of cached argument combinations.
+        normalize: Applied to every argument value to build the cache key.
+    """
+
+    def decorator(func: Callable[..., dict]) -> Callable[..., dict]:
+        signature = inspect.signature(func)
+        entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        stats = {"hits": 0, "misses": 0, "evictions": 0}
+        lock = threading.Lock()
+
+        def make_key(args, kwargs) -> tuple:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple((name, normalize(value)) for name, value in bound.arguments.items())
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            now = time.monotonic()
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and entry[0] > now:
+                    entries.move_to_end(key)
+                    stats["hits"] += 1
+                    return _copy(entry[1])
+                stats["misses"] += 1
+
+            result = func(*args, **kwargs)
+            if isinstance(result, dict) and result.get("status") == "error":
+                return result
+
+            with lock:
+                entries[key] = (now + ttl, result)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+                    stats["evictions"] += 1
+            return _copy(result)
+
+        def cache_info() -> dict:
+            with lock:
+                lookups = stats["hits"] + stats["misses"]
+                return {
+                    **stats,
+                    "size": len(entries),
+                    "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+                }
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+                stats.update(hits=0, misses=0, evictions=0)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
+def _copy(result: Any) -> Any:
+    # Callers (and ADK) may modify the returned dict; keep the cached one intact.
+    return dict(result) if isinstance(result, dict) else result
@@ -0,0 +1,16 @@
+"""Alias of `adk_course_shared/model_clients.py` at the repository root.
+
+`adk web` and the scripts only put this folder on `sys.path`; this adds the
+repository root and makes `import model_clients` return the shared module.
+"""
+
+import os
+import sys
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+
+from adk_course_shared import model_clients  # noqa: E402
+
+sys.modules[__name__] = model_clients
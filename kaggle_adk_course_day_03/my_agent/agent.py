@@ -3,9 +3,8 @@ import asyncio
 import os
 from google.adk.agents import Agent, LlmAgent
 from google.adk.apps.app import App, EventsCompactionConfig
-from google.adk.models.google_llm import Gemini
-from google.adk.sessions import DatabaseSessionService
-from google.adk.sessions import InMemorySessionService
+from model_clients import adaptive_retry_options, shared_gemini
+from session_services import UpsertDatabaseSessionService, UpsertInMemorySessionService
 from google.adk.runners import Runner
 from google.adk.tools.tool_context import ToolContext
 from google.genai import types
@@ -19,17 +18,15 @@ SESSION = "default"  # Session
 
 MODEL_NAME = "gemini-2.5-flash-lite"
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 
 # Step 1: Create the LLM Agent
 root_agent = Agent(
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     name="text_chat_bot",
     description="A text chatbot",  # Description of the agent's purpose
 )
@@ -38,7 +35,7 @@ root_agent = Agent(
 # 2a. Use DatabaseSessionService for persistent conversation history and state (short-term memory)
 # Step 2: Set up Session Management
 # InMemorySessionService stores conversations in RAM (temporary)
-session_service = InMemorySessionService()
+session_service = UpsertInMemorySessionService()
 
 runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
 
@@ -54,15 +51,10 @@ async def run_session(
     # Get app name from the Runner
     app_name = runner_instance.app_name
 
-    # Attempt to create a new session or retrieve an existing one
-    try:
-        session = await session_service.create_session(
-            app_name=app_name, user_id=USER_ID, session_id=session_name
-        )
-    except:
-        session = await session_service.get_session(
-            app_name=app_name, user_id=USER_ID, session_id=session_name
-        )
+    # Create a new session or retrieve an existing one in a single call
+    session, _ = await session_service.get_or_create_session(
+        app_name=app_name, user_id=USER_ID, session_id=session_name
+    )
 
     # Process queries if provided
     if user_queries:
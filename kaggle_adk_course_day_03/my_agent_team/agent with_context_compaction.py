@@ -10,11 +10,12 @@ logging.basicConfig(level=logging.ERROR)
 from typing import Any, Dict
 
 from google.adk.agents import Agent, LlmAgent
-from google.adk.apps.app import App, EventsCompactionConfig
-from google.adk.models.google_llm import Gemini
-from google.adk.sessions import DatabaseSessionService
-from google.adk.sessions import InMemorySessionService
+from google.adk.apps.app import App
+from model_clients import adaptive_retry_options, close_shared_clients, shared_gemini
+from session_services import SqliteSessionService, UpsertInMemorySessionService
 from google.adk.runners import Runner
+from background_compaction import BackgroundCompactionRunner
+from compaction_policies import HierarchicalCompaction
 from google.adk.tools.tool_context import ToolContext
 from google.genai import types
 
@@ -55,22 +56,14 @@ async def run_session(
     # Get app name from the Runner
     app_name = runner_instance.app_name
 
-    # Attempt to create a new session or retrieve an existing one
-    try:
-        session = await session_service.create_session(
-            app_name=app_name, user_id=USER_ID, session_id=session_name
-        )
+    # Create a new session or retrieve an existing one in a single call
+    session, created = await session_service.get_or_create_session(
+        app_name=app_name, user_id=USER_ID, session_id=session_name
+    )
+    if created:
         print(f"✅ Created new session: {session_name}")
-    except Exception as e:
-        # If session already exists, get the existing one
-        if "already exists" in str(e):
-            session = await session_service.get_session(
-                app_name=app_name, user_id=USER_ID, session_id=session_name
-            )
-            print(f"✅ Retrieved existing session: {session_name}")
-        else:
-            # Re-raise unexpected errors
-            raise
+    else:
+        print(f"✅ Retrieved existing session: {session_name}")
 
     # Process queries if provided
     if user_queries:
@@ -111,12 +104,10 @@ async def run_session(
 
 print("✅ Helper functions defined.")
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 # Global variables for cleanup
 runner = None
@@ -161,6 +152,14 @@ async def cleanup():
         except Exception as e:
             print(f"⚠️ Warning: runner.close() raised: {type(e).__name__}: {e}")
 
+    # Write any buffered session events and close the database connections
+    if session_service is not None:
+        try:
+            await session_service.close()
+            print("✅ Session service closed successfully")
+        except Exception as e:
+            print(f"⚠️ Warning: session_service.close() raised: {type(e).__name__}: {e}")
+
     # Close model clients - more comprehensive approach
     if root_agent is not None:
         try:
@@ -195,6 +194,9 @@ async def cleanup():
         except Exception as e:
             print(f"⚠️ Error during model cleanup: {e}")
 
+    # Close the pooled Gemini clients shared by every agent
+    await close_shared_clients()
+
     # Force close all HTTP clients
     await close_all_http_clients()
     
@@ -210,7 +212,7 @@ async def run_conversation():
     global runner, session_service, root_agent, gemini_model
     
     # Create the Gemini model instance first
-    gemini_model = Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config)
+    gemini_model = shared_gemini("gemini-2.5-flash-lite", retry_config)
     
     # Initialize components
     chatbot_agent = Agent(
@@ -219,27 +221,34 @@ async def run_conversation():
         description="A text chatbot",
     )
     
-    # Re-define our app with Events Compaction enabled
+    # Re-define our app; Events Compaction is enabled by the runner's compaction
+    # policy below, so the app needs no EventsCompactionConfig (only the token
+    # budget decides when to compact)
     research_app_compacting = App(
         name="research_app_compacting",
         root_agent=chatbot_agent,
-        # This is the new part!
-        events_compaction_config=EventsCompactionConfig(
-            compaction_interval=3,  # Trigger compaction every 3 invocations
-            overlap_size=1,  # Keep 1 previous turn for context
-        ),
     )
 
     print(f"Agent '{chatbot_agent.name}' created using model '{AGENT_MODEL}'.")
 
-    # Step 2: Switch to DatabaseSessionService
-    # SQLite database will be created automatically
-    db_url = "sqlite:///my_agent_data.db"  # Local SQLite file
-    session_service = DatabaseSessionService(db_url=db_url)
+    # Step 2: Switch to a database-backed session service
+    # SQLite database will be created automatically (WAL mode, pooled connections,
+    # events written once per invocation; each turn loads only the last 100 events
+    # plus the latest compaction summary; write_behind writes events in the background
+    # so streaming never waits for the database)
+    session_service = SqliteSessionService(
+        "my_agent_data.db", synchronous="NORMAL", recent_events=100, write_behind=True
+    )
 
-    research_runner_compacting = Runner(
-        app=research_app_compacting, session_service=session_service
+    # Compaction (an LLM summarization) runs in the background after each response,
+    # and only once the estimated prompt grows past max_tokens; it then summarizes
+    # just the oldest turns needed to get back under target_tokens and merges that
+    # summary into a tree of earlier ones, so its cost stays flat in long sessions
+    compaction_policy = HierarchicalCompaction(max_tokens=2_000, target_tokens=1_000)
+    research_runner_compacting = BackgroundCompactionRunner(
+        app=research_app_compacting, session_service=session_service, compaction=compaction_policy
     )
+    runner = research_runner_compacting  # cleanup() closes it and waits for running compactions
     
     print("✅ Research App upgraded with Events Compaction!")
 
@@ -248,20 +257,16 @@ async def run_conversation():
     print(f"   - Database: my_agent_data.db")
     print(f"   - Sessions will survive restarts!")
 
-    # Create or get the session with proper error handling
-    try:
-        await session_service.create_session(
-            app_name=APP_NAME,
-            user_id=USER_ID,
-            session_id=SESSION
-        )
+    # Create or get the session
+    _, created = await session_service.get_or_create_session(
+        app_name=APP_NAME,
+        user_id=USER_ID,
+        session_id=SESSION
+    )
+    if created:
         print(f"✅ Created new session: App='{APP_NAME}', User='{USER_ID}', Session='{SESSION}'")
-    except Exception as e:
-        if "already exists" in str(e):
-            print(f"✅ Using existing session: App='{APP_NAME}', User='{USER_ID}', Session='{SESSION}'")
-        else:
-            # Re-raise unexpected errors
-            raise
+    else:
+        print(f"✅ Using existing session: App='{APP_NAME}', User='{USER_ID}', Session='{SESSION}'")
 
     try:
         # Turn 1
@@ -279,7 +284,7 @@ async def run_conversation():
             "compaction_demo",
         )
 
-        # Turn 3 - Compaction should trigger after this turn!
+        # Turn 3 - Compaction triggers once the history exceeds the token budget
         await run_session(
             research_runner_compacting,
             "Tell me more about the second development you found.",
@@ -292,6 +297,15 @@ async def run_conversation():
             "Who are the main companies involved in that?",
             "compaction_demo",
         )
+
+        await research_runner_compacting.wait_for_compaction(USER_ID, "compaction_demo")
+        for record in compaction_policy.records:
+            print(
+                f"📉 Compacted {record.events} events: ~{record.tokens_before} → ~{record.tokens_after} tokens"
+                f" ({record.tokens_saved} saved)"
+            )
+        if not compaction_policy.records:
+            print("ℹ️ History stayed under the token budget, no compaction needed")
     # Turn 1
 
     except Exception as e:
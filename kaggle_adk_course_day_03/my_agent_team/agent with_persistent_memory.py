@@ -11,11 +11,12 @@ from typing import Any, Dict
 
 from google.adk.agents import Agent, LlmAgent
 from google.adk.apps.app import App, EventsCompactionConfig
-from google.adk.models.google_llm import Gemini
-from google.adk.sessions import DatabaseSessionService
-from google.adk.sessions import InMemorySessionService
+from model_clients import adaptive_retry_options, close_shared_clients, shared_gemini
+from session_services import SqliteSessionService, UpsertInMemorySessionService
 from google.adk.runners import Runner
+from google.adk.tools import preload_memory
 from google.adk.tools.tool_context import ToolContext
+from vector_memory import GeminiEmbedder, MemoryIngestionPlugin, VectorMemoryService
 from google.genai import types
 
 print("✅ ADK components imported successfully.")
@@ -55,22 +56,14 @@ async def run_session(
     # Get app name from the Runner
     app_name = runner_instance.app_name
 
-    # Attempt to create a new session or retrieve an existing one
-    try:
-        session = await session_service.create_session(
-            app_name=app_name, user_id=USER_ID, session_id=session_name
-        )
+    # Create a new session or retrieve an existing one in a single call
+    session, created = await session_service.get_or_create_session(
+        app_name=app_name, user_id=USER_ID, session_id=session_name
+    )
+    if created:
         print(f"✅ Created new session: {session_name}")
-    except Exception as e:
-        # If session already exists, get the existing one
-        if "already exists" in str(e):
-            session = await session_service.get_session(
-                app_name=app_name, user_id=USER_ID, session_id=session_name
-            )
-            print(f"✅ Retrieved existing session: {session_name}")
-        else:
-            # Re-raise unexpected errors
-            raise
+    else:
+        print(f"✅ Retrieved existing session: {session_name}")
 
     # Process queries if provided
     if user_queries:
@@ -111,16 +104,15 @@ async def run_session(
 
 print("✅ Helper functions defined.")
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 # Global variables for cleanup
 runner = None
 session_service = None
+memory_service = None
 root_agent = None
 gemini_model = None
 
@@ -149,7 +141,7 @@ async def close_all_http_clients():
 
 async def cleanup():
     """Properly cleanup all resources"""
-    global runner, session_service, root_agent, gemini_model
+    global runner, session_service, memory_service, root_agent, gemini_model
     
     print("\n🧹 Cleaning up resources...")
     
@@ -161,6 +153,22 @@ async def cleanup():
         except Exception as e:
             print(f"⚠️ Warning: runner.close() raised: {type(e).__name__}: {e}")
 
+    # Finish ingesting the last turn and save the memory index
+    if memory_service is not None:
+        try:
+            await memory_service.close()
+            print("✅ Memory service closed successfully")
+        except Exception as e:
+            print(f"⚠️ Warning: memory_service.close() raised: {type(e).__name__}: {e}")
+
+    # Write any buffered session events and close the database connections
+    if session_service is not None:
+        try:
+            await session_service.close()
+            print("✅ Session service closed successfully")
+        except Exception as e:
+            print(f"⚠️ Warning: session_service.close() raised: {type(e).__name__}: {e}")
+
     # Close model clients - more comprehensive approach
     if root_agent is not None:
         try:
@@ -195,6 +203,9 @@ async def cleanup():
         except Exception as e:
             print(f"⚠️ Error during model cleanup: {e}")
 
+    # Close the pooled Gemini clients shared by every agent
+    await close_shared_clients()
+
     # Force close all HTTP clients
     await close_all_http_clients()
     
@@ -207,51 +218,66 @@ async def cleanup():
         pass
 
 async def run_conversation():
-    global runner, session_service, root_agent, gemini_model
+    global runner, session_service, memory_service, root_agent, gemini_model
     
     # Create the Gemini model instance first
-    gemini_model = Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config)
+    gemini_model = shared_gemini("gemini-2.5-flash-lite", retry_config)
     
     # Initialize components
     root_agent = Agent(
         model=gemini_model,
         name="text_chat_bot",
         description="A text chatbot",
+        tools=[preload_memory],  # Adds memories relevant to the user's message to the instructions
     )
 
     print(f"Agent '{root_agent.name}' created using model '{AGENT_MODEL}'.")
 
-    # Step 2: Switch to DatabaseSessionService
-    # SQLite database will be created automatically
-    db_url = "sqlite:///my_agent_data.db"  # Local SQLite file
-    session_service = DatabaseSessionService(db_url=db_url)
+    # Step 2: Switch to a database-backed session service
+    # SQLite database will be created automatically (WAL mode, pooled connections,
+    # events written once per invocation; each turn loads only the last 100 events
+    # plus the latest compaction summary; write_behind writes events in the background
+    # so streaming never waits for the database)
+    session_service = SqliteSessionService(
+        "my_agent_data.db", synchronous="NORMAL", recent_events=100, write_behind=True
+    )
+
+    # Long-term memory across sessions: every turn's messages are embedded in the
+    # background after the answer and saved to my_agent_memory.npz on close;
+    # preload_memory looks up the closest ones for each new message
+    memory_service = VectorMemoryService(GeminiEmbedder(retry_options=retry_config), path="my_agent_memory.npz")
+    app = App(name=APP_NAME, root_agent=root_agent, plugins=[MemoryIngestionPlugin(memory_service)])
 
     runner = Runner(
-        agent=root_agent,
-        app_name=APP_NAME,
-        session_service=session_service
+        app=app,
+        session_service=session_service,
+        memory_service=memory_service,
     )
 
     print("✅ Upgraded to persistent sessions!")
     print(f"   - Database: my_agent_data.db")
     print(f"   - Sessions will survive restarts!")
 
-    # Create or get the session with proper error handling
-    try:
-        await session_service.create_session(
-            app_name=APP_NAME,
-            user_id=USER_ID,
-            session_id=SESSION
-        )
+    # Create or get the session
+    _, created = await session_service.get_or_create_session(
+        app_name=APP_NAME,
+        user_id=USER_ID,
+        session_id=SESSION
+    )
+    if created:
         print(f"✅ Created new session: App='{APP_NAME}', User='{USER_ID}', Session='{SESSION}'")
-    except Exception as e:
-        if "already exists" in str(e):
-            print(f"✅ Using existing session: App='{APP_NAME}', User='{USER_ID}', Session='{SESSION}'")
-        else:
-            # Re-raise unexpected errors
-            raise
+    else:
+        print(f"✅ Using existing session: App='{APP_NAME}', User='{USER_ID}', Session='{SESSION}'")
 
     try:
+        await run_session(
+            runner,
+            ["Hi! My name is Sam and I'm from Poland."],
+            "memory-intro-session",
+        )
+        await memory_service.flush()  # make sure that turn is in memory before the next session asks
+
+        # A different session: the name comes from long-term memory, not from this session's history
         await run_session(
             runner, 
             ["Hello! What is my name?"], 
@@ -11,11 +11,11 @@ from typing import Any, Dict
 
 from google.adk.agents import Agent, LlmAgent
 from google.adk.apps.app import App, EventsCompactionConfig
-from google.adk.models.google_llm import Gemini
-from google.adk.sessions import DatabaseSessionService
-from google.adk.sessions import InMemorySessionService
+from model_clients import adaptive_retry_options, close_shared_clients, shared_gemini
+from session_services import UpsertDatabaseSessionService, UpsertInMemorySessionService
 from google.adk.runners import Runner
 from google.adk.tools.tool_context import ToolContext
+from scoped_state import ScopedState, StateKey, StateMetricsPlugin
 from google.genai import types
 
 print("✅ ADK components imported successfully.")
@@ -55,22 +55,14 @@ async def run_session(
     # Get app name from the Runner
     app_name = runner_instance.app_name
 
-    # Attempt to create a new session or retrieve an existing one
-    try:
-        session = await session_service.create_session(
-            app_name=app_name, user_id=USER_ID, session_id=session_name
-        )
+    # Create a new session or retrieve an existing one in a single call
+    session, created = await session_service.get_or_create_session(
+        app_name=app_name, user_id=USER_ID, session_id=session_name
+    )
+    if created:
         print(f"✅ Created new session: {session_name}")
-    except Exception as e:
-        # If session already exists, get the existing one
-        if "already exists" in str(e):
-            session = await session_service.get_session(
-                app_name=app_name, user_id=USER_ID, session_id=session_name
-            )
-            print(f"✅ Retrieved existing session: {session_name}")
-        else:
-            # Re-raise unexpected errors
-            raise
+    else:
+        print(f"✅ Retrieved existing session: {session_name}")
 
     # Process queries if provided
     if user_queries:
@@ -111,12 +103,10 @@ async def run_session(
 
 print("✅ Helper functions defined.")
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 # Global variables for cleanup
 runner = None
@@ -195,6 +185,9 @@ async def cleanup():
         except Exception as e:
             print(f"⚠️ Error during model cleanup: {e}")
 
+    # Close the pooled Gemini clients shared by every agent
+    await close_shared_clients()
+
     # Force close all HTTP clients
     await close_all_http_clients()
     
@@ -210,9 +203,13 @@ async def cleanup():
 # Define scope levels for state keys (following best practices)
 USER_NAME_SCOPE_LEVELS = ("temp", "user", "app")
 
+# Typed state keys; the 'user' scope stores them as 'user:name' and 'user:country'
+USER_NAME = StateKey("name", str, scope="user", default="Username not found")
+USER_COUNTRY = StateKey("country", str, scope="user", default="Country not found")
+
 
 # This demonstrates how tools can write to session state using tool_context.
-# The 'user:' prefix indicates this is user-specific data.
+# The 'user:' scope indicates this is user-specific data.
 def save_userinfo(
     tool_context: ToolContext, user_name: str, country: str
 ) -> Dict[str, Any]:
@@ -223,9 +220,11 @@ def save_userinfo(
         user_name: The username to store in session state
         country: The name of the user's country
     """
-    # Write to session state using the 'user:' prefix for user data
-    tool_context.state["user:name"] = user_name
-    tool_context.state["user:country"] = country
+    # Both values are written as one state delta when the block ends
+    # (unchanged values are skipped, and nothing is written if the tool fails)
+    with ScopedState(tool_context) as state:
+        state[USER_NAME] = user_name
+        state[USER_COUNTRY] = country
 
     return {"status": "success"}
 
@@ -235,9 +234,11 @@ def retrieve_userinfo(tool_context: ToolContext) -> Dict[str, Any]:
     """
     Tool to retrieve user name and country from session state.
     """
-    # Read from session state
-    user_name = tool_context.state.get("user:name", "Username not found")
-    country = tool_context.state.get("user:country", "Country not found")
+    # Read from session state; a 'temp:' name set for this invocation wins
+    # over the user's, and an app-wide 'app:' name is the fallback
+    state = ScopedState(tool_context)
+    user_name = state.get(USER_NAME, scopes=USER_NAME_SCOPE_LEVELS)
+    country = state.get(USER_COUNTRY)
 
     return {"status": "success", "user_name": user_name, "country": country}
 
@@ -248,7 +249,7 @@ async def run_conversation():
     global runner, session_service, root_agent, gemini_model
     
     # Create the Gemini model instance first
-    gemini_model = Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config)
+    gemini_model = shared_gemini("gemini-2.5-flash-lite", retry_config)
     
     # Initialize components
     root_agent = LlmAgent(
@@ -266,26 +267,26 @@ async def run_conversation():
 
     print(f"Agent '{root_agent.name}' created using model '{AGENT_MODEL}'.")
 
-    session_service = InMemorySessionService()
+    session_service = UpsertInMemorySessionService()
 
-    runner = Runner(agent=root_agent, session_service=session_service, app_name="default")
+    # Measures the state delta bytes each event adds to the session store
+    state_metrics = StateMetricsPlugin()
+    app = App(name="default", root_agent=root_agent, plugins=[state_metrics])
+
+    runner = Runner(app=app, session_service=session_service)
 
     print("✅ Agent with session state tools initialized!")
 
-    # Create or get the session with proper error handling
-    try:
-        await session_service.create_session(
-            app_name=APP_NAME,
-            user_id=USER_ID,
-            session_id=SESSION
-        )
+    # Create or get the session
+    _, created = await session_service.get_or_create_session(
+        app_name=APP_NAME,
+        user_id=USER_ID,
+        session_id=SESSION
+    )
+    if created:
         print(f"✅ Created new session: App='{APP_NAME}', User='{USER_ID}', Session='{SESSION}'")
-    except Exception as e:
-        if "already exists" in str(e):
-            print(f"✅ Using existing session: App='{APP_NAME}', User='{USER_ID}', Session='{SESSION}'")
-        else:
-            # Re-raise unexpected errors
-            raise
+    else:
+        print(f"✅ Using existing session: App='{APP_NAME}', User='{USER_ID}', Session='{SESSION}'")
 
     try:
         # Turn 1
@@ -308,6 +309,10 @@ async def run_conversation():
         print("Session State Contents:")
         print(session.state)
         print("\n🔍 Notice the 'user:name' and 'user:country' keys storing our data!")
+        print(
+            f"📏 State bytes per event: {state_metrics.state_bytes_per_event:.1f}"
+            f" ({state_metrics.state_bytes} bytes in {state_metrics.state_events} of {state_metrics.events} events)"
+        )
 
     except Exception as e:
         print(f"❌ Error during conversation: {type(e).__name__}: {e}")
@@ -11,11 +11,12 @@ from typing import Any, Dict
 
 from google.adk.agents import Agent, LlmAgent
 from google.adk.apps.app import App, EventsCompactionConfig
-from google.adk.models.google_llm import Gemini
-from google.adk.sessions import DatabaseSessionService
-from google.adk.sessions import InMemorySessionService
+from model_clients import adaptive_retry_options, close_shared_clients, shared_gemini
+from session_services import UpsertDatabaseSessionService, UpsertInMemorySessionService
 from google.adk.runners import Runner
+from google.adk.tools import preload_memory
 from google.adk.tools.tool_context import ToolContext
+from vector_memory import GeminiEmbedder, MemoryIngestionPlugin, VectorMemoryService
 from google.genai import types
 
 print("✅ ADK components imported successfully.")
@@ -55,15 +56,10 @@ async def run_session(
     # Get app name from the Runner
     app_name = runner_instance.app_name
 
-    # Attempt to create a new session or retrieve an existing one
-    try:
-        session = await session_service.create_session(
-            app_name=app_name, user_id=USER_ID, session_id=session_name
-        )
-    except:
-        session = await session_service.get_session(
-            app_name=app_name, user_id=USER_ID, session_id=session_name
-        )
+    # Create a new session or retrieve an existing one in a single call
+    session, _ = await session_service.get_or_create_session(
+        app_name=app_name, user_id=USER_ID, session_id=session_name
+    )
 
     # Process queries if provided
     if user_queries:
@@ -104,16 +100,15 @@ async def run_session(
 
 print("✅ Helper functions defined.")
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 # Global variables for cleanup
 runner = None
 session_service = None
+memory_service = None
 root_agent = None
 gemini_model = None
 
@@ -142,7 +137,7 @@ async def close_all_http_clients():
 
 async def cleanup():
     """Properly cleanup all resources"""
-    global runner, session_service, root_agent, gemini_model
+    global runner, session_service, memory_service, root_agent, gemini_model
     
     print("\n🧹 Cleaning up resources...")
     
@@ -154,6 +149,14 @@ async def cleanup():
         except Exception as e:
             print(f"⚠️ Warning: runner.close() raised: {type(e).__name__}: {e}")
 
+    # Finish ingesting the last turn
+    if memory_service is not None:
+        try:
+            await memory_service.close()
+            print("✅ Memory service closed successfully")
+        except Exception as e:
+            print(f"⚠️ Warning: memory_service.close() raised: {type(e).__name__}: {e}")
+
     # Close model clients - more comprehensive approach
     if root_agent is not None:
         try:
@@ -188,6 +191,9 @@ async def cleanup():
         except Exception as e:
             print(f"⚠️ Error during model cleanup: {e}")
 
+    # Close the pooled Gemini clients shared by every agent
+    await close_shared_clients()
+
     # Force close all HTTP clients
     await close_all_http_clients()
     
@@ -200,26 +206,33 @@ async def cleanup():
         pass
 
 async def run_conversation():
-    global runner, session_service, root_agent, gemini_model
+    global runner, session_service, memory_service, root_agent, gemini_model
     
     # Create the Gemini model instance first
-    gemini_model = Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config)
+    gemini_model = shared_gemini("gemini-2.5-flash-lite", retry_config)
     
     # Initialize components
     root_agent = Agent(
         model=gemini_model,
         name="text_chat_bot",
         description="A text chatbot",
+        tools=[preload_memory],  # Adds memories relevant to the user's message to the instructions
     )
 
     print(f"Agent '{root_agent.name}' created using model '{AGENT_MODEL}'.")
 
-    session_service = InMemorySessionService()
+    session_service = UpsertInMemorySessionService()
+
+    # Long-term memory across sessions: every turn's messages are embedded in the
+    # background after the answer;
+    # preload_memory looks up the closest ones for each new message
+    memory_service = VectorMemoryService(GeminiEmbedder(retry_options=retry_config))
+    app = App(name=APP_NAME, root_agent=root_agent, plugins=[MemoryIngestionPlugin(memory_service)])
 
     runner = Runner(
-        agent=root_agent,
-        app_name=APP_NAME,
-        session_service=session_service
+        app=app,
+        session_service=session_service,
+        memory_service=memory_service,
     )
 
     print(f"Runner created for agent '{runner.agent.name}'.")
@@ -245,6 +258,14 @@ async def run_conversation():
             ],
             "stateful-agentic-session",
         )
+        await memory_service.flush()  # make sure those turns are in memory
+
+        # A new session has no history, but recalls the name from long-term memory
+        await run_session(
+            runner,
+            ["Hello! What is my name?"],
+            "stateful-agentic-session-2",
+        )
     except Exception as e:
         print(f"❌ Error during conversation: {type(e).__name__}: {e}")
         raise
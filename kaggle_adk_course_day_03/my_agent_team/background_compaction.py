@@ -0,0 +1,111 @@
+"""Event compaction as a background job that never delays a response.
+
+With `EventsCompactionConfig`, the summarization that compacts old events is
+an LLM call. `BackgroundCompactionRunner` is a `Runner` that runs it only
+after the invocation's last event has been handed to the caller:
+
+    runner = BackgroundCompactionRunner(app=research_app_compacting, session_service=session_service)
+
+  - compaction starts as a background task once the invocation is over
+    (also when the caller stops reading right after the final response);
+  - it works on a freshly loaded session, and the summary is stored as one
+    compaction event, i.e. one atomic append;
+  - the next turn of the same session waits for the previous invocation to
+    close and for a running compaction before loading the session, so it
+    always sees the new summary and never races the summarizer. Only a user who
+    answers faster than the summary takes pays for (the rest of) it;
+  - at most one compaction runs per session, and a failed compaction is
+    logged and simply tried again after the next turn.
+
+Without a `compaction=` policy it runs ADK's sliding-window compaction and
+only if the app has an `EventsCompactionConfig`; a policy such as
+`compaction_policies.TokenBudgetCompaction` needs no config on the app.
+
+`await runner.close()` waits for running compactions.
+"""
+
+import asyncio
+import logging
+from typing import AsyncGenerator, Optional
+
+from google.adk.apps.app import App
+from google.adk.apps.compaction import _run_compaction_for_sliding_window
+from google.adk.events import Event
+from google.adk.runners import Runner
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.utils.context_utils import Aclosing
+
+PREVIOUS_INVOCATION_GRACE = 1.0  # seconds a new turn waits for the previous invocation to close
+
+
+async def sliding_window_compaction(app: App, session: Session, session_service: BaseSessionService):
+    """ADK's own compaction step: summarize once `compaction_interval` new invocations are in the session."""
+    await _run_compaction_for_sliding_window(app, session, session_service)
+
+
+class BackgroundCompactionRunner(Runner):
+    """A `Runner` that compacts events after the response instead of inside the turn."""
+
+    def __init__(self, *, app: Optional[App] = None, compaction=sliding_window_compaction, **kwargs):
+        # ADK's own compaction needs the app's `EventsCompactionConfig`; a custom policy brings its own settings.
+        enabled = app is not None and (app.events_compaction_config or compaction is not sliding_window_compaction)
+        self.compaction_app = app if enabled else None
+        if self.compaction_app is not None:
+            # The base Runner would compact right after the last event; this runner schedules it itself.
+            app = app.model_copy(update={"events_compaction_config": None})
+        super().__init__(app=app, **kwargs)
+        self.compaction = compaction
+        self._invocations: dict[tuple[str, str], asyncio.Event] = {}  # set once an invocation is closed
+        self._compactions: dict[tuple[str, str], asyncio.Task] = {}
+
+    async def wait_for_compaction(self, user_id: str, session_id: str):
+        """Waits for the previous invocation of this session to close and for its compaction."""
+        key = (user_id, session_id)
+        finished = self._invocations.get(key)
+        if finished is not None and not finished.is_set():
+            # A caller that stopped reading closes the invocation on the next loop iterations.
+            try:
+                await asyncio.wait_for(finished.wait(), PREVIOUS_INVOCATION_GRACE)
+            except asyncio.TimeoutError:
+                logging.warning(f"[BackgroundCompactionRunner] Previous invocation of {session_id} is still open")
+        task = self._compactions.get(key)
+        if task is not None and not task.done():
+            logging.info(f"[BackgroundCompactionRunner] Turn for {session_id} waits for its compaction")
+            await asyncio.shield(task)
+
+    async def run_async(self, *, user_id: str, session_id: str, **kwargs) -> AsyncGenerator[Event, None]:
+        await self.wait_for_compaction(user_id, session_id)
+        finished = self._invocations[(user_id, session_id)] = asyncio.Event()
+        try:
+            async with Aclosing(super().run_async(user_id=user_id, session_id=session_id, **kwargs)) as agen:
+                async for event in agen:
+                    yield event
+        finally:
+            # Runs when the invocation is over or the caller stopped reading (e.g. `break` after the final response).
+            finished.set()
+            if self.compaction_app is not None:
+                self._schedule_compaction(user_id, session_id)
+
+    def _schedule_compaction(self, user_id: str, session_id: str):
+        key = (user_id, session_id)
+        previous = self._compactions.get(key)
+        if previous is not None and not previous.done():
+            return  # the running compaction will be followed by another one after the next turn
+        task = asyncio.get_running_loop().create_task(self._compact(user_id, session_id))
+        self._compactions[key] = task
+        task.add_done_callback(lambda done: self._compactions.pop(key, None) if self._compactions.get(key) is done else None)
+
+    async def _compact(self, user_id: str, session_id: str):
+        try:
+            # A fresh copy: the invocation's own session object may already be outdated.
+            session = await self.session_service.get_session(app_name=self.app_name, user_id=user_id, session_id=session_id)
+            if session is not None:
+                await self.compaction(self.compaction_app, session, self.session_service)
+        except Exception as e:
+            logging.warning(f"[BackgroundCompactionRunner] Compaction of {session_id} failed: {e!r}")
+
+    async def close(self):
+        """Waits for running compactions, then closes the runner."""
+        if self._compactions:
+            await asyncio.gather(*self._compactions.values(), return_exceptions=True)
+        await super().close()
@@ -0,0 +1,104 @@
+"""Measure recall latency and quality of `VectorMemoryService` on synthetic memories.
+
+No API key is needed: `--items` synthetic event texts (random words with a
+Zipf-like frequency, like real text) are ingested through
+`add_session_to_memory()` with the `HashingEmbedder`, in sessions of
+`--session-events` events. Each session is generated right before it is
+ingested, so only the memory service itself grows with `--items`. The
+search then runs `--queries` times with a few words of a random memory, end
+to end (query embedding included). Recall is the share of the exact top-k
+(brute force over every vector) that the approximate search returns.
+
+    python benchmark_memory.py  # 100k memories, well under a minute
+    python benchmark_memory.py --items 1000000 --nprobe 32  # about 2 GB of RAM
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import statistics
+import time
+import warnings
+
+warnings.filterwarnings("ignore")
+logging.basicConfig(level=logging.ERROR)
+
+import numpy as np
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.genai import types
+
+from vector_memory import DEFAULT_DIM, DEFAULT_NPROBE, DEFAULT_TOP_K, HashingEmbedder, VectorMemoryService
+
+APP_NAME = "benchmark"
+USER_ID = "user"
+VOCABULARY = 50_000
+WORDS_PER_MEMORY = 8
+WORDS_PER_QUERY = 3
+
+
+# Zipf-like word frequencies, cumulated once for `random.choices()`.
+CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, VOCABULARY + 1)))
+
+
+def synthetic_texts(count: int, rng: random.Random) -> list[str]:
+    words = rng.choices(range(VOCABULARY), cum_weights=CUM_WEIGHTS, k=count * WORDS_PER_MEMORY)
+    return [
+        " ".join(f"w{word}" for word in words[start : start + WORDS_PER_MEMORY])
+        for start in range(0, len(words), WORDS_PER_MEMORY)
+    ]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100_000, help="memories to ingest")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--session-events", type=int, default=1_000, help="events per ingested session")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    memory_service = VectorMemoryService(HashingEmbedder(args.dim), top_k=args.top_k, nprobe=args.nprobe, min_score=-1.0)
+    print(f"📊 {args.items:,} memories, {args.dim} dimensions, nprobe={args.nprobe}, top {args.top_k}\n")
+
+    start = time.perf_counter()
+    for first in range(0, args.items, args.session_events):
+        session = Session(id=f"session-{first}", app_name=APP_NAME, user_id=USER_ID)
+        session.events = [
+            Event(author="user", content=types.Content(role="user", parts=[types.Part(text=text)]))
+            for text in synthetic_texts(min(args.session_events, args.items - first), rng)
+        ]
+        await memory_service.add_session_to_memory(session)
+        del session  # only the memory service keeps the texts
+    await memory_service.flush()  # the last retrain
+    elapsed = time.perf_counter() - start
+    print(f"Ingestion: {args.items / elapsed:,.0f} memories/sec ({elapsed:.1f}s, including index training)")
+
+    memories = memory_service._memories[(APP_NAME, USER_ID)]
+    vectors = memories.index.vectors_by_id()
+    latencies, recalls = [], []
+    for text in rng.sample(memories.texts, args.queries):
+        query = " ".join(rng.sample(text.split(), WORDS_PER_QUERY))
+        start = time.perf_counter()
+        await memory_service.search_memory(app_name=APP_NAME, user_id=USER_ID, query=query)
+        latencies.append(time.perf_counter() - start)
+
+        query_vector = memory_service.embedder.embed_sync([query])[0]
+        found, _ = memories.index.search(query_vector, args.top_k)
+        scores = vectors @ query_vector
+        exact = np.argpartition(-scores, args.top_k - 1)[: args.top_k]
+        # Ties at the k-th score make several top-k sets exact; count hits by score.
+        threshold = scores[exact].min()
+        recalls.append(min(1.0, np.count_nonzero(scores[found] >= threshold - 1e-6) / args.top_k))
+
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    print(f"search_memory(): avg {statistics.mean(latencies) * 1e3:.2f}ms, p99 {p99 * 1e3:.2f}ms")
+    print(f"Recall@{args.top_k} vs. exact search: {statistics.mean(recalls):.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""Compare event appends per second of the default and the tuned SQLite session services.
+
+The workload is synthetic, so no API key is needed: `--sessions` sessions run
+concurrently, each with `--turns` invocations of user message → function
+call → function response → final answer, which is what a tool-using agent
+appends per turn. Every service gets its own database in a temporary
+directory. Besides throughput (including the final flush of buffered
+events), it reports how long `append_event()` keeps the caller waiting,
+i.e. the delay added to streaming each event.
+
+    python benchmark_sessions.py
+    python benchmark_sessions.py --sessions 20 --turns 50 --synchronous FULL
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+import uuid
+import warnings
+
+warnings.filterwarnings("ignore")
+logging.basicConfig(level=logging.ERROR)
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import DatabaseSessionService
+from google.genai import types
+
+from session_services import SqliteSessionService
+
+APP_NAME = "benchmark"
+
+
+def synthetic_turn(turn: int) -> list[Event]:
+    """The four events a single tool-using invocation appends."""
+    invocation_id = f"e-{uuid.uuid4()}"
+    call_id = f"call-{uuid.uuid4()}"
+
+    def make(author, part, **kwargs):
+        return Event(
+            invocation_id=invocation_id,
+            author=author,
+            content=types.Content(role="user" if author == "user" else "model", parts=[part]),
+            **kwargs,
+        )
+
+    return [
+        make("user", types.Part(text=f"Question number {turn}: what is the weather in London?")),
+        make("assistant", types.Part(function_call=types.FunctionCall(id=call_id, name="get_weather", args={"city": "London"}))),
+        make(
+            "assistant",
+            types.Part(function_response=types.FunctionResponse(id=call_id, name="get_weather", response={"result": "cloudy, 15 °C"})),
+            actions=EventActions(state_delta={"last_city": "London", "turns": turn}),
+        ),
+        make("assistant", types.Part(text="It's cloudy in London with a temperature of 15 °C.")),
+    ]
+
+
+async def run_workload(session_service, sessions: int, turns: int) -> tuple[int, float, list[float]]:
+    latencies = []
+
+    async def one_session(index: int) -> int:
+        session = await session_service.create_session(app_name=APP_NAME, user_id=f"user-{index}", session_id=f"session-{index}")
+        appended = 0
+        for turn in range(turns):
+            for event in synthetic_turn(turn):
+                start = time.perf_counter()
+                await session_service.append_event(session, event)
+                latencies.append(time.perf_counter() - start)
+                appended += 1
+                await asyncio.sleep(0)  # let the other sessions interleave, like concurrent users
+        return appended
+
+    start = time.perf_counter()
+    appended = sum(await asyncio.gather(*(one_session(index) for index in range(sessions))))
+    if isinstance(session_service, SqliteSessionService):
+        await session_service.flush()  # count the buffered writes too
+    return appended, time.perf_counter() - start, latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=20, help="invocations per session")
+    parser.add_argument("--synchronous", default="NORMAL", help="SQLite synchronous mode of the tuned service")
+    parser.add_argument("--pool-size", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tuned = dict(synchronous=args.synchronous, pool_size=args.pool_size)
+        services = {
+            "DatabaseSessionService (default)": DatabaseSessionService(db_url=f"sqlite:///{os.path.join(tmp, 'default.db')}"),
+            f"SqliteSessionService (synchronous={args.synchronous.upper()})": SqliteSessionService(os.path.join(tmp, "tuned.db"), **tuned),
+            "SqliteSessionService (write-behind)": SqliteSessionService(os.path.join(tmp, "behind.db"), write_behind=True, **tuned),
+        }
+        print(f"📊 {args.sessions} concurrent sessions × {args.turns} turns × 4 events\n")
+        print(f"{'':<45} {'appends/sec':>12} {'append avg':>11} {'append p99':>11}")
+        baseline = None
+        for name, session_service in services.items():
+            appended, elapsed, latencies = await run_workload(session_service, args.sessions, args.turns)
+            if isinstance(session_service, SqliteSessionService):
+                await session_service.close()
+            else:
+                session_service.db_engine.dispose()
+            throughput = appended / elapsed
+            baseline = baseline or throughput
+            p99 = statistics.quantiles(latencies, n=100)[98]
+            print(
+                f"{name:<45} {throughput:>12,.0f} {statistics.mean(latencies) * 1e3:>9.2f}ms {p99 * 1e3:>9.2f}ms"
+                f"  ({throughput / baseline:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
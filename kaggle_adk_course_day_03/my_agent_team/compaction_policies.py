@@ -0,0 +1,328 @@
+"""Compaction policies for `BackgroundCompactionRunner`.
+
+`compaction_interval=3` summarizes on a fixed schedule, whether the history
+is 500 tokens or 50k. `TokenBudgetCompaction` decides by size instead:
+
+    runner = BackgroundCompactionRunner(
+        app=research_app_compacting,
+        session_service=session_service,
+        compaction=TokenBudgetCompaction(max_tokens=8_000, target_tokens=4_000),
+    )
+
+  - after each turn it estimates the prompt the next turn would send: every
+    compaction summary plus the events no summary covers, the way ADK builds
+    the request contents. The estimate is local (`estimate_tokens`, about 4
+    characters per token) and cached per event, so a turn only measures its
+    new events;
+  - below `max_tokens` nothing happens: short sessions never pay for a
+    summarization call;
+  - above it, only the oldest uncompacted invocations are summarized, just
+    as many as needed to get back under `target_tokens`; the latest
+    `keep_recent_invocations` always stay verbatim;
+  - the tokens saved are recorded in the compaction event's `custom_metadata`
+    (so they are stored with the session) and in `policy.records`.
+
+The policy needs no `EventsCompactionConfig` on the app and ignores one if
+present: only the token budget decides. The summarizer is passed to the
+policy (`summarizer=`) and defaults to an `LlmEventSummarizer` on the root
+agent's model; the shared `App` is never modified.
+
+A summary is timestamped right after the span it covers, so it takes the
+place of those events while the newer ones stay in the prompt. The database
+session services load events in timestamp order, and
+`UpsertInMemorySessionService` inserts compaction events in timestamp order.
+
+Every summary stays in the prompt, so a session with thousands of turns
+would collect hundreds of them. `HierarchicalCompaction` (same arguments) keeps
+them as a tree over the event log instead, like a binary counter: each
+compaction summarizes only the new span (a leaf), then merges the two newest
+summaries while they are of the same level. A compaction therefore costs one
+summary of new events plus, on average, one merge of two summaries. The worst
+case is log2(n) merges, never a re-summary of old events. The prompt carries
+at most log2(n) + 1 summaries, older parts of the conversation in coarser
+ones:
+
+    compaction=HierarchicalCompaction(max_tokens=8_000, target_tokens=4_000)
+
+The tree is stored as one compaction event that covers everything compacted
+so far, with one part per summary (`custom_metadata["summary_tree"]` holds
+their levels and ranges). It needs the session services of
+`session_services.py`: they drop the summaries that a later one covers when
+loading a session.
+"""
+
+import json
+import logging
+import math
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from google.adk.apps.app import App
+from google.adk.apps.base_events_summarizer import BaseEventsSummarizer
+from google.adk.apps.llm_event_summarizer import LlmEventSummarizer
+from google.adk.events import Event, EventActions
+from google.adk.events.event_actions import EventCompaction
+from google.adk.sessions import BaseSessionService, Session
+from google.genai import types
+
+CHARS_PER_TOKEN = 4  # rough average for English text and JSON
+MEDIA_PART_TOKENS = 258  # what Gemini counts for an image
+PART_OVERHEAD_TOKENS = 3  # role and part framing
+DEFAULT_TOKEN_CACHE_SIZE = 50_000  # events whose estimate is kept
+DEFAULT_MAX_RECORDS = 1_000
+COMPACTION_TIMESTAMP_OFFSET = 1e-6  # one microsecond, the resolution of stored event timestamps
+
+MERGE_PROMPT_TEMPLATE = (
+    "The following are summaries of consecutive parts of a conversation between a user and an AI"
+    " agent, oldest first. Merge them into one concise summary that keeps the key information and"
+    " decisions made, as well as any unresolved questions or tasks.\n\n{conversation_history}"
+)
+
+
+def estimate_tokens(content: Optional[types.Content]) -> int:
+    """Estimates the prompt tokens of `content` without calling a tokenizer."""
+    if content is None or not content.parts:
+        return 0
+    tokens = 0
+    for part in content.parts:
+        tokens += PART_OVERHEAD_TOKENS
+        if part.text:
+            tokens += math.ceil(len(part.text) / CHARS_PER_TOKEN)
+        elif part.inline_data or part.file_data:
+            tokens += MEDIA_PART_TOKENS
+        else:
+            # Function calls and responses reach the model as JSON.
+            tokens += math.ceil(len(json.dumps(part.model_dump(mode="json", exclude_none=True))) / CHARS_PER_TOKEN)
+    return tokens
+
+
+def _compaction(event: Event):
+    return event.actions.compaction if event.actions else None
+
+
+def _invocations(events: list[Event]) -> list[list[Event]]:
+    """Groups consecutive events of the same invocation."""
+    invocations = []
+    for event in events:
+        if invocations and invocations[-1][0].invocation_id == event.invocation_id:
+            invocations[-1].append(event)
+        else:
+            invocations.append([event])
+    return invocations
+
+
+@dataclass
+class CompactionRecord:
+    session_id: str
+    events: int  # events the summary replaced
+    tokens_before: int  # estimated prompt tokens before the compaction
+    tokens_after: int
+    tokens_saved: int
+
+
+class TokenBudgetCompaction:
+    """Compacts the oldest invocations once the estimated prompt exceeds `max_tokens`."""
+
+    def __init__(
+        self,
+        max_tokens: int = 8_000,
+        target_tokens: Optional[int] = None,
+        *,
+        keep_recent_invocations: int = 1,
+        expected_summary_tokens: int = 300,
+        token_counter: Callable[[Optional[types.Content]], int] = estimate_tokens,
+        cache_size: int = DEFAULT_TOKEN_CACHE_SIZE,
+        summarizer: Optional[BaseEventsSummarizer] = None,
+    ):
+        target_tokens = max_tokens // 2 if target_tokens is None else target_tokens
+        if not 0 < target_tokens <= max_tokens:
+            raise ValueError(f"target_tokens must be between 1 and max_tokens ({max_tokens}), got {target_tokens}")
+        self.max_tokens = max_tokens
+        self.target_tokens = target_tokens
+        self.keep_recent_invocations = keep_recent_invocations
+        self.expected_summary_tokens = expected_summary_tokens
+        self.token_counter = token_counter
+        self.cache_size = cache_size
+        self.summarizer = summarizer
+        self._tokens: OrderedDict[str, int] = OrderedDict()  # event id -> estimate, least recently used first
+        self.records: deque[CompactionRecord] = deque(maxlen=DEFAULT_MAX_RECORDS)
+
+    def event_tokens(self, event: Event) -> int:
+        """Estimated prompt tokens of one event; a compaction event counts as its summary."""
+        tokens = self._tokens.get(event.id)
+        if tokens is not None:
+            self._tokens.move_to_end(event.id)
+            return tokens
+        compaction = _compaction(event)
+        tokens = self.token_counter(compaction.compacted_content if compaction else event.content)
+        self._tokens[event.id] = tokens
+        if len(self._tokens) > self.cache_size:
+            self._tokens.popitem(last=False)
+        return tokens
+
+    @staticmethod
+    def prompt_events(events: list[Event]) -> tuple[list[Event], list[Event]]:
+        """Splits `events` like ADK's request contents: (compaction events, events no summary covers)."""
+        summaries, uncovered = [], []
+        covered_from = math.inf
+        for event in reversed(events):
+            compaction = _compaction(event)
+            if compaction:
+                if compaction.start_timestamp is not None and compaction.end_timestamp is not None:
+                    summaries.append(event)
+                    covered_from = min(covered_from, compaction.start_timestamp)
+            elif event.timestamp < covered_from:
+                uncovered.append(event)
+        return summaries[::-1], uncovered[::-1]
+
+    def prompt_tokens(self, events: list[Event]) -> int:
+        """Estimated tokens of the history part of the next prompt."""
+        summaries, uncovered = self.prompt_events(events)
+        return sum(self.event_tokens(event) for event in summaries + uncovered)
+
+    async def summarize(self, app: App, span: list[Event], summaries: list[Event]) -> Optional[Event]:
+        """Returns the compaction event for `span`; `summaries` are the ones already in the prompt."""
+        if self.summarizer is None:
+            self.summarizer = LlmEventSummarizer(llm=app.root_agent.canonical_model)
+        return await self.summarizer.maybe_summarize_events(events=span)
+
+    async def __call__(self, app: App, session: Session, session_service: BaseSessionService):
+        summaries, uncovered = self.prompt_events(session.events)
+        tokens_before = sum(self.event_tokens(event) for event in summaries + uncovered)
+        if tokens_before <= self.max_tokens:
+            return
+
+        # Only events after the latest summary can be compacted; a new summary must not overlap an older one.
+        compacted_until = max((_compaction(event).end_timestamp for event in summaries), default=-math.inf)
+        invocations = _invocations([event for event in uncovered if event.timestamp > compacted_until])
+        candidates = invocations[: max(len(invocations) - self.keep_recent_invocations, 0)]
+
+        span, span_tokens = [], 0
+        for invocation in candidates:
+            span += invocation
+            span_tokens += sum(self.event_tokens(event) for event in invocation)
+            if tokens_before - span_tokens + self.expected_summary_tokens <= self.target_tokens:
+                break
+        if span_tokens <= self.expected_summary_tokens:
+            logging.info(f"[TokenBudgetCompaction] {session.id}: ~{tokens_before} tokens, nothing worth compacting")
+            return
+
+        compaction_event = await self.summarize(app, span, summaries)
+        if compaction_event is None:
+            return
+        # Sorts right after the span, before the newer events the summary does not cover.
+        compaction_event.timestamp = span[-1].timestamp + COMPACTION_TIMESTAMP_OFFSET
+
+        # Summaries the new one covers are no longer loaded with the session.
+        compaction = compaction_event.actions.compaction
+        replaced = [
+            event
+            for event in summaries
+            if compaction.start_timestamp <= _compaction(event).start_timestamp
+            and _compaction(event).end_timestamp <= compaction.end_timestamp
+        ]
+        tokens_after = (
+            tokens_before
+            - span_tokens
+            - sum(self.event_tokens(event) for event in replaced)
+            + self.event_tokens(compaction_event)
+        )
+        record = CompactionRecord(
+            session_id=session.id,
+            events=len(span),
+            tokens_before=tokens_before,
+            tokens_after=tokens_after,
+            tokens_saved=tokens_before - tokens_after,
+        )
+        compaction_event.custom_metadata = {
+            **(compaction_event.custom_metadata or {}),
+            "compaction": {
+                "events": record.events,
+                "tokens_before": record.tokens_before,
+                "tokens_after": record.tokens_after,
+                "tokens_saved": record.tokens_saved,
+            },
+        }
+        await session_service.append_event(session, compaction_event)
+        self.records.append(record)
+        logging.info(
+            f"[TokenBudgetCompaction] {session.id}: compacted {record.events} events, "
+            f"~{record.tokens_before} -> ~{record.tokens_after} tokens"
+        )
+
+
+def _text(content: Optional[types.Content]) -> str:
+    return "".join(part.text for part in content.parts if part.text) if content and content.parts else ""
+
+
+@dataclass
+class _Summary:
+    level: int  # 0: a compacted span, n + 1: a merge of two level-n summaries
+    start_timestamp: float
+    end_timestamp: float
+    text: str
+
+
+class HierarchicalCompaction(TokenBudgetCompaction):
+    """`TokenBudgetCompaction` that keeps its summaries as a tree and merges them incrementally."""
+
+    def __init__(self, *args, merge_summarizer: Optional[BaseEventsSummarizer] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.merge_summarizer = merge_summarizer
+
+    @staticmethod
+    def summary_tree(event: Event) -> list[_Summary]:
+        """The summaries stored in a compaction event of this policy, oldest first ([] for other events)."""
+        nodes = (event.custom_metadata or {}).get("summary_tree")
+        compaction = _compaction(event)
+        if not nodes or compaction is None or len(compaction.compacted_content.parts or []) != len(nodes):
+            return []
+        return [
+            _Summary(node["level"], node["start_timestamp"], node["end_timestamp"], part.text or "")
+            for node, part in zip(nodes, compaction.compacted_content.parts)
+        ]
+
+    async def summarize(self, app: App, span: list[Event], summaries: list[Event]) -> Optional[Event]:
+        leaf = await super().summarize(app, span, summaries)
+        if leaf is None:
+            return None
+        # Only the latest summary can continue the tree; anything else starts a new one after it.
+        tree = self.summary_tree(summaries[-1]) if summaries else []
+        tree.append(_Summary(0, span[0].timestamp, span[-1].timestamp, _text(leaf.actions.compaction.compacted_content)))
+        while len(tree) >= 2 and tree[-1].level == tree[-2].level:
+            merged = await self._merge(app, tree[-2], tree[-1])
+            if merged is None:
+                break  # merged again after the next compaction
+            tree[-2:] = [merged]
+
+        compaction = EventCompaction(
+            start_timestamp=tree[0].start_timestamp,
+            end_timestamp=tree[-1].end_timestamp,
+            compacted_content=types.Content(role="model", parts=[types.Part(text=node.text) for node in tree]),
+        )
+        return Event(
+            author="user",
+            invocation_id=Event.new_id(),
+            actions=EventActions(compaction=compaction),
+            custom_metadata={
+                "summary_tree": [
+                    {"level": node.level, "start_timestamp": node.start_timestamp, "end_timestamp": node.end_timestamp}
+                    for node in tree
+                ]
+            },
+        )
+
+    async def _merge(self, app: App, left: _Summary, right: _Summary) -> Optional[_Summary]:
+        if self.merge_summarizer is None:
+            self.merge_summarizer = LlmEventSummarizer(
+                llm=app.root_agent.canonical_model, prompt_template=MERGE_PROMPT_TEMPLATE
+            )
+        parts = [
+            Event(author="summary", content=types.Content(role="model", parts=[types.Part(text=node.text)]))
+            for node in (left, right)
+        ]
+        merged = await self.merge_summarizer.maybe_summarize_events(events=parts)
+        if merged is None:
+            return None
+        return _Summary(left.level + 1, left.start_timestamp, right.end_timestamp, _text(merged.actions.compaction.compacted_content))
@@ -2,14 +2,16 @@ import sqlite3
 import os
 
 
-def check_data_in_db():
+def check_data_in_db(limit=None):
+    """Prints the stored events; with `limit`, only the most recent ones."""
     with sqlite3.connect("my_agent_data.db") as connection:
         cursor = connection.cursor()
-        result = cursor.execute(
-            "select app_name, session_id, author, content from events"
-        )
+        query = "select app_name, session_id, author, content from events order by timestamp desc"
+        if limit:
+            query += f" limit {int(limit)}"
+        result = cursor.execute(query)
         print([_[0] for _ in result.description])
-        for each in result.fetchall():
+        for each in reversed(result.fetchall()):
             print(each)
 
 
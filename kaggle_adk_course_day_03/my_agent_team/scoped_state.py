@@ -0,0 +1,209 @@
+"""Typed, scoped session state for tools.
+
+`save_userinfo` used to write `tool_context.state["user:name"]` and
+`["user:country"]` key by key, with no type and no notion of scope beyond
+the prefix. `StateKey` declares a key once, with its scope, type and
+default, and `ScopedState` collects a tool call's writes:
+
+    USER_NAME = StateKey("name", str, scope="user", default="Username not found")
+
+    def save_userinfo(tool_context: ToolContext, user_name: str, country: str):
+        with ScopedState(tool_context) as state:
+            state[USER_NAME] = user_name
+            state[USER_COUNTRY] = country
+
+  - a write is checked against the key's type right away (`TypeError`);
+  - writes are buffered per scope and applied when the block ends, as one
+    state delta on the tool's event. A tool that raises writes nothing, and
+    values that did not change are dropped, so telling the agent the same
+    name twice persists nothing the second time;
+  - `user:` and `app:` keys are shared by every session of a user (or of the
+    app), yet each session only holds the copy loaded when it started.
+    Committed `user:`/`app:` values also go into an in-process cache
+    (`shared_state_cache`), and a read prefers a cached value written after
+    its session was loaded, so the user's other sessions see it on their next
+    read. `shared_state_cache.invalidate(app_name, user_id)` drops entries
+    after the state was changed some other way;
+  - `state.get(USER_NAME, scopes=("temp", "user", "app"))` looks a key up in
+    several scopes, most specific first.
+
+`StateMetricsPlugin` measures how many bytes of state deltas the events
+carry, i.e. what every event adds to the session store:
+
+    state_metrics = StateMetricsPlugin()
+    app = App(name="default", root_agent=root_agent, plugins=[state_metrics])
+    ...
+    print(state_metrics.state_bytes_per_event)
+"""
+
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence
+
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.sessions.state import State
+from google.adk.tools.tool_context import ToolContext
+
+SCOPE_PREFIXES = {"temp": State.TEMP_PREFIX, "session": "", "user": State.USER_PREFIX, "app": State.APP_PREFIX}
+SHARED_PREFIXES = (State.USER_PREFIX, State.APP_PREFIX)
+DEFAULT_CACHE_SIZE = 10_000  # cached user:/app: values
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class StateKey:
+    """A state key with its scope, type and default value."""
+
+    name: str
+    type: type = object
+    scope: str = "session"
+    default: Any = None
+
+    def __post_init__(self):
+        if self.scope not in SCOPE_PREFIXES:
+            raise ValueError(f"Unknown state scope {self.scope!r}, expected one of {tuple(SCOPE_PREFIXES)}")
+
+    @property
+    def key(self) -> str:
+        """The prefixed key in `tool_context.state`, e.g. "user:name"."""
+        return self.in_scope(self.scope)
+
+    def in_scope(self, scope: str) -> str:
+        return SCOPE_PREFIXES[scope] + self.name
+
+
+class SharedStateCache:
+    """Recently committed `user:` and `app:` values, shared by every session of the process."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, str, str], tuple[Any, float]] = OrderedDict()
+
+    @staticmethod
+    def _entry_key(app_name: str, user_id: str, key: str) -> tuple[str, str, str]:
+        # app: values belong to the whole app, not to one user.
+        return (app_name, user_id if key.startswith(State.USER_PREFIX) else "", key)
+
+    def get(self, app_name: str, user_id: str, key: str, newer_than: float) -> Any:
+        """The cached value if it was written after `newer_than`, else a sentinel."""
+        entry_key = self._entry_key(app_name, user_id, key)
+        entry = self._entries.get(entry_key)
+        if entry is None or entry[1] <= newer_than:
+            return _MISSING
+        self._entries.move_to_end(entry_key)
+        return entry[0]
+
+    def put(self, app_name: str, user_id: str, key: str, value: Any, written_at: float):
+        entry_key = self._entry_key(app_name, user_id, key)
+        self._entries[entry_key] = (value, written_at)
+        self._entries.move_to_end(entry_key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, app_name: str, user_id: Optional[str] = None, key: Optional[str] = None):
+        """Drops the cached values of an app, of one user (and the app's) or of one key."""
+        for entry_key in list(self._entries):
+            entry_app, entry_user, entry_state_key = entry_key
+            if entry_app != app_name or (key is not None and entry_state_key != key):
+                continue
+            if user_id is None or entry_user in (user_id, ""):
+                del self._entries[entry_key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+shared_state_cache = SharedStateCache()
+
+
+class ScopedState:
+    """Typed access to `tool_context.state` that applies a tool call's writes as one delta."""
+
+    def __init__(self, tool_context: ToolContext, cache: Optional[SharedStateCache] = None):
+        self.tool_context = tool_context
+        self.cache = shared_state_cache if cache is None else cache
+        self._writes: dict[str, dict[str, Any]] = {}  # scope -> {prefixed key: value}
+
+    def __enter__(self) -> "ScopedState":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self._writes.clear()  # a failed tool call leaves the state untouched
+        return False
+
+    def get(self, key: StateKey, default: Any = _MISSING, *, scopes: Optional[Sequence[str]] = None) -> Any:
+        """Reads `key` from its scope, or from the first of `scopes` that has it."""
+        for scope in scopes or (key.scope,):
+            state_key = key.in_scope(scope)
+            value = self._writes.get(scope, {}).get(state_key, _MISSING)
+            if value is _MISSING:
+                value = self._stored(state_key)
+            if value is not _MISSING:
+                return value
+        return key.default if default is _MISSING else default
+
+    def __getitem__(self, key: StateKey) -> Any:
+        return self.get(key)
+
+    def __setitem__(self, key: StateKey, value: Any):
+        if not isinstance(value, key.type):
+            raise TypeError(f"State key {key.key!r} expects {key.type.__name__}, got {type(value).__name__}")
+        self._writes.setdefault(key.scope, {})[key.key] = value
+
+    def _stored(self, state_key: str) -> Any:
+        if state_key.startswith(SHARED_PREFIXES):
+            session = self.tool_context.session
+            value = self.cache.get(session.app_name, session.user_id, state_key, newer_than=session.last_update_time)
+            if value is not _MISSING:
+                return value
+        return self.tool_context.state.get(state_key, _MISSING)
+
+    def commit(self) -> dict[str, Any]:
+        """Applies the buffered writes as one state delta and returns it (changed values only)."""
+        delta = {
+            state_key: value
+            for writes in self._writes.values()
+            for state_key, value in writes.items()
+            if self._stored(state_key) != value
+        }
+        self._writes.clear()
+        if not delta:
+            return delta
+        self.tool_context.state.update(delta)
+        session = self.tool_context.session
+        written_at = time.time()
+        for state_key, value in delta.items():
+            if state_key.startswith(SHARED_PREFIXES):
+                self.cache.put(session.app_name, session.user_id, state_key, value, written_at)
+        return delta
+
+
+class StateMetricsPlugin(BasePlugin):
+    """Counts the bytes of state deltas that events carry."""
+
+    def __init__(self, name: str = "state_metrics"):
+        super().__init__(name=name)
+        self.events = 0
+        self.state_events = 0  # events with a state delta
+        self.state_bytes = 0
+
+    async def on_event_callback(self, *, invocation_context: InvocationContext, event: Event) -> Optional[Event]:
+        if event.partial:
+            return None
+        self.events += 1
+        if event.actions and event.actions.state_delta:
+            self.state_events += 1
+            self.state_bytes += len(json.dumps(event.actions.state_delta, default=str).encode())
+        return None
+
+    @property
+    def state_bytes_per_event(self) -> float:
+        return self.state_bytes / self.events if self.events else 0.0
